@@ -0,0 +1,49 @@
+"""this script compares the json backends and rest formats of the compiler"""
+
+import tempfile
+import time
+from pathlib import Path
+import typer
+from corpus import write_corpus
+from dragon_compiler.builder import RowReader
+from dragon_compiler.decoders import JsonBackend, RestFormat
+from dragon_compiler.decoders import is_backend_available
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    count: int = typer.Option(
+        100_000, "--count", "-n", help="number of synthetic spell files"
+    ),
+    text_size: int = typer.Option(
+        200, "--text-size", help="length of the description texts"
+    ),
+):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"generate {count} spells ...")
+        files = write_corpus(Path(temp_dir), count, text_size=text_size)
+        documents = [file.read_bytes() for file in files]
+
+        print(f"\n{"backend":<10}{"rest format":<14}{"files/s":>12}{"s":>9}")
+        for backend in JsonBackend:
+            if not is_backend_available(backend):
+                print(f"{backend:<10}not installed")
+                continue
+            for rest_format in RestFormat:
+                row_reader = RowReader(
+                    ["name", "level", "school_of_magic"], backend, rest_format
+                )
+                start_time = time.perf_counter()
+                for document in documents:
+                    row_reader.read(document)
+                duration = time.perf_counter() - start_time
+                print(
+                    f"{backend:<10}{rest_format:<14}"
+                    f"{count / duration:>12.0f}{duration:>9.2f}"
+                )
+
+
+if __name__ == "__main__":
+    app()
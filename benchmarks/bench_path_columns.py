@@ -0,0 +1,92 @@
+"""
+this script compares the query latency of json path columns with
+json_extract on the rest column
+"""
+
+import tempfile
+from pathlib import Path
+import sqlite3
+import typer
+from corpus import write_corpus
+from harness import build_dataset, time_query
+
+app = typer.Typer()
+
+PATH = "casting_time.unit"
+VARIANTS = {
+    "json_extract": None,
+    "extracted": {"name": "unit", "type": "TEXT", "path": PATH, "index": True},
+    "virtual": {
+        "name": "unit",
+        "type": "TEXT",
+        "path": PATH,
+        "storage": "virtual",
+        "index": True,
+    },
+    "stored": {
+        "name": "unit",
+        "type": "TEXT",
+        "path": PATH,
+        "storage": "stored",
+        "index": True,
+    },
+}
+
+
+def build_variant(
+    source_folder: Path, out_path: Path, variant: str, jobs: int
+) -> Path:
+    columns = [{"name": "name", "type": "TEXT"}]
+    columns.append({"name": "level", "type": "INTEGER"})
+    if VARIANTS[variant]:
+        columns.append(VARIANTS[variant])
+    return build_dataset(
+        source_folder, out_path / variant, {"columns": columns}, jobs=jobs
+    )
+
+
+@app.command()
+def main(
+    count: int = typer.Option(
+        50_000, "--count", "-n", help="number of synthetic spell files"
+    ),
+    repeat: int = typer.Option(20, "--repeat", help="runs per query"),
+    jobs: int = typer.Option(4, "--jobs", "-j"),
+):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_folder = Path(temp_dir) / "spells"
+        print(f"generate {count} spells ...")
+        write_corpus(source_folder, count)
+
+        print(
+            f"\n{"variant":<14}{"size MiB":>10}{"count ms":>10}"
+            f"{"lookup ms":>11}"
+        )
+        for variant, column in VARIANTS.items():
+            db_path = build_variant(
+                source_folder, Path(temp_dir) / "out", variant, jobs
+            )
+            expr = "unit" if column else f"json_extract(rest, '$.{PATH}')"
+            con = sqlite3.connect(db_path)
+            count_ms = time_query(
+                con,
+                f"SELECT COUNT(*) FROM spells WHERE {expr} = ?",
+                ("minute",),
+                repeat,
+            )
+            lookup_ms = time_query(
+                con,
+                f"SELECT name FROM spells WHERE {expr} = ? AND level = ?",
+                ("bonus_action", 3),
+                repeat,
+            )
+            con.close()
+            size = db_path.stat().st_size / 2**20
+            print(
+                f"{variant:<14}{size:>10.1f}{count_ms:>10.2f}"
+                f"{lookup_ms:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    app()
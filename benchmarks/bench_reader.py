@@ -0,0 +1,107 @@
+"""
+this script measures the lookups per second of the release reader with a
+growing number of threads, compared to a connection per lookup
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+import typer
+from corpus import write_release_corpus
+from harness import build_release
+from dragon_compiler.reader import ReleaseReader
+
+app = typer.Typer()
+
+
+def make_lookups(release: ReleaseReader, count: int) -> dict:
+    """returns a function per lookup kind that looks up a random spell"""
+    spells = release["spells"]
+    local = threading.local()
+
+    def get_rng() -> random.Random:
+        if not hasattr(local, "rng"):
+            local.rng = random.Random(threading.get_ident())
+        return local.rng
+
+    def connect_per_lookup():
+        row_id = get_rng().randrange(count)
+        con = sqlite3.connect(
+            f"{(release.release_path / "spells.sqlite").as_uri()}?mode=ro",
+            uri=True,
+        )
+        try:
+            con.execute(
+                "SELECT * FROM spells WHERE id = ?", (row_id,)
+            ).fetchone()
+        finally:
+            con.close()
+
+    return {
+        "connect": connect_per_lookup,
+        "id": lambda: spells.get(get_rng().randrange(count)),
+        "column": lambda: spells.find(
+            "name", f"Spell {get_rng().randrange(count):07d}"
+        ),
+        "document": lambda: spells.get(get_rng().randrange(count)).document[
+            "level"
+        ],
+    }
+
+
+def measure(lookup, threads: int, seconds: float) -> float:
+    """returns the lookups per second of all threads together"""
+    deadline = time.perf_counter() + seconds
+
+    def run() -> int:
+        lookups = 0
+        while time.perf_counter() < deadline:
+            lookup()
+            lookups += 1
+        return lookups
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        total = sum(executor.map(lambda _: run(), range(threads)))
+    return total / (time.perf_counter() - start_time)
+
+
+@app.command()
+def main(
+    count: int = typer.Option(
+        50_000, "--count", "-n", help="number of synthetic spell files"
+    ),
+    threads: str = typer.Option(
+        "1,2,4,8", "--threads", help="comma separated thread counts"
+    ),
+    seconds: float = typer.Option(2.0, "--seconds", help="time per run"),
+    pool_size: int = typer.Option(8, "--pool-size"),
+    jobs: int = typer.Option(4, "--jobs", "-j"),
+):
+    thread_counts = [int(t) for t in threads.split(",")]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_folder = Path(temp_dir) / "source"
+        print(f"generate {count} spells ...")
+        manifest = write_release_corpus(source_folder, count, jobs=jobs)
+        release_path = build_release(
+            source_folder, Path(temp_dir) / "release", manifest, jobs=jobs
+        )
+
+        with ReleaseReader(release_path, pool_size=pool_size) as release:
+            lookups = make_lookups(release, count)
+            print(f"\nlookups per second, {pool_size} pooled connections")
+            print(
+                f"{"lookup":<10}"
+                + "".join(f"{f'{t} threads':>14}" for t in thread_counts)
+            )
+            for kind, lookup in lookups.items():
+                rates = [measure(lookup, t, seconds) for t in thread_counts]
+                print(f"{kind:<10}" + "".join(f"{r:>14,.0f}" for r in rates))
+
+
+if __name__ == "__main__":
+    app()
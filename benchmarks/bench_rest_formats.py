@@ -0,0 +1,74 @@
+"""
+this script compares database size, build time and query time of the rest
+column formats
+"""
+
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+import typer
+from corpus import write_corpus
+from harness import build_dataset, time_query
+from dragon_compiler.decoders import RestFormat
+
+app = typer.Typer()
+
+QUERIES = {
+    "extract": (
+        "SELECT COUNT(*) FROM spells "
+        "WHERE json_extract(rest, '$.effects.damage.type') = ?",
+        ("fire",),
+    ),
+    "extract 3": (
+        "SELECT json_extract(rest, '$.name'), "
+        "json_extract(rest, '$.range.distance'), "
+        "json_extract(rest, '$.duration.unit') FROM spells WHERE level = ?",
+        (3,),
+    ),
+    "document": ("SELECT json(rest) FROM spells WHERE level = ?", (3,)),
+}
+
+
+@app.command()
+def main(
+    count: int = typer.Option(
+        50_000, "--count", "-n", help="number of synthetic spell files"
+    ),
+    repeat: int = typer.Option(10, "--repeat", help="runs per query"),
+    jobs: int = typer.Option(4, "--jobs", "-j"),
+):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_folder = Path(temp_dir) / "spells"
+        print(f"generate {count} spells ...")
+        write_corpus(source_folder, count)
+
+        header = "".join(f"{name + " ms":>14}" for name in QUERIES)
+        print(f"\n{"rest format":<12}{"size MiB":>10}{"build s":>9}{header}")
+        for rest_format in RestFormat:
+            start_time = time.perf_counter()
+            db_path = build_dataset(
+                source_folder,
+                Path(temp_dir) / rest_format,
+                {
+                    "columns": [{"name": "level", "type": "INTEGER"}],
+                    "rest_format": rest_format,
+                },
+                jobs=jobs,
+            )
+            build_time = time.perf_counter() - start_time
+            con = sqlite3.connect(db_path)
+            query_times = "".join(
+                f"{time_query(con, query, params, repeat):>14.2f}"
+                for query, params in QUERIES.values()
+            )
+            con.close()
+            size = db_path.stat().st_size / 2**20
+            print(
+                f"{rest_format:<12}{size:>10.1f}{build_time:>9.2f}"
+                f"{query_times}"
+            )
+
+
+if __name__ == "__main__":
+    app()
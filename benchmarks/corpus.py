@@ -0,0 +1,255 @@
+"""
+this module generates synthetic spell and monster source files. It can also
+be run as a script to write a release source folder with a manifest.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import random
+from pathlib import Path
+import typer
+
+CHUNK_SIZE = 10_000
+
+SCHOOLS = [
+    "abjuration",
+    "conjuration",
+    "divination",
+    "enchantment",
+    "evocation",
+    "illusion",
+    "necromancy",
+    "transmutation",
+]
+CLASSES = [
+    "bard",
+    "cleric",
+    "druid",
+    "paladin",
+    "sorcerer",
+    "warlock",
+    "wizard",
+]
+DAMAGE_TYPES = ["acid", "cold", "fire", "force", "lightning", "poison"]
+WORDS = (
+    "der die das zauber feuer drache gegner schaden wirkt auf eine kreatur "
+    "in reichweite und verursacht magischen effekt bis zum ende der runde"
+).split()
+
+
+def make_text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def make_lore(rng: random.Random, text_size: int, nesting: int) -> dict:
+    """creates `nesting` levels of nested lore sections"""
+    lore: dict = {"text": make_text(rng, text_size)}
+    for depth in range(nesting):
+        lore = {"chapter": depth, "text": make_text(rng, 40), "lore": lore}
+    return lore
+
+
+def make_spell(
+    idx: int, rng: random.Random, text_size: int = 200, nesting: int = 0
+) -> dict:
+    """creates a spell that is shaped like examples/spells/abrakadabra.json"""
+    spell = {
+        "name": f"Spell {idx:07d}",
+        "meta": {
+            "dnd_edition": "5e",
+            "source": {
+                "homebrew": rng.random() < 0.3,
+                "book": rng.choice(["Fantastic", "Players Handbook"]),
+                "page": rng.randint(1, 400),
+            },
+            "language": "ger",
+        },
+        "level": rng.randint(0, 9),
+        "school_of_magic": rng.choice(SCHOOLS),
+        "casting_classes": rng.sample(CLASSES, rng.randint(1, 4)),
+        "casting_time": {
+            "unit": rng.choice(["action", "bonus_action", "minute"]),
+            "value": rng.randint(1, 10),
+            "ritual": rng.random() < 0.1,
+        },
+        "range": {
+            "type": "point",
+            "distance": rng.choice([0, 9, 18, 36, 90]),
+            "unit": "meter",
+        },
+        "components": {
+            "verbal": True,
+            "somatic": rng.random() < 0.7,
+            "materials": "",
+        },
+        "duration": {
+            "unit": rng.choice(["round", "minute", "hour"]),
+            "value": rng.randint(1, 10),
+            "requires_concentration": rng.random() < 0.4,
+        },
+        "description": {
+            "text": make_text(rng, text_size),
+            "at_higher_levels": make_text(rng, text_size // 4),
+        },
+        "effects": {
+            "attack_type": "ranged_spell_attack",
+            "damage": {
+                "base_dice": f"{rng.randint(1, 8)}d{rng.choice([4, 6, 8])}",
+                "type": rng.choice(DAMAGE_TYPES),
+                "character_scaling": {"5": "2d4", "11": "3d4", "17": "4d4"},
+            },
+        },
+    }
+    if nesting:
+        spell["lore"] = make_lore(rng, text_size, nesting)
+    return spell
+
+
+def make_monster(
+    idx: int, rng: random.Random, text_size: int = 200, nesting: int = 2
+) -> dict:
+    """creates a monster with `nesting` levels of nested lore sections"""
+    return {
+        "name": f"Monster {idx:07d}",
+        "challenge_rating": rng.randint(0, 30),
+        "hit_points": rng.randint(1, 500),
+        "armor_class": rng.randint(8, 22),
+        "lore": make_lore(rng, text_size, nesting),
+    }
+
+
+def _write_chunk(
+    folder: Path,
+    first_idx: int,
+    count: int,
+    *,
+    kind: str,
+    text_size: int,
+    nesting: int,
+    seed: int,
+) -> list[Path]:
+    # every chunk has its own seed, so the corpus does not depend on jobs
+    rng = random.Random(f"{seed}-{first_idx}")
+    paths = []
+    for idx in range(first_idx, first_idx + count):
+        if kind == "spells":
+            document = make_spell(idx, rng, text_size, nesting)
+        else:
+            document = make_monster(idx, rng, text_size, nesting)
+        path = folder / f"{kind[:-1]}_{idx:07d}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=4)
+        paths.append(path)
+    return paths
+
+
+def write_corpus(
+    folder: Path,
+    count: int,
+    *,
+    kind: str = "spells",
+    text_size: int = 200,
+    nesting: int = 0,
+    seed: int = 42,
+    jobs: int = 1,
+) -> list[Path]:
+    """writes `count` json files to folder and returns their paths"""
+    folder.mkdir(parents=True, exist_ok=True)
+    chunks = [
+        (folder, first_idx, min(CHUNK_SIZE, count - first_idx))
+        for first_idx in range(0, count, CHUNK_SIZE)
+    ]
+    options = {
+        "kind": kind,
+        "text_size": text_size,
+        "nesting": nesting,
+        "seed": seed,
+    }
+    if jobs == 1:
+        return [p for chunk in chunks for p in _write_chunk(*chunk, **options)]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(_write_chunk, *chunk, **options) for chunk in chunks
+        ]
+        return [p for future in futures for p in future.result()]
+
+
+def write_release_corpus(
+    folder: Path,
+    count: int,
+    text_size: int = 200,
+    nesting: int = 0,
+    jobs: int = 1,
+) -> dict:
+    """
+    writes `count` spells, a quarter as many monsters and a manifest that
+    resembles examples/manifest.json. Returns the manifest.
+    """
+    manifest = {
+        "database_info": {"name": "synthetic benchmark data", "version": "0"},
+        "datasets": [
+            {
+                "name": "spells",
+                "source": "spells",
+                "columns": [
+                    {"name": "name", "type": "TEXT", "index": "unique"},
+                    {"name": "level", "type": "INTEGER", "index": True},
+                    {"name": "school_of_magic", "type": "TEXT"},
+                ],
+                "fts": {"columns": ["name", "description.text"]},
+            },
+            {
+                "name": "monsters",
+                "source": "monsters",
+                "columns": [
+                    {"name": "name", "type": "TEXT", "index": "unique"},
+                    {"name": "challenge_rating", "type": "INTEGER"},
+                ],
+            },
+        ],
+    }
+    write_corpus(
+        folder / "spells",
+        count,
+        kind="spells",
+        text_size=text_size,
+        nesting=nesting,
+        jobs=jobs,
+    )
+    write_corpus(
+        folder / "monsters",
+        max(count // 4, 1),
+        kind="monsters",
+        text_size=text_size,
+        nesting=nesting,
+        jobs=jobs,
+    )
+    with (folder / "manifest.json").open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    out: str = typer.Option(..., "--out", "-o", help="output folder"),
+    count: int = typer.Option(
+        1000, "--count", "-n", help="number of spells, 1k to 1M"
+    ),
+    text_size: int = typer.Option(200, "--text-size"),
+    nesting: int = typer.Option(0, "--nesting"),
+    jobs: int = typer.Option(1, "--jobs", "-j"),
+):
+    write_release_corpus(Path(out), count, text_size, nesting, jobs)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,63 @@
+"""this module contains helpers that are shared by the benchmark scripts"""
+
+from datetime import datetime, timezone
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from dragon_compiler.builder import Builder, BuilderConfig
+
+
+def build_dataset(
+    source_folder: Path,
+    out_path: Path,
+    dataset: dict,
+    **config_options,
+) -> Path:
+    """compiles a single manifest dataset and returns the database path"""
+    dataset = {"name": "spells", "source": "."} | dataset
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.WARNING)
+    db_builder = Builder(logger)
+    db_builder.set_config(
+        BuilderConfig(
+            source_folder,
+            out_path,
+            None,
+            db_manifest={"datasets": [dataset]},
+            **config_options,
+        )
+    )
+    db_builder.build()
+    return out_path / f"{dataset["name"]}.sqlite"
+
+
+def build_release(
+    source_folder: Path, out_path: Path, manifest: dict, **config_options
+) -> Path:
+    """compiles a release with its manifest.json and returns its folder"""
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.WARNING)
+    db_builder = Builder(logger)
+    db_builder.set_config(
+        BuilderConfig(
+            source_folder,
+            out_path,
+            None,
+            db_manifest=manifest,
+            **config_options,
+        )
+    )
+    db_builder.build()
+    db_builder.package_release(datetime.now(timezone.utc))
+    return out_path
+
+
+def time_query(
+    con: sqlite3.Connection, query: str, params: tuple, repeat: int
+) -> float:
+    """returns the average time of a query in milliseconds"""
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        con.execute(query, params).fetchall()
+    return (time.perf_counter() - start_time) / repeat * 1000
@@ -0,0 +1,229 @@
+"""
+this script runs the end to end benchmark suite. It compiles synthetic
+corpora of several sizes with `dragon build` and `dragon release`, runs a
+set of representative queries against the release and writes the results
+as json, so that two compiler versions can be compared.
+"""
+
+from importlib.metadata import version
+import datetime as dt
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import typer
+from corpus import write_release_corpus
+from harness import time_query
+
+app = typer.Typer()
+
+QUERIES = {
+    "lookup_name": (
+        "SELECT * FROM spells WHERE name = ?",
+        ("Spell 0000042",),
+    ),
+    "filter_level": ("SELECT id, name FROM spells WHERE level = ?", (3,)),
+    "json_extract": (
+        "SELECT COUNT(*) FROM spells "
+        "WHERE json_extract(rest, '$.effects.damage.type') = ?",
+        ("fire",),
+    ),
+    "full_text": (
+        "SELECT rowid FROM spells_fts WHERE spells_fts MATCH ?",
+        ("drache",),
+    ),
+    "count": ("SELECT COUNT(*) FROM spells", ()),
+}
+
+# metrics where a higher value is better
+HIGHER_IS_BETTER = {"rows_per_s"}
+
+
+def run_compiler(args: list[str], cwd: Path) -> tuple[float, float]:
+    """
+    runs the compiler in a separate process and returns the wall time in
+    seconds and its peak resident memory in MiB
+    """
+    start_time = time.perf_counter()
+    with subprocess.Popen(
+        [sys.executable, "-m", "dragon_compiler.cli", *args],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    ) as process:
+        stderr = process.stderr.read()
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.perf_counter() - start_time
+    if process.returncode:
+        raise RuntimeError(f"compiler failed: {stderr.decode()[-2000:]}")
+    # ru_maxrss is in KiB on linux
+    return wall_time, rusage.ru_maxrss / 1024
+
+
+def count_rows(db_path: Path, table: str) -> int:
+    con = sqlite3.connect(db_path)
+    count = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    con.close()
+    return count
+
+
+def run_scale(
+    work_dir: Path,
+    count: int,
+    *,
+    text_size: int,
+    nesting: int,
+    jobs: int,
+    repeat: int,
+) -> list[dict]:
+    corpus_dir = work_dir / f"corpus_{count}_{text_size}_{nesting}"
+    if not (corpus_dir / "manifest.json").exists():
+        print(f"generate corpus with {count} spells ...")
+        write_release_corpus(corpus_dir, count, text_size, nesting, jobs)
+
+    results = []
+    out_dir = work_dir / f"out_{count}"
+    out_dir.mkdir(exist_ok=True)
+    options = ["--jobs", str(jobs)]
+    benchmarks = {
+        "build": (
+            ["build", "--source", str(corpus_dir / "spells"), "--clean"],
+            [out_dir / "build" / "spells.sqlite"],
+        ),
+        "release": (
+            ["release", "--source", str(corpus_dir)],
+            [
+                out_dir / "release" / f"{n}.sqlite"
+                for n in ("spells", "monsters")
+            ],
+        ),
+    }
+    for name, (args, db_paths) in benchmarks.items():
+        print(f"run {name} with {count} spells ...")
+        wall_time, peak_rss = run_compiler(args + options, out_dir)
+        rows = sum(count_rows(p, p.stem) for p in db_paths)
+        results.append(
+            {
+                "benchmark": name,
+                "scale": count,
+                "wall_s": round(wall_time, 3),
+                "rows": rows,
+                "rows_per_s": round(rows / wall_time, 1),
+                "peak_rss_mib": round(peak_rss, 1),
+                "output_mib": round(
+                    sum(p.stat().st_size for p in db_paths) / 2**20, 2
+                ),
+            }
+        )
+
+    con = sqlite3.connect(out_dir / "release" / "spells.sqlite")
+    results[-1]["queries_ms"] = {
+        name: round(time_query(con, query, params, repeat), 3)
+        for name, (query, params) in QUERIES.items()
+    }
+    con.close()
+    return results
+
+
+def print_results(results: list[dict], baseline: list[dict] | None):
+    base = {(r["benchmark"], r["scale"]): r for r in baseline or []}
+    for result in results:
+        print(f"\n{result["benchmark"]} - {result["scale"]} spells")
+        old = base.get((result["benchmark"], result["scale"]), {})
+        metrics = {
+            k: v for k, v in result.items() if isinstance(v, (int, float))
+        }
+        metrics |= {
+            f"query {k} ms": v for k, v in result.get("queries_ms", {}).items()
+        }
+        old_metrics = old | {
+            f"query {k} ms": v for k, v in old.get("queries_ms", {}).items()
+        }
+        for metric, value in metrics.items():
+            line = f"  {metric:<24}{value:>14}"
+            if old_metrics.get(metric):
+                change = (value - old_metrics[metric]) / old_metrics[metric]
+                is_better = (change > 0) == (metric in HIGHER_IS_BETTER)
+                marker = (
+                    "" if abs(change) < 0.05 else ("+" if is_better else "-")
+                )
+                line += f"{change:>+10.1%} {marker}"
+            print(line)
+
+
+@app.command()
+def main(
+    *,
+    scales: str = typer.Option(
+        "1000,10000",
+        "--scales",
+        help="comma separated numbers of spells, e.g. 1000,100000,1000000",
+    ),
+    text_size: int = typer.Option(
+        200, "--text-size", help="length of the description texts"
+    ),
+    nesting: int = typer.Option(
+        0, "--nesting", help="levels of nested lore sections per document"
+    ),
+    jobs: int = typer.Option(1, "--jobs", "-j"),
+    repeat: int = typer.Option(20, "--repeat", help="runs per query"),
+    output: str = typer.Option(
+        "benchmark_results.json", "--output", "-o", help="result file"
+    ),
+    baseline: str = typer.Option(
+        None, "--baseline", help="result file of a previous run to compare"
+    ),
+    work_dir: str = typer.Option(
+        None,
+        "--work-dir",
+        help="folder that keeps the generated corpora between runs",
+    ),
+):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_path = Path(work_dir or temp_dir)
+        work_path.mkdir(parents=True, exist_ok=True)
+        results = []
+        for count in (int(scale) for scale in scales.split(",")):
+            results += run_scale(
+                work_path,
+                count,
+                text_size=text_size,
+                nesting=nesting,
+                jobs=jobs,
+                repeat=repeat,
+            )
+
+    report = {
+        "compiler_version": version("dragon-compiler"),
+        "python_version": platform.python_version(),
+        "sqlite_version": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "parameters": {
+            "text_size": text_size,
+            "nesting": nesting,
+            "jobs": jobs,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline_results = None
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            baseline_results = json.load(f)["results"]
+    print_results(results, baseline_results)
+    print(f"\nresults are written to {output}")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,20 +1,148 @@
 """This module provides the builder functionality"""
 
 from dataclasses import dataclass, field
+from collections.abc import Iterable, Iterator
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from enum import StrEnum
+import hashlib
+import itertools
 import sqlite3
 import json
 import logging
+import re
+import shutil
+import time
 from importlib.metadata import version
 from pathlib import Path
+from typing import Any, BinaryIO
 import datetime
+from dragon_compiler.artifact import (
+    ArtifactConfig,
+    is_compression_available,
+    iter_artifacts,
+    optimize_database,
+    write_artifact,
+)
+from dragon_compiler.cache import ParseCache
+from dragon_compiler.discovery import SourceDiscovery
+from dragon_compiler.extractors import (
+    ColumnTypeError,
+    TypeCheck,
+    TypeIssue,
+    TypeReport,
+    compile_extractor,
+)
+from dragon_compiler.decoders import JsonBackend, RestFormat, get_decoder
+from dragon_compiler.incremental import (
+    SourceChanges,
+    SourceIndex,
+    hash_file,
+)
+from dragon_compiler.delta import DELTA_FILE_NAME, DeltaError, create_delta
+from dragon_compiler.manifest import (
+    METADATA_TABLE,
+    ColumnStorage,
+    get_database_path,
+    hash_dataset,
+    is_generated_column,
+    load_release_manifest,
+)
+from dragon_compiler.memory import (
+    MemoryBudget,
+    RowBatcher,
+    get_utf8_length,
+    iter_utf8_chunks,
+)
+from dragon_compiler.parallel import OrderedTaskQueue, Resolved
+from dragon_compiler.profiling import (
+    BuildProfiler,
+    NullProfiler,
+    get_peak_rss_mib,
+)
+from dragon_compiler.progress import ProgressReporter
+from dragon_compiler.publish import (
+    get_build_path,
+    iter_temp_files,
+    link_file,
+    publish_database,
+    unshare_file,
+    write_json,
+)
+from dragon_compiler.sources import is_json_lines_file, iter_records
+
+
+class PragmaProfile(StrEnum):
+    """Connection settings that are applied while a dataset is compiled"""
+
+    SAFE = "safe"
+    FAST = "fast"
+    UNSAFE = "unsafe"
+
+
+class ReleaseLayout(StrEnum):
+    """How the datasets of a manifest are stored"""
+
+    # a database file per dataset
+    PER_DATASET = "per-dataset"
+    # all datasets are tables of one database together with the manifest
+    SINGLE = "single"
+
+
+BUILD_PRAGMAS: dict[PragmaProfile, dict[str, str | int]] = {
+    PragmaProfile.SAFE: {},
+    PragmaProfile.FAST: {
+        "journal_mode": "MEMORY",
+        "synchronous": "OFF",
+        "cache_size": -65536,
+        "locking_mode": "EXCLUSIVE",
+    },
+    PragmaProfile.UNSAFE: {
+        "journal_mode": "OFF",
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "locking_mode": "EXCLUSIVE",
+        "temp_store": "MEMORY",
+    },
+}
 
 
 @dataclass
 class BuilderConfig:
+    """Options of a build, e.g. from the command line"""
+
     source_folder: Path
     output_path: Path
     db_name: str
     db_manifest: dict = field(default_factory=dict)
+    batch_size: int = 5000
+    pragma_profile: PragmaProfile = PragmaProfile.FAST
+    jobs: int = 1
+    incremental: bool = False
+    json_backend: JsonBackend = JsonBackend.STDLIB
+    rest_format: RestFormat = RestFormat.TEXT
+    profile: bool = False
+    # log the progress of a dataset every n seconds or rows, 0 disables it
+    progress_seconds: float = 10.0
+    progress_rows: int = 0
+    # compile into a temporary file that replaces the database when done
+    atomic: bool = False
+    layout: ReleaseLayout = ReleaseLayout.PER_DATASET
+    memory: MemoryBudget = field(default_factory=MemoryBudget)
+    # folder of the parse cache that is shared by builds, None disables it
+    cache_dir: Path | None = None
+    cache_size_mib: int = 1024
+    type_check: TypeCheck = TypeCheck.OFF
+    # previous release the release package contains a delta from
+    delta_from: Path | None = None
+    # previous release whose databases are linked instead of compiled if
+    # the sources of their dataset did not change
+    reuse_from: Path | None = None
+    # compressed archive of the release next to its manifest
+    artifact: ArtifactConfig = field(default_factory=ArtifactConfig)
 
 
 @dataclass
@@ -26,16 +154,97 @@ class DatabaseBuildConfig:
 
     name: str
     column_config: list[dict[str, str]] = field(default_factory=list)
+    rest_format: RestFormat = RestFormat.TEXT
+    index_config: list[dict] = field(default_factory=list)
+    fts_config: dict | None = None
+    discovery: SourceDiscovery = field(default_factory=SourceDiscovery)
+    # columns that identify a row across releases, see get_row_key
+    row_key: list[str] | None = None
 
     def __post_init__(self):
+        self.rest_format = RestFormat(self.rest_format)
+        if (
+            self.rest_format == RestFormat.JSONB
+            and sqlite3.sqlite_version_info < (3, 45, 0)
+        ):
+            raise ValueError(
+                f"{self.name}: rest format jsonb requires sqlite 3.45 or "
+                f"newer, found {sqlite3.sqlite_version}"
+            )
         self.column_config.insert(0, {"name": "id", "type": "INTEGER"})
-        self.column_config.append({"name": "rest", "type": "TEXT"})
-        self.table_config = ""
-        for c in self.column_config:
-            self.table_config += f"{c["name"]} {c["type"]}, "
+        self.column_config.append(
+            {
+                "name": "rest",
+                "type": (
+                    "BLOB" if self.rest_format == RestFormat.JSONB else "TEXT"
+                ),
+            }
+        )
+        self.table_config = "id INTEGER PRIMARY KEY, "
+        for c in self.column_config[1:]:
+            self.table_config += (
+                f"{c["name"]} {c["type"]}{self._get_generated_str(c)}, "
+            )
         self.table_config = self.table_config[:-2]
-        param_str = "?, " * len(self.column_config)
-        self._table_insert_str = f"{self.name} VALUES({param_str[:-2]})"
+        if self.row_key and not set(self.row_key) <= set(
+            self.get_column_names()
+        ):
+            raise ValueError(
+                f"{self.name}: the key {self.row_key} contains unknown columns"
+            )
+        self.index_config = [
+            {"columns": [c["name"]], "unique": c["index"] == "unique"}
+            for c in self.column_config
+            if c.get("index")
+        ] + self.index_config
+        self._table_insert_str = self._make_insert_str(
+            "jsonb(?)" if self.rest_format == RestFormat.JSONB else "?"
+        )
+        # the rest is written afterwards with incremental blob i/o
+        self._streamed_insert_str = self._make_insert_str(
+            "CAST(zeroblob(?) AS TEXT)"
+        )
+
+    def _make_insert_str(self, rest_param: str) -> str:
+        inserted_columns = [
+            c["name"] for c in self.column_config if not self._is_generated(c)
+        ]
+        param_str = "?, " * (len(inserted_columns) - 1) + rest_param
+        if len(inserted_columns) == len(self.column_config):
+            return f"{self.name} VALUES({param_str})"
+        return f"{self.name}({", ".join(inserted_columns)}) VALUES({param_str})"
+
+    def _is_generated(self, column: dict) -> bool:
+        return is_generated_column(column)
+
+    def _get_generated_str(self, column: dict) -> str:
+        if not self._is_generated(column):
+            return ""
+        json_path = to_json_path(column.get("path", column["name"]))
+        storage = ColumnStorage(column["storage"]).upper()
+        return (
+            f" GENERATED ALWAYS AS (json_extract(rest, '{json_path}')) "
+            f"{storage}"
+        )
+
+    def get_extracted_paths(self) -> list[str]:
+        """
+        Returns the json paths of the columns whose values are extracted
+        from the documents by the compiler, i.e. without id and rest.
+        """
+        return [
+            c.get("path", c["name"])
+            for c in self.column_config[1:-1]
+            if not self._is_generated(c)
+        ]
+
+    def get_extracted_types(self) -> list[str]:
+        """Returns the declared types of the extracted columns"""
+        return [
+            c["type"]
+            for c in self.column_config[1:-1]
+            if not self._is_generated(c)
+        ]
 
     def get_table_creation_str(self) -> str:
         return f"{self.name} ({self.table_config})"
@@ -43,36 +252,413 @@ class DatabaseBuildConfig:
     def get_table_insert_str(self) -> str:
         return self._table_insert_str
 
+    def get_streamed_insert_str(self) -> str:
+        """
+        Returns the insert statement for rows whose rest is too large to be
+        bound as a parameter. It reserves the space of the rest, which is
+        then written with blobopen. Returns an empty string if the rest
+        format does not support this or if sqlite would read the
+        placeholder as json while the row is inserted.
+        """
+        if self.rest_format == RestFormat.JSONB:
+            # sqlite has to parse the whole text to convert it to jsonb
+            return ""
+        if self._reads_rest_on_insert():
+            return ""
+        return self._streamed_insert_str
+
+    def _reads_rest_on_insert(self) -> bool:
+        """
+        Returns if inserting a row evaluates its rest, i.e. for stored
+        generated columns and for indexes over json paths, expressions or
+        generated columns, which exist during incremental builds. Partial
+        indexes count as well, their condition may read the rest.
+        """
+        if any(
+            ColumnStorage(c.get("storage", ColumnStorage.EXTRACTED))
+            == ColumnStorage.STORED
+            for c in self.column_config
+        ):
+            return True
+        plain_columns = {
+            c["name"]
+            for c in self.column_config[:-1]
+            if not self._is_generated(c)
+        }
+        return any(
+            "where" in index
+            or any(
+                not isinstance(term, str) or term not in plain_columns
+                for term in index["columns"]
+            )
+            for index in self.index_config
+        )
+
     def get_column_names(self) -> list[str]:
         return [c["name"] for c in self.column_config]
 
+    def get_row_key(self) -> list[str]:
+        """
+        Returns the columns that identify a row across releases. Without an
+        explicit key it is the first unique index over plain columns, else
+        the content of the row, i.e. all stored columns but the id, as the
+        id of a row changes once rows are inserted before it.
+        """
+        if self.row_key:
+            return list(self.row_key)
+        column_names = set(self.get_column_names())
+        for index in self.index_config:
+            if (
+                index.get("unique")
+                and "where" not in index
+                and all(
+                    isinstance(term, str) and term in column_names
+                    for term in index["columns"]
+                )
+            ):
+                return list(index["columns"])
+        return [
+            c["name"]
+            for c in self.column_config
+            if c["name"] != "id" and not self._is_generated(c)
+        ]
+
+    def get_index_creation_strs(self) -> list[str]:
+        """
+        Returns the statements that create the indexes of the manifest. An
+        index is made of columns, sql expressions or json paths into the
+        rest column and can be unique or partial.
+        """
+        index_creation_strs = []
+        for idx, index in enumerate(self.index_config):
+            terms = [self._get_index_term(term) for term in index["columns"]]
+            index_name = get_index_name(self.name, idx, index)
+            unique = "UNIQUE " if index.get("unique") else ""
+            where = f" WHERE {index["where"]}" if "where" in index else ""
+            index_creation_strs.append(
+                f"{unique}INDEX IF NOT EXISTS {index_name} "
+                f"ON {self.name} ({", ".join(terms)}){where}"
+            )
+        return index_creation_strs
+
+    def get_fts_table_name(self) -> str:
+        return f"{self.name}_fts"
+
+    def get_fts_columns(self) -> list[tuple[str, str]]:
+        """Returns name and json path of every full text search column"""
+        fts_columns = []
+        for column in self.fts_config["columns"]:
+            if isinstance(column, str):
+                column = {"path": column}
+            name = column.get("name", column["path"].lstrip("$.")).replace(
+                ".", "_"
+            )
+            fts_columns.append((name, to_json_path(column["path"])))
+        return fts_columns
+
+    def get_fts_creation_strs(self) -> list[str]:
+        """
+        Returns the statements that create an external content fts5 table.
+        Its content is a view that extracts the text fields from rest, so
+        the texts are not stored twice.
+        """
+        if not self.fts_config:
+            return []
+        fts_table = self.get_fts_table_name()
+        fts_columns = self.get_fts_columns()
+        selected_columns = ", ".join(
+            f"json_extract(rest, '{path}') AS {name}"
+            for name, path in fts_columns
+        )
+        options = [
+            ", ".join(name for name, _ in fts_columns),
+            f"content='{fts_table}_content'",
+            "content_rowid='id'",
+        ]
+        if "tokenize" in self.fts_config:
+            options.append(f"tokenize='{self.fts_config["tokenize"]}'")
+        return [
+            f"VIEW IF NOT EXISTS {fts_table}_content AS "
+            f"SELECT id, {selected_columns} FROM {self.name}",
+            f"VIRTUAL TABLE IF NOT EXISTS {fts_table} "
+            f"USING fts5({", ".join(options)})",
+        ]
+
+    def _get_index_term(self, term: str | dict) -> str:
+        if isinstance(term, dict):
+            return f"json_extract(rest, '{to_json_path(term["path"])}')"
+        return term
+
+    def get_config_hash(self) -> str:
+        """Fingerprint of everything that affects the rows of the dataset"""
+        config = {
+            "compiler_version": version("dragon-compiler"),
+            "columns": self.column_config,
+            "rest_format": self.rest_format,
+            "indexes": self.get_index_creation_strs(),
+            "fts": self.get_fts_creation_strs(),
+        }
+        return hashlib.sha256(
+            json.dumps(config, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+
+def get_index_name(dataset_name: str, idx: int, index: dict) -> str:
+    """Returns the name of the idx-th index of a dataset"""
+    return index.get("name", f"{dataset_name}_idx{idx}")
+
+
+def split_json_path(path: str) -> list[str | int]:
+    """Splits a path like 'effects.damage.type' or '$.classes[0]' into keys"""
+    keys = []
+    for key in re.split(r"\.|\[", path.removeprefix("$").lstrip(".")):
+        if key.endswith("]"):
+            keys.append(int(key[:-1]))
+        elif key:
+            keys.append(key)
+    return keys
+
+
+def to_json_path(path: str) -> str:
+    """Converts a dotted path like 'casting_time.unit' to a sqlite json path"""
+    return path if path.startswith("$") else f"$.{path}"
+
+
+@dataclass
+class DatasetBuildStats:
+    """Summary of a single compiled dataset"""
+
+    rows: int
+    seconds: float
+    profiler: BuildProfiler = field(default_factory=NullProfiler)
+    type_report: TypeReport | None = None
+    # fingerprint of the sources and the config the dataset was built from
+    source_sha256: str | None = None
+    # content hash of a database that was reused from a previous release
+    content_sha256: str | None = None
+    reused: bool = False
+
+    def to_manifest(self) -> dict:
+        manifest = {"rows": self.rows, "seconds": round(self.seconds, 3)}
+        if self.source_sha256 is not None:
+            manifest["source_sha256"] = self.source_sha256
+        if self.reused:
+            manifest["reused"] = True
+        if self.profiler.enabled:
+            profile = self.profiler.to_dict()
+            manifest["stages"] = profile["stages"]
+            manifest["counters"] = profile["counters"]
+        if self.type_report is not None and self.type_report.count:
+            manifest["type_errors"] = self.type_report.to_manifest()
+        return manifest
+
+
+# a source file or a record of a json lines file and the file it belongs to
+SourceItem = Path | tuple[Path, bytes]
+
+
+@dataclass
+class RowReader:
+    """
+    Turns json source documents into rows without id. Instances are sent to
+    the worker processes, therefore the decoder and the extractor are
+    created lazily.
+
+    Values that do not match the type of their column are collected and
+    handed out by `pop_type_issues` after every row.
+    """
+
+    column_paths: list[str]
+    json_backend: JsonBackend = JsonBackend.STDLIB
+    rest_format: RestFormat = RestFormat.TEXT
+    column_types: list[str] = field(default_factory=list)
+    type_check: TypeCheck = TypeCheck.OFF
+
+    def __post_init__(self):
+        self._load = None
+        self._extract = None
+        self._type_issues: list[TypeIssue] = []
+        self._split_paths = [split_json_path(p) for p in self.column_paths]
+        # only the top level keys have to be decoded
+        self._top_level_keys = list(
+            dict.fromkeys(keys[0] for keys in self._split_paths)
+        )
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_load"] = None
+        state["_extract"] = None
+        return state
+
+    def read_file(self, file: Path) -> Iterator[tuple]:
+        for record in iter_records(file):
+            yield self.read(record)
+
+    def read_items(
+        self, items: list[SourceItem]
+    ) -> list[tuple[Path, tuple, list[TypeIssue] | None]]:
+        """
+        Worker entry point that reads a chunk of source items. An item is
+        either a source file or a single record of a json lines file.
+        """
+        rows = []
+        for item in items:
+            if isinstance(item, tuple):
+                file, record = item
+                rows.append((file, self.read(record), self.pop_type_issues()))
+            else:
+                rows.extend(
+                    (item, row, self.pop_type_issues())
+                    for row in self.read_file(item)
+                )
+        return rows
+
+    def pop_type_issues(self) -> list[TypeIssue] | None:
+        """Returns the type issues of the rows read since the last call"""
+        if not self._type_issues:
+            return None
+        issues = self._type_issues.copy()
+        # the compiled extractor keeps a reference to the list
+        self._type_issues.clear()
+        return issues
+
+    def read(self, data: bytes) -> tuple:
+        return self.build_row(*self.decode(data))
+
+    def get_fingerprint(self) -> str:
+        """Fingerprint of everything that affects the rows that are read"""
+        config = {
+            "compiler_version": version("dragon-compiler"),
+            "column_paths": self.column_paths,
+            "json_backend": self.json_backend,
+            "rest_format": self.rest_format,
+            "column_types": self.column_types,
+            "type_check": self.type_check,
+        }
+        return hashlib.sha256(
+            json.dumps(config, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def decode(self, data: bytes) -> tuple[Any, str]:
+        """Returns the decoded document and the value of the rest column"""
+        if self._load is None:
+            self._load = get_decoder(self.json_backend).get_row_loader(
+                self._top_level_keys, self.rest_format
+            )
+        return self._load(data)
+
+    def build_row(self, document: Any, rest: str) -> tuple:
+        if self._extract is None:
+            self._extract = compile_extractor(
+                self._split_paths,
+                self.column_types,
+                self.type_check,
+                self._type_issues,
+                self.column_paths,
+            )
+        return self._extract(document, rest)
+
 
 class Builder:
     """This class builds the database"""
 
     _db_build_configs: list[DatabaseBuildConfig]
+    _executor: Executor | None
+    _build_stats: dict[str, DatasetBuildStats]
+    _profiler: BuildProfiler
+    _parse_cache: ParseCache | None
+    _type_reports: dict[str, TypeReport]
+
+    PARSE_CHUNK_SIZE = 64
+    # json files from this size on are split into records like json lines
+    SPLIT_FILE_BYTES = 1 << 20
+    CONSOLIDATED_DB_NAME = "release"
+    METADATA_TABLE = METADATA_TABLE
 
     def __init__(self, logger: logging.Logger):
         self._config = None
         self.logger = logger
         self._db_build_configs = []
+        self._executor = None
+        self._build_stats = {}
+        self._profiler = NullProfiler()
+        self._parse_cache = None
+        self._type_reports = {}
+        self._reuse_manifest = None
+        # source indexes that are kept in memory between watch updates
+        self._source_indexes: dict[str, SourceIndex] = {}
 
     def set_config(self, config: BuilderConfig):
         self._config = config
+        self._profiler = self._create_profiler()
+        if config.cache_dir is not None:
+            self.logger.info("parse cache is %s", config.cache_dir)
+            self._parse_cache = ParseCache(
+                Path(config.cache_dir),
+                config.cache_size_mib * 2**20,
+                self.logger,
+            )
         self.logger.info("source path is %s", self._config.source_folder)
         self.logger.info("output path is %s", self._config.output_path)
+        if self._config.delta_from is not None and (
+            Path(self._config.delta_from).resolve()
+            == Path(self._config.output_path).resolve()
+        ):
+            raise ValueError(
+                "the previous release of a delta must not be the output path"
+            )
+        if self._config.reuse_from is not None:
+            if self._is_consolidated() or self._config.incremental:
+                raise ValueError(
+                    "reusing databases is only supported for full builds "
+                    f"with the '{ReleaseLayout.PER_DATASET}' layout"
+                )
+            if (
+                Path(self._config.reuse_from).resolve()
+                == Path(self._config.output_path).resolve()
+            ):
+                raise ValueError(
+                    "the previous release to reuse must not be the output path"
+                )
+        compression = self._config.artifact.compression
+        if compression is not None and not is_compression_available(
+            compression
+        ):
+            raise ValueError(f"{compression} compression requires python 3.14")
+        # fail early instead of in the worker processes
+        get_decoder(self._config.json_backend)
+        if self._is_consolidated() and self._config.incremental:
+            raise ValueError(
+                "incremental builds are only supported for the "
+                f"'{ReleaseLayout.PER_DATASET}' layout"
+            )
         if self._config.db_manifest:
             for db_info in self._config.db_manifest["datasets"]:
                 self._db_build_configs.append(
                     DatabaseBuildConfig(
-                        db_info["name"], db_info["columns"].copy()
+                        db_info["name"],
+                        db_info["columns"].copy(),
+                        db_info.get("rest_format", self._config.rest_format),
+                        db_info.get("indexes", []).copy(),
+                        db_info.get("fts"),
+                        SourceDiscovery.from_manifest(db_info),
+                        db_info.get("key"),
                     )
                 )
         else:
             self._db_build_configs.append(
-                DatabaseBuildConfig(self._config.db_name)
+                DatabaseBuildConfig(
+                    self._config.db_name, rest_format=self._config.rest_format
+                )
             )
 
+    def _create_profiler(self) -> BuildProfiler:
+        return BuildProfiler() if self._config.profile else NullProfiler()
+
+    def get_profiler(self) -> BuildProfiler:
+        """Returns the stage timings of all datasets of the last build"""
+        return self._profiler
+
     def load_db_manifest(self):
         with self._config.source_folder.open("r", encoding="utf-8") as f:
             self.db_manifest = json.load(f)
@@ -80,86 +666,1240 @@ class Builder:
     def _is_build_with_manifest(self) -> bool:
         return self._config.db_name is None
 
+    def _is_consolidated(self) -> bool:
+        return (
+            self._is_build_with_manifest()
+            and ReleaseLayout(self._config.layout) == ReleaseLayout.SINGLE
+        )
+
+    def get_consolidated_db_path(self) -> Path:
+        return self._config.output_path / f"{self.CONSOLIDATED_DB_NAME}.sqlite"
+
     def build(self):
         self.logger.info("start build process\n")
+        start_time = time.perf_counter()
         self._config.output_path.mkdir(parents=True, exist_ok=True)
+        self._reuse_manifest = self._load_reuse_manifest()
 
-        if self._is_build_with_manifest():
-            for idx, db_build_config in enumerate(self._db_build_configs):
-                db_file = db_build_config.name + ".sqlite"
-                db_path = self._config.output_path / db_file
-                source_folder = (
-                    self._config.source_folder
-                    / self._config.db_manifest["datasets"][idx]["source"]
-                )
-                self._build_dataset(db_path, source_folder, db_build_config)
-        else:
-            db_file = self._config.db_name + ".sqlite"
-            db_path = self._config.output_path / db_file
-            self._build_dataset(
-                db_path, self._config.source_folder, self._db_build_configs[0]
+        if self._config.jobs > 1:
+            self.logger.info(
+                "parse source files with %d jobs", self._config.jobs
             )
+            self._executor = ProcessPoolExecutor(max_workers=self._config.jobs)
+        try:
+            self._build_all_datasets()
+        finally:
+            if self._executor:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+        if self._parse_cache is not None:
+            self._parse_cache.evict()
 
+        self._profiler.wall_seconds += time.perf_counter() - start_time
+        peak_rss_mib = get_peak_rss_mib()
+        if peak_rss_mib is not None:
+            self.logger.info("peak memory use was %.1f MiB", peak_rss_mib)
         self.logger.info("build process complete\n")
 
+    def _load_reuse_manifest(self) -> dict | None:
+        if self._config.reuse_from is None:
+            return None
+        try:
+            return load_release_manifest(Path(self._config.reuse_from))
+        except (OSError, ValueError) as e:
+            self.logger.warning(
+                "no database is reused, previous release can not be read: %s",
+                e,
+            )
+            return None
+
+    def _get_dataset_tasks(
+        self,
+    ) -> list[tuple[Path, Path, DatabaseBuildConfig]]:
+        """Returns database path, source folder and config of every dataset"""
+        if not self._is_build_with_manifest():
+            db_file = self._config.db_name + ".sqlite"
+            return [
+                (
+                    self._config.output_path / db_file,
+                    self._config.source_folder,
+                    self._db_build_configs[0],
+                )
+            ]
+        tasks = []
+        for idx, db_build_config in enumerate(self._db_build_configs):
+            db_file = db_build_config.name + ".sqlite"
+            source_folder = (
+                self._config.source_folder
+                / self._config.db_manifest["datasets"][idx]["source"]
+            )
+            tasks.append(
+                (
+                    self._config.output_path / db_file,
+                    source_folder,
+                    db_build_config,
+                )
+            )
+        return tasks
+
+    def get_dataset_sources(self) -> dict[str, tuple[Path, SourceDiscovery]]:
+        """Returns the source folder and file discovery of every dataset"""
+        return {
+            db_build_config.name: (source_folder, db_build_config.discovery)
+            for _, source_folder, db_build_config in self._get_dataset_tasks()
+        }
+
+    def _build_all_datasets(self):
+        tasks = self._get_dataset_tasks()
+        if self._is_consolidated():
+            all_stats = self._build_consolidated_database(tasks)
+        elif self._config.jobs > 1 and len(tasks) > 1:
+            # every dataset has its own database file, so the datasets only
+            # share the process pool that parses the source files
+            with ThreadPoolExecutor(
+                max_workers=min(self._config.jobs, len(tasks)),
+                thread_name_prefix="dataset",
+            ) as dataset_pool:
+                all_stats = list(
+                    dataset_pool.map(lambda t: self._build_dataset(*t), tasks)
+                )
+        else:
+            all_stats = [self._build_dataset(*task) for task in tasks]
+
+        for (_, _, db_build_config), stats in zip(tasks, all_stats):
+            self._build_stats[db_build_config.name] = stats
+            self._profiler.merge(stats.profiler)
+
     def _build_dataset(
         self,
         db_path: Path,
         source_folder: Path,
         db_build_config: DatabaseBuildConfig,
-    ):
+    ) -> DatasetBuildStats:
+        start_time = time.perf_counter()
+        profiler = self._create_profiler()
+        source_hash = None
+        if self._reuse_manifest is not None:
+            with profiler.stage("hash_sources"):
+                source_hash = self._hash_source_folder(
+                    source_folder, db_build_config
+                )
+            stats = self._reuse_dataset(
+                db_path,
+                db_build_config,
+                source_hash=source_hash,
+                start_time=start_time,
+                profiler=profiler,
+            )
+            if stats is not None:
+                return stats
+        progress = self._create_progress_reporter(db_build_config)
+        source_index = None
+        if self._config.incremental:
+            source_index = self._load_source_index(db_path, db_build_config)
+        build_path = db_path
+        if self._config.atomic:
+            build_path = self._prepare_build_file(db_path, source_index)
+        elif (
+            source_index is not None
+            and db_path.exists()
+            and unshare_file(db_path)
+        ):
+            # the database is shared with a release that reused it
+            self.logger.info("copied hardlinked %s", db_path)
+
+        try:
+            row_count, has_changes = self._compile_dataset(
+                build_path,
+                source_folder,
+                db_build_config,
+                source_index,
+                profiler=profiler,
+                progress=progress,
+            )
+            if build_path != db_path:
+                with profiler.stage("publish"):
+                    self._publish_build_file(
+                        build_path,
+                        db_path,
+                        has_changes or not db_path.exists(),
+                    )
+        except BaseException:
+            if build_path != db_path:
+                # the published database and its index are still intact
+                build_path.unlink(missing_ok=True)
+            elif source_index is not None:
+                # the database may not match the index anymore
+                SourceIndex.get_path(db_path).unlink(missing_ok=True)
+            raise
+        total_rows = row_count
+        if source_index is not None:
+            source_index.save(SourceIndex.get_path(db_path))
+            total_rows = source_index.get_row_count()
+            source_hash = self._hash_source_index(source_index, db_build_config)
+        return self._get_dataset_stats(
+            db_build_config,
+            start_time,
+            row_count=row_count,
+            total_rows=total_rows,
+            profiler=profiler,
+            source_hash=source_hash,
+        )
+
+    def _get_source_hash(
+        self,
+        db_build_config: DatabaseBuildConfig,
+        file_hashes: Iterable[tuple[str, str]],
+    ) -> str:
+        """
+        Fingerprint of everything the rows of a dataset are compiled from:
+        the relative path and content hash of every source file, the dataset
+        config and the build options that change the rows.
+        """
+        source_hash = hashlib.sha256(
+            json.dumps(
+                {
+                    "config_hash": db_build_config.get_config_hash(),
+                    "json_backend": self._config.json_backend,
+                    "type_check": self._config.type_check,
+                },
+                sort_keys=True,
+            ).encode("utf-8")
+        )
+        for rel_path, sha256 in sorted(file_hashes):
+            source_hash.update(f"{rel_path}\0{sha256}\n".encode("utf-8"))
+        return source_hash.hexdigest()
+
+    def _hash_source_folder(
+        self, source_folder: Path, db_build_config: DatabaseBuildConfig
+    ) -> str:
+        """Source hash that reads every source file of the dataset"""
+        file_hashes = []
+        if source_folder.is_dir():
+            file_hashes = [
+                (rel_path, hash_file(Path(entry.path)))
+                for rel_path, entry in db_build_config.discovery.iter_entries(
+                    source_folder
+                )
+            ]
+        return self._get_source_hash(db_build_config, file_hashes)
+
+    def _hash_source_index(
+        self, source_index: SourceIndex, db_build_config: DatabaseBuildConfig
+    ) -> str:
+        """
+        Source hash from the file hashes of an incremental build, which only
+        hashed the files whose size or modification time changed
+        """
+        return self._get_source_hash(
+            db_build_config,
+            (
+                (rel_path, entry.sha256)
+                for rel_path, entry in source_index.entries.items()
+            ),
+        )
+
+    def _reuse_dataset(
+        self,
+        db_path: Path,
+        db_build_config: DatabaseBuildConfig,
+        *,
+        source_hash: str,
+        start_time: float,
+        profiler: BuildProfiler,
+    ) -> DatasetBuildStats | None:
+        """
+        Links the database of the previous release if it was built from the
+        same sources and returns its stats, or returns None if the dataset
+        has to be compiled.
+        """
+        previous = self._reuse_manifest["datasets"].get(db_build_config.name)
+        if (
+            not previous
+            or previous.get("build", {}).get("source_sha256") != source_hash
+        ):
+            return None
+        previous_path = get_database_path(
+            Path(self._config.reuse_from),
+            self._reuse_manifest,
+            db_build_config.name,
+        )
+        if not previous_path.is_file():
+            return None
+        with profiler.stage("reuse"):
+            linked = link_file(previous_path, db_path)
+        # the database was not built with the index of an older build
+        SourceIndex.get_path(db_path).unlink(missing_ok=True)
+        self.logger.info(
+            "%s is unchanged, %s %s",
+            db_build_config.name,
+            "linked" if linked else "copied",
+            previous_path,
+        )
+        duration = time.perf_counter() - start_time
+        profiler.wall_seconds = duration
+        return DatasetBuildStats(
+            previous["build"]["rows"],
+            duration,
+            profiler,
+            source_sha256=source_hash,
+            content_sha256=previous.get("content_sha256"),
+            reused=True,
+        )
+
+    def _get_dataset_stats(
+        self,
+        db_build_config: DatabaseBuildConfig,
+        start_time: float,
+        *,
+        row_count: int,
+        total_rows: int,
+        profiler: BuildProfiler,
+        source_hash: str | None = None,
+    ) -> DatasetBuildStats:
+        duration = time.perf_counter() - start_time
+        profiler.wall_seconds = duration
+        profiler.add("rows", row_count)
+
+        self.logger.info(
+            "added %d entries to %s in %.2f s (%.0f rows/s)",
+            row_count,
+            db_build_config.name,
+            duration,
+            row_count / duration if duration else 0.0,
+        )
+        return DatasetBuildStats(
+            total_rows,
+            duration,
+            profiler,
+            self._type_reports.get(db_build_config.name),
+            source_hash,
+        )
+
+    def _build_consolidated_database(
+        self, tasks: list[tuple[Path, Path, DatabaseBuildConfig]]
+    ) -> list[DatasetBuildStats]:
+        """
+        Writes all datasets as tables of a single database, one after the
+        other over the same connection and with one transaction each.
+        """
+        db_path = self.get_consolidated_db_path()
+        build_path = db_path
+        if self._config.atomic:
+            build_path = self._prepare_build_file(db_path, None)
+        else:
+            db_path.unlink(missing_ok=True)
+
+        all_stats = []
+        try:
+            con = sqlite3.connect(build_path)
+            cursor = con.cursor()
+            saved_pragmas = self._apply_build_pragmas(con)
+            try:
+                for _, source_folder, db_build_config in tasks:
+                    start_time = time.perf_counter()
+                    profiler = self._create_profiler()
+                    progress = self._create_progress_reporter(db_build_config)
+                    row_count = self._write_dataset(
+                        con,
+                        cursor,
+                        source_folder,
+                        db_build_config,
+                        source_index=None,
+                        profiler=profiler,
+                        progress=progress,
+                    )
+                    all_stats.append(
+                        self._get_dataset_stats(
+                            db_build_config,
+                            start_time,
+                            row_count=row_count,
+                            total_rows=row_count,
+                            profiler=profiler,
+                        )
+                    )
+                self._analyze(con, self._profiler)
+            finally:
+                self._close_build_connection(con, saved_pragmas)
+            if build_path != db_path:
+                with self._profiler.stage("publish"):
+                    self._publish_build_file(build_path, db_path, True)
+        except BaseException:
+            if build_path != db_path:
+                build_path.unlink(missing_ok=True)
+            raise
+        return all_stats
+
+    def _compile_dataset(
+        self,
+        db_path: Path,
+        source_folder: Path,
+        db_build_config: DatabaseBuildConfig,
+        source_index: SourceIndex | None,
+        *,
+        profiler: BuildProfiler,
+        progress: ProgressReporter,
+    ) -> tuple[int, bool]:
+        """
+        Writes the rows of the dataset into the database file and returns
+        the number of added rows and if the database was changed at all.
+        """
         con = sqlite3.connect(db_path)
         cursor = con.cursor()
+        saved_pragmas = self._apply_build_pragmas(con)
+        try:
+            row_count = self._write_dataset(
+                con,
+                cursor,
+                source_folder,
+                db_build_config,
+                source_index=source_index,
+                profiler=profiler,
+                progress=progress,
+            )
+            self._analyze(con, profiler)
+            return row_count, bool(con.total_changes)
+        finally:
+            self._close_build_connection(con, saved_pragmas)
+
+    def _create_progress_reporter(
+        self, db_build_config: DatabaseBuildConfig
+    ) -> ProgressReporter:
+        return ProgressReporter(
+            self.logger,
+            db_build_config.name,
+            self._config.progress_seconds,
+            self._config.progress_rows,
+        )
 
-        self.logger.info("create sqlite table with the following columns:")
-        self.logger.info(f"-> {db_build_config.get_table_creation_str()}\n")
+    def _close_build_connection(
+        self, con: sqlite3.Connection, saved_pragmas: dict[str, str | int]
+    ):
+        if con.in_transaction:
+            # a failed build, the pragmas can not be changed before
+            con.rollback()
+        self._restore_pragmas(con, saved_pragmas)
+        con.close()
+
+    def _write_dataset(
+        self,
+        con: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        source_folder: Path,
+        db_build_config: DatabaseBuildConfig,
+        *,
+        source_index: SourceIndex | None,
+        profiler: BuildProfiler,
+        progress: ProgressReporter,
+    ) -> int:
+        """Creates and fills the table of a dataset in one transaction"""
+        if source_index is None or not source_index.entries:
+            self.logger.info("create sqlite table with the following columns:")
+            self.logger.info(
+                "-> %s\n", db_build_config.get_table_creation_str()
+            )
+
+            with profiler.stage("schema"):
+                cursor.execute(
+                    "CREATE TABLE " + db_build_config.get_table_creation_str()
+                )
 
+        con.execute("BEGIN")
+        if source_index is None:
+            rows = self._iter_rows(
+                source_folder, db_build_config, profiler, progress
+            )
+            row_count = self._insert_rows(
+                cursor,
+                db_build_config,
+                rows,
+                profiler=profiler,
+                progress=progress,
+            )
+        else:
+            row_count = self._apply_source_changes(
+                cursor,
+                source_folder,
+                db_build_config,
+                source_index,
+                profiler=profiler,
+                progress=progress,
+            )
+        self._finalize_dataset(con, cursor, db_build_config, profiler)
+        return row_count
+
+    def _prepare_build_file(
+        self, db_path: Path, source_index: SourceIndex | None
+    ) -> Path:
+        """
+        Returns the temporary file the dataset is compiled into. Incremental
+        builds start from a copy of the published database.
+        """
+        build_path = get_build_path(db_path)
+        # left over by a crashed build
+        build_path.unlink(missing_ok=True)
+        if source_index is not None and source_index.entries:
+            shutil.copyfile(db_path, build_path)
+        return build_path
+
+    def _publish_build_file(
+        self, build_path: Path, db_path: Path, has_changes: bool
+    ):
+        if not has_changes:
+            # nothing changed, the published database stays untouched
+            build_path.unlink()
+            return
+        # the index is saved again after the rename, a crash in between
+        # leads to a full rebuild instead of a mismatching index
+        SourceIndex.get_path(db_path).unlink(missing_ok=True)
+        if publish_database(build_path, db_path):
+            self.logger.info("compacted %s with VACUUM INTO", db_path.name)
+        self.logger.info("published %s", db_path)
+
+    def _finalize_dataset(
+        self,
+        con: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        db_build_config: DatabaseBuildConfig,
+        profiler: BuildProfiler,
+    ):
+        """
+        Creates the indexes after the bulk load, which is cheaper than
+        updating them for every row.
+        """
+        for index_creation_str in db_build_config.get_index_creation_strs():
+            self.logger.info("-> CREATE %s", index_creation_str)
+            with profiler.stage("index"):
+                cursor.execute("CREATE " + index_creation_str)
+        if db_build_config.fts_config:
+            with profiler.stage("fts"):
+                self._build_fts_table(con, cursor, db_build_config)
+        with profiler.stage("commit"):
+            con.commit()
+
+    def _analyze(self, con: sqlite3.Connection, profiler: BuildProfiler):
+        """Collects the statistics for the query planner of the consumers"""
+        if con.total_changes:
+            with profiler.stage("analyze"):
+                con.execute("ANALYZE")
+                con.execute("PRAGMA optimize")
+
+    def _build_fts_table(
+        self,
+        con: sqlite3.Connection,
+        cursor: sqlite3.Cursor,
+        db_build_config: DatabaseBuildConfig,
+    ):
+        if not con.total_changes:
+            return
+        fts_table = db_build_config.get_fts_table_name()
+        for fts_creation_str in db_build_config.get_fts_creation_strs():
+            self.logger.info("-> CREATE %s", fts_creation_str)
+            cursor.execute("CREATE " + fts_creation_str)
+        # filling the whole index at once is much faster than a trigger per
+        # row and is also used for incremental builds
         cursor.execute(
-            "CREATE TABLE " + db_build_config.get_table_creation_str()
+            f"INSERT INTO {fts_table}({fts_table}) VALUES('rebuild')"
+        )
+        cursor.execute(
+            f"INSERT INTO {fts_table}({fts_table}) VALUES('optimize')"
         )
 
-        for idx, file in enumerate(source_folder.glob("*.json")):
-            self.logger.info(f"read file: {file}")
-            with file.open("r", encoding="utf-8") as f:
-                json_file = json.load(f)
+    def _insert_rows(
+        self,
+        cursor: sqlite3.Cursor,
+        db_build_config: DatabaseBuildConfig,
+        rows: Iterator[tuple],
+        *,
+        profiler: BuildProfiler,
+        progress: ProgressReporter,
+    ) -> int:
+        row_count = 0
+        insert_str = f"INSERT INTO {db_build_config.get_table_insert_str()}"
+        streamed_insert_str = db_build_config.get_streamed_insert_str()
+        memory = self._config.memory
+        batcher = RowBatcher(
+            self._config.batch_size,
+            max_batch_bytes=memory.get_max_batch_bytes(),
+            max_row_bytes=(
+                memory.get_max_row_bytes() if streamed_insert_str else None
+            ),
+            limit_mib=memory.limit_mib,
+            logger=self.logger,
+        )
+        for batch, is_oversized in batcher.iter_batches(rows):
+            with profiler.stage("insert"):
+                if is_oversized:
+                    self._insert_streamed_row(
+                        cursor,
+                        db_build_config.name,
+                        f"INSERT INTO {streamed_insert_str}",
+                        batch[0],
+                    )
+                    profiler.add("streamed_rows")
+                else:
+                    cursor.executemany(insert_str, batch)
+            row_count += len(batch)
+            progress.update(len(batch))
+        return row_count
 
-            row_data = (idx,)
-            for col_name in db_build_config.get_column_names()[1:-1]:
-                row_data += (json_file.get(col_name),)
-            row_data += (json.dumps(json_file, ensure_ascii=False),)
+    def _insert_streamed_row(
+        self, cursor: sqlite3.Cursor, table: str, insert_str: str, row: tuple
+    ):
+        """
+        Inserts a row with a placeholder of the size of its rest and writes
+        the rest in chunks, so sqlite does not copy the whole document when
+        it is bound. The rest itself is still a single python string.
+        """
+        *values, rest = row
+        cursor.execute(insert_str, (*values, get_utf8_length(rest)))
+        with cursor.connection.blobopen(table, "rest", values[0]) as blob:
+            for chunk in iter_utf8_chunks(rest):
+                blob.write(chunk)
+
+    def _load_source_index(
+        self, db_path: Path, db_build_config: DatabaseBuildConfig
+    ) -> SourceIndex:
+        """
+        Returns the index of the previous build or an empty index if the
+        dataset has to be rebuilt from scratch.
+        """
+        config_hash = db_build_config.get_config_hash()
+        index_path = SourceIndex.get_path(db_path)
+        source_index = (
+            SourceIndex.load(index_path) if db_path.exists() else None
+        )
+        if source_index is not None and source_index.config_hash == config_hash:
+            return source_index
 
-            cursor.execute(
-                f"INSERT INTO {db_build_config.get_table_insert_str()}",
-                row_data,
+        if db_path.exists():
+            self.logger.info(
+                "column config of %s changed, rebuild the whole dataset",
+                db_build_config.name,
             )
-            self.logger.info(f"added entry: {json_file.get("name")}")
+            if not self._config.atomic:
+                db_path.unlink()
+        index_path.unlink(missing_ok=True)
+        return SourceIndex(config_hash)
 
-        con.commit()
-        con.close()
+    def _apply_source_changes(
+        self,
+        cursor: sqlite3.Cursor,
+        source_folder: Path,
+        db_build_config: DatabaseBuildConfig,
+        source_index: SourceIndex,
+        *,
+        profiler: BuildProfiler,
+        progress: ProgressReporter,
+    ) -> int:
+        with profiler.stage("discover"):
+            changes = source_index.update(
+                source_folder,
+                db_build_config.discovery.iter_files(source_folder),
+            )
+        self.logger.info(
+            "%s: %d added, %d changed, %d unchanged files, "
+            "%d obsolete entries",
+            db_build_config.name,
+            len(changes.added),
+            len(changes.changed),
+            changes.unchanged,
+            len(changes.obsolete_ids),
+        )
+        return self._write_source_changes(
+            cursor,
+            source_folder,
+            db_build_config,
+            source_index,
+            changes=changes,
+            profiler=profiler,
+            progress=progress,
+        )
+
+    def _write_source_changes(
+        self,
+        cursor: sqlite3.Cursor,
+        source_folder: Path,
+        db_build_config: DatabaseBuildConfig,
+        source_index: SourceIndex,
+        *,
+        changes: SourceChanges,
+        profiler: BuildProfiler,
+        progress: ProgressReporter,
+    ) -> int:
+        """Deletes the rows of changed and removed files and adds new rows"""
+        for batch in itertools.batched(
+            changes.obsolete_ids, self._config.batch_size
+        ):
+            with profiler.stage("delete"):
+                cursor.executemany(
+                    f"DELETE FROM {db_build_config.name} WHERE id = ?",
+                    [(row_id,) for row_id in batch],
+                )
+
+        files = changes.changed + changes.added
+        progress.total_files = len(files)
+        rows = (
+            (
+                source_index.new_row_id(
+                    file.relative_to(source_folder).as_posix()
+                ),
+            )
+            + row_values
+            for file, row_values in self._iter_row_values(
+                progress.track_files(files), db_build_config, profiler
+            )
+        )
+        return self._insert_rows(
+            cursor,
+            db_build_config,
+            rows,
+            profiler=profiler,
+            progress=progress,
+        )
+
+    def update_dataset(
+        self, name: str, rel_paths: Iterable[str]
+    ) -> DatasetBuildStats:
+        """
+        Applies the given added, changed or removed source files of a dataset
+        to the database of a previous incremental build, without scanning
+        its whole source folder. The database is changed in place in one
+        transaction and its full text search table is updated row by row
+        instead of being rebuilt. Used by watch mode, which already knows
+        the changed files.
+        """
+        if not self._config.incremental or self._config.atomic:
+            raise ValueError(
+                "datasets are only updated in place by incremental builds "
+                "that are not atomic"
+            )
+        db_path, source_folder, db_build_config = next(
+            task for task in self._get_dataset_tasks() if task[2].name == name
+        )
+        source_index = self._source_indexes.pop(name, None)
+        if source_index is None:
+            source_index = self._load_source_index(db_path, db_build_config)
+        if not source_index.entries:
+            # there is no previous build to update
+            self._config.output_path.mkdir(parents=True, exist_ok=True)
+            stats = self._build_dataset(db_path, source_folder, db_build_config)
+            self._build_stats[name] = stats
+            return stats
+
+        start_time = time.perf_counter()
+        profiler = self._create_profiler()
+        progress = self._create_progress_reporter(db_build_config)
+        if unshare_file(db_path):
+            self.logger.info("copied hardlinked %s", db_path)
+        con = sqlite3.connect(db_path)
+        cursor = con.cursor()
+        saved_pragmas = self._apply_build_pragmas(con)
+        try:
+            con.execute("BEGIN")
+            with profiler.stage("discover"):
+                changes = source_index.update_files(source_folder, rel_paths)
+            has_fts_table = (
+                db_build_config.fts_config
+                and cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = ?",
+                    (db_build_config.get_fts_table_name(),),
+                ).fetchone()
+            )
+            if has_fts_table:
+                with profiler.stage("fts"):
+                    self._update_fts_rows(
+                        cursor, db_build_config, changes.obsolete_ids, True
+                    )
+            row_count = self._write_source_changes(
+                cursor,
+                source_folder,
+                db_build_config,
+                source_index,
+                changes=changes,
+                profiler=profiler,
+                progress=progress,
+            )
+            if has_fts_table:
+                new_ids = [
+                    row_id
+                    for file in changes.changed + changes.added
+                    for row_id in source_index.entries[
+                        file.relative_to(source_folder).as_posix()
+                    ].iter_row_ids()
+                ]
+                with profiler.stage("fts"):
+                    self._update_fts_rows(cursor, db_build_config, new_ids)
+            elif db_build_config.fts_config:
+                # an empty dataset has no full text search table yet
+                with profiler.stage("fts"):
+                    self._build_fts_table(con, cursor, db_build_config)
+            with profiler.stage("commit"):
+                con.commit()
+        finally:
+            # a failed update is rolled back, so the database still matches
+            # the saved index, which is loaded again by the next update
+            self._close_build_connection(con, saved_pragmas)
+        source_index.save(SourceIndex.get_path(db_path))
+        self._source_indexes[name] = source_index
+        stats = self._get_dataset_stats(
+            db_build_config,
+            start_time,
+            row_count=row_count,
+            total_rows=source_index.get_row_count(),
+            profiler=profiler,
+            source_hash=self._hash_source_index(source_index, db_build_config),
+        )
+        self._build_stats[name] = stats
+        return stats
+
+    def _update_fts_rows(
+        self,
+        cursor: sqlite3.Cursor,
+        db_build_config: DatabaseBuildConfig,
+        row_ids: list[int],
+        delete: bool = False,
+    ):
+        """
+        Adds rows to or deletes them from the external content fts table.
+        Rows have to be deleted before their texts are changed.
+        """
+        fts_table = db_build_config.get_fts_table_name()
+        fts_columns = ", ".join(
+            name for name, _ in db_build_config.get_fts_columns()
+        )
+        if delete:
+            insert_str = (
+                f"INSERT INTO {fts_table}({fts_table}, rowid, {fts_columns}) "
+                f"SELECT 'delete', id, {fts_columns} "
+            )
+        else:
+            insert_str = (
+                f"INSERT INTO {fts_table}(rowid, {fts_columns}) "
+                f"SELECT id, {fts_columns} "
+            )
+        cursor.executemany(
+            f"{insert_str}FROM {fts_table}_content WHERE id = ?",
+            [(row_id,) for row_id in row_ids],
+        )
+
+    def _iter_rows(
+        self,
+        source_folder: Path,
+        db_build_config: DatabaseBuildConfig,
+        profiler: BuildProfiler,
+        progress: ProgressReporter,
+    ) -> Iterator[tuple]:
+        files = progress.track_files(
+            db_build_config.discovery.iter_files(source_folder)
+        )
+        for idx, (_, row_values) in enumerate(
+            self._iter_row_values(files, db_build_config, profiler)
+        ):
+            yield (idx,) + row_values
+
+    def _iter_row_values(
+        self,
+        files: Iterable[Path],
+        db_build_config: DatabaseBuildConfig,
+        profiler: BuildProfiler,
+    ) -> Iterator[tuple[Path, tuple]]:
+        """
+        Yields every row without id together with its source file. Values
+        that do not match their column type are collected in the type report
+        of the dataset, a strictly checked dataset fails once all rows were
+        read.
+        """
+        row_reader = RowReader(
+            db_build_config.get_extracted_paths(),
+            self._config.json_backend,
+            db_build_config.rest_format,
+            db_build_config.get_extracted_types(),
+            self._config.type_check,
+        )
+        type_report = TypeReport(self._config.type_check)
+        self._type_reports[db_build_config.name] = type_report
+        files = self._iter_profiled_files(files, profiler)
+        if self._parse_cache is None:
+            rows = self._parse_files(files, row_reader, profiler)
+        else:
+            rows = self._iter_cached_row_values(files, row_reader, profiler)
+        for file, row_values, type_issues in rows:
+            if type_issues:
+                type_report.add(file, type_issues)
+            yield file, row_values
+
+        if type_report.count:
+            summary = type_report.format_summary(db_build_config.name)
+            if self._config.type_check == TypeCheck.STRICT:
+                raise ColumnTypeError(summary)
+            self.logger.warning("%s\nthese values were stored as NULL", summary)
+
+    def _parse_files(
+        self,
+        files: Iterable[Path | Resolved],
+        row_reader: RowReader,
+        profiler: BuildProfiler,
+    ) -> Iterator[tuple[Path, tuple, list[TypeIssue] | None]]:
+        if self._executor is None:
+            decode = profiler.wrap("decode", row_reader.decode)
+            build_row = profiler.wrap("build_row", row_reader.build_row)
+            for file in files:
+                if isinstance(file, Resolved):
+                    yield from file.results
+                    continue
+                self.logger.debug("read file: %s", file)
+                for record in profiler.iter("read", iter_records(file)):
+                    yield (
+                        file,
+                        build_row(*decode(record)),
+                        row_reader.pop_type_issues(),
+                    )
+            return
+
+        task_queue = OrderedTaskQueue(
+            self._executor,
+            row_reader.read_items,
+            chunk_size=self.PARSE_CHUNK_SIZE,
+            max_pending=2 * self._config.jobs,
+        )
+        # reading and decoding happen in the workers, only the time the
+        # writer waits for their results is measured
+        yield from profiler.iter(
+            "parse_wait", task_queue.map(self._iter_source_items(files))
+        )
+
+    def _iter_cached_row_values(
+        self,
+        files: Iterable[Path],
+        row_reader: RowReader,
+        profiler: BuildProfiler,
+    ) -> Iterator[tuple[Path, tuple, list[TypeIssue] | None]]:
+        """
+        Yields the rows of cached files from the parse cache and parses the
+        others. Cached files pass through the same ordered stream as the
+        parsed ones, so the workers keep parsing the files after a cached
+        one, and the rows of parsed files are written into the cache.
+        """
+        fingerprint = row_reader.get_fingerprint()
+        miss_keys = {}
+
+        def iter_items() -> Iterator[Path | Resolved]:
+            # runs in the feeder thread of the task queue if jobs are used
+            for file in files:
+                key = self._parse_cache.get_key(file, fingerprint)
+                entry = self._parse_cache.open_entry(key)
+                if entry is not None:
+                    yield Resolved(
+                        self._iter_cache_entry(file, entry, profiler)
+                    )
+                    continue
+                profiler.add("cache_misses")
+                miss_keys[file] = key
+                yield file
+
+        yield from self._write_parse_cache(
+            self._parse_files(iter_items(), row_reader, profiler), miss_keys
+        )
+
+    def _iter_cache_entry(
+        self, file: Path, entry: BinaryIO, profiler: BuildProfiler
+    ) -> Iterator[tuple[Path, tuple, None]]:
+        self.logger.debug("read cached rows of file: %s", file)
+        profiler.add("cache_hits")
+        for row_values in profiler.iter(
+            "read_cache", self._parse_cache.iter_rows(entry)
+        ):
+            yield file, row_values, None
+
+    def _write_parse_cache(
+        self,
+        rows: Iterable[tuple[Path, tuple, list[TypeIssue] | None]],
+        keys: dict[Path, str],
+    ) -> Iterator[tuple[Path, tuple, list[TypeIssue] | None]]:
+        """
+        Passes the rows through and stores them in the cache per file. Files
+        with type issues are not cached, so they are reported again by the
+        next build. Rows of files without a key came from the cache.
+        """
+        writer = None
+        current_file = None
+        try:
+            for file, row_values, type_issues in rows:
+                if file != current_file:
+                    if writer is not None:
+                        writer.commit()
+                    current_file = file
+                    key = keys.pop(file, None)
+                    writer = (
+                        self._parse_cache.create_writer(key)
+                        if key is not None
+                        else None
+                    )
+                if writer is not None:
+                    if type_issues:
+                        writer.discard()
+                    writer.write(row_values)
+                yield file, row_values, type_issues
+            if writer is not None:
+                writer.commit()
+        finally:
+            if writer is not None:
+                writer.discard()
+
+    def _iter_profiled_files(
+        self, files: Iterable[Path], profiler: BuildProfiler
+    ) -> Iterable[Path]:
+        if not profiler.enabled:
+            return files
+        return self._count_files(profiler.iter("discover", files), profiler)
+
+    def _count_files(
+        self, files: Iterable[Path], profiler: BuildProfiler
+    ) -> Iterator[Path]:
+        for file in files:
+            profiler.add("files")
+            profiler.add("bytes_read", file.stat().st_size)
+            yield file
+
+    def _iter_source_items(
+        self, files: Iterable[Path | Resolved]
+    ) -> Iterator[SourceItem | Resolved]:
+        """
+        Json lines files and large json files, e.g. arrays of many objects,
+        are split into records here, so that a single large file is parsed
+        by all workers. Every other file is read by a worker.
+        """
+        for file in files:
+            if isinstance(file, Resolved):
+                yield file
+            elif (
+                is_json_lines_file(file)
+                or file.stat().st_size >= self.SPLIT_FILE_BYTES
+            ):
+                for record in iter_records(file):
+                    yield file, record
+            else:
+                yield file
+
+    def _apply_build_pragmas(
+        self, con: sqlite3.Connection
+    ) -> dict[str, str | int]:
+        """
+        Switches the connection to the configured build profile and returns
+        the previous settings so they can be restored afterwards.
+        """
+        pragmas = BUILD_PRAGMAS[PragmaProfile(self._config.pragma_profile)]
+        saved_pragmas = {}
+        for name, value in pragmas.items():
+            saved_pragmas[name] = con.execute(f"PRAGMA {name}").fetchone()[0]
+            con.execute(f"PRAGMA {name} = {value}")
+        return saved_pragmas
+
+    def _restore_pragmas(
+        self, con: sqlite3.Connection, saved_pragmas: dict[str, str | int]
+    ):
+        for name, value in reversed(saved_pragmas.items()):
+            con.execute(f"PRAGMA {name} = {value}")
 
     def clean_up_out_folder(self):
 
         if self._config.output_path.is_dir():
             for file in self._config.output_path.glob("*.sqlite"):
                 file.unlink()
+                SourceIndex.get_path(file).unlink(missing_ok=True)
             (self._config.output_path / "manifest.json").unlink(missing_ok=True)
+            for file in iter_artifacts(self._config.output_path):
+                file.unlink()
+            for file in iter_temp_files(self._config.output_path):
+                file.unlink()
+
+    def remove_stale_files(self):
+        """
+        Removes the databases of datasets that are not part of the current
+        config. Used instead of clean_up_out_folder by atomic builds, which
+        replace the databases of the current datasets in place.
+        """
+        if self._is_consolidated():
+            names = {self.CONSOLIDATED_DB_NAME}
+        else:
+            names = {c.name for c in self._db_build_configs}
+        if self._config.delta_from is not None:
+            names.add(Path(DELTA_FILE_NAME).stem)
+        for file in self._config.output_path.glob("*.sqlite"):
+            if file.stem not in names:
+                self.logger.info("remove stale database %s", file)
+                file.unlink()
+                SourceIndex.get_path(file).unlink(missing_ok=True)
+        artifact = self._config.artifact
+        for file in iter_artifacts(self._config.output_path):
+            if artifact.compression is None or file != artifact.get_path(
+                self._config.output_path
+            ):
+                self.logger.info("remove stale artifact %s", file)
+                file.unlink()
+
+    def _get_dataset_manifest(
+        self, db_build_config: DatabaseBuildConfig
+    ) -> dict:
+        dataset_manifest = {
+            "columns": db_build_config.column_config,
+            "rest_format": db_build_config.rest_format,
+            "key": db_build_config.get_row_key(),
+        }
+        if db_build_config.index_config:
+            dataset_manifest["indexes"] = db_build_config.index_config
+        if db_build_config.fts_config:
+            dataset_manifest["fts"] = {
+                "table": db_build_config.get_fts_table_name(),
+                "columns": [
+                    {"name": name, "path": path}
+                    for name, path in db_build_config.get_fts_columns()
+                ],
+            }
+        if stats := self._build_stats.get(db_build_config.name):
+            if stats.source_sha256 is None:
+                # only releases need the source hash, so plain builds do
+                # not read every source file once more
+                source_folder = self.get_dataset_sources()[
+                    db_build_config.name
+                ][0]
+                stats.source_sha256 = self._hash_source_folder(
+                    source_folder, db_build_config
+                )
+            dataset_manifest["content_sha256"] = (
+                stats.content_sha256
+                or self._get_content_hash(
+                    db_build_config.name, dataset_manifest
+                )
+            )
+            dataset_manifest["build"] = stats.to_manifest()
+        return dataset_manifest
+
+    def _get_content_hash(self, name: str, dataset_manifest: dict) -> str:
+        if self._is_consolidated():
+            db_path = self.get_consolidated_db_path()
+        else:
+            db_path = self._config.output_path / f"{name}.sqlite"
+        con = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            return hash_dataset(con, name, dataset_manifest)
+        finally:
+            con.close()
+
+    def get_profile_summary(self) -> dict:
+        """Returns the stage timings of all datasets and the peak memory"""
+        profile = self._profiler.to_dict()
+        peak_rss_mib = get_peak_rss_mib()
+        if peak_rss_mib is not None:
+            profile["peak_rss_mib"] = round(peak_rss_mib, 1)
+        return profile
+
+    def _store_manifest(self, manifest: dict):
+        """Stores the manifest in the metadata table of the release"""
+        con = sqlite3.connect(self.get_consolidated_db_path())
+        try:
+            with con:
+                con.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.METADATA_TABLE} "
+                    "(key TEXT PRIMARY KEY, value TEXT)"
+                )
+                con.execute(
+                    f"INSERT OR REPLACE INTO {self.METADATA_TABLE} "
+                    "VALUES('manifest', ?)",
+                    (json.dumps(manifest),),
+                )
+        finally:
+            con.close()
+
+    def _add_delta(self, manifest: dict):
+        """
+        Writes the delta from the previous release and adds its summary to
+        the manifest. A release whose datasets can not be diffed is still
+        packaged, just without a delta.
+        """
+        delta_path = self._config.output_path / DELTA_FILE_NAME
+        try:
+            manifest["delta"] = create_delta(
+                Path(self._config.delta_from),
+                self._config.output_path,
+                manifest,
+                delta_path,
+                self.logger,
+            )
+        except (DeltaError, sqlite3.Error) as e:
+            self.logger.warning("release has no delta: %s", e)
+            delta_path.unlink(missing_ok=True)
+
+    def _add_artifact(self, manifest: dict, date_time_now: datetime.datetime):
+        """
+        Compacts the databases, packages them with the manifest into the
+        artifact and adds its sizes and hashes to the manifest. The manifest
+        in the artifact therefore has no artifact entry.
+        """
+        start_time = time.perf_counter()
+        if self._is_consolidated():
+            db_files = [self.get_consolidated_db_path().name]
+        else:
+            db_files = [f"{c.name}.sqlite" for c in self._db_build_configs]
+        with self._profiler.stage("optimize"):
+            for db_file in db_files:
+                if optimize_database(
+                    self._config.output_path / db_file,
+                    self._config.artifact.page_size,
+                ):
+                    self.logger.debug("compacted %s", db_file)
+        write_json(self._config.output_path / "manifest.json", manifest)
+        with self._profiler.stage("compress"):
+            manifest["artifact"] = write_artifact(
+                self._config.output_path,
+                db_files + ["manifest.json"],
+                self._config.artifact,
+                date_time_now.timestamp(),
+                self.logger,
+            )
+        self._profiler.wall_seconds += time.perf_counter() - start_time
 
     def package_release(self, date_time_now: datetime.datetime):
         self.logger.info("start to create release package")
+        start_time = time.perf_counter()
         manifest_path = self._config.output_path / "manifest.json"
         manifest = {
             "compiler_info": {"version": version("dragon-compiler")},
             "database_info": self._config.db_manifest["database_info"],
             "datasets": {
-                db_build_config.name: {"columns": db_build_config.column_config}
+                db_build_config.name: self._get_dataset_manifest(
+                    db_build_config
+                )
                 for db_build_config in self._db_build_configs
             },
             "build_time": date_time_now.replace(microsecond=0)
             .isoformat()
             .replace("+00:00", "Z"),
         }
-        with open(manifest_path, "w", encoding="utf-8") as f:
-            json.dump(manifest, f, indent=2)
+        if self._is_consolidated():
+            manifest["database_file"] = self.get_consolidated_db_path().name
+        if self._config.memory.limit_mib is not None:
+            manifest["memory"] = {
+                "limit_mib": self._config.memory.limit_mib,
+                "peak_rss_mib": round(get_peak_rss_mib() or 0.0, 1),
+            }
+        if self._profiler.enabled:
+            package_time = time.perf_counter() - start_time
+            self._profiler.add_time("package", package_time)
+            self._profiler.wall_seconds += package_time
+            manifest["build_profile"] = self.get_profile_summary()
+        if self._config.delta_from is not None:
+            self._add_delta(manifest)
+        if self._is_consolidated():
+            self._store_manifest(manifest)
+        if self._config.artifact.compression is not None:
+            self._add_artifact(manifest, date_time_now)
+        if self._config.atomic:
+            write_json(manifest_path, manifest)
+        else:
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
         self.logger.info(
             "release is now available in the" " following directory: %s",
             self._config.output_path,
@@ -0,0 +1,164 @@
+"""
+This module caches the rows parsed from source files on disk, so repeated
+builds of the same sources skip reading and decoding unchanged files. An
+entry is keyed by the content hash of a source file and the fingerprint of
+the row config it was parsed with, so it can be shared by builds, releases
+and datasets of different source trees.
+"""
+
+from collections.abc import Iterable, Iterator
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import BinaryIO
+from dragon_compiler.incremental import hash_file
+
+# rows are pickled in chunks, so entries are streamed in both directions
+CHUNK_ROWS = 256
+ENTRY_SUFFIX = ".rows"
+
+
+class CacheEntryWriter:
+    """
+    Writes the rows of a source file into a temporary file that becomes the
+    cache entry once all rows were written. A discarded writer ignores
+    further rows.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tmp_path = path.with_name(
+            f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp"
+        )
+        self._tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self._tmp_path.open("wb")
+        self._chunk = []
+
+    def write(self, row: tuple):
+        if self._file.closed:
+            return
+        self._chunk.append(row)
+        if len(self._chunk) >= CHUNK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        pickle.dump(self._chunk, self._file, pickle.HIGHEST_PROTOCOL)
+        self._chunk = []
+
+    def commit(self):
+        if self._file.closed:
+            return
+        if self._chunk:
+            self._flush()
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+            self._tmp_path.unlink(missing_ok=True)
+
+
+class ParseCache:
+    """
+    Size bounded cache of parsed rows in a folder. Entries are files named
+    by their key, a hit updates the modification time of its entry and
+    `evict` removes the least recently used entries beyond `max_bytes`.
+    Entries are only ever replaced atomically, so concurrent builds can
+    share a cache folder.
+
+    The entries are pickled, a cache folder must not be writable by
+    untrusted users.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int,
+        logger: logging.Logger | None = None,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logger or logging.getLogger(__name__)
+
+    def get_key(self, file: Path, fingerprint: str) -> str:
+        """Returns the key of the rows parsed from a file with a row config"""
+        return hashlib.sha256(
+            f"{fingerprint}:{hash_file(file)}".encode("utf-8")
+        ).hexdigest()
+
+    def get_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{ENTRY_SUFFIX}"
+
+    def open_entry(self, key: str) -> BinaryIO | None:
+        """
+        Returns the opened entry of the key or None on a miss. An opened
+        entry can still be read if another build evicts it.
+        """
+        path = self.get_path(key)
+        try:
+            f = path.open("rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    def iter_rows(self, f: BinaryIO) -> Iterator[tuple]:
+        """Yields the rows of an opened entry and closes it"""
+        with f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                yield from chunk
+
+    def create_writer(self, key: str) -> CacheEntryWriter:
+        return CacheEntryWriter(self.get_path(key))
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used entries until the cache fits into
+        its size limit and returns the number of removed entries.
+        """
+        entries = []
+        total_bytes = 0
+        for path in self._iter_entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total_bytes += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+            removed += 1
+        if removed:
+            self.logger.info(
+                "evicted %d parse cache entries, %.1f MiB left",
+                removed,
+                total_bytes / 2**20,
+            )
+        return removed
+
+    def _iter_entries(self) -> Iterable[Path]:
+        if not self.cache_dir.is_dir():
+            return
+        with os.scandir(self.cache_dir) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
+                with os.scandir(folder.path) as files:
+                    for file in files:
+                        if file.name.endswith(ENTRY_SUFFIX):
+                            yield Path(file.path)
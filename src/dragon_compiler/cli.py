@@ -1,11 +1,25 @@
 """This module implements the command line interface of the dragon compiler"""
 
+import cProfile
+from contextlib import contextmanager
 import typer
 import logging
+import logging.handlers
 import json
+import queue
 import sys
+import threading
 from pathlib import Path
-from dragon_compiler import builder
+from dragon_compiler import (
+    artifact,
+    builder,
+    decoders,
+    delta,
+    extractors,
+    memory,
+    validator,
+    watch,
+)
 import datetime as dt
 
 
@@ -19,15 +33,16 @@ class CompilerCLI:
         )
         self._app.command("build")(self._make_build_command())
         self._app.command("release")(self._make_release_command())
-        logging.basicConfig(
-            level=logging.INFO, format="[%(levelname)s] %(message)s"
-        )
+        self._app.command("validate")(self._make_validate_command())
+        self._app.command("apply-delta")(self._make_apply_delta_command())
+        self._app.command("watch")(self._make_watch_command())
 
     def run(self):
         self._app()
 
     def _make_build_command(self):
         def build_command(
+            *,
             source: str = typer.Option(
                 ...,
                 "--source",
@@ -49,35 +64,597 @@ class CompilerCLI:
                 is_flag=True,
                 help="removes old build from output folder",
             ),
+            batch_size: int = self._make_batch_size_option(),
+            pragma_profile: builder.PragmaProfile = (
+                self._make_pragma_profile_option()
+            ),
+            jobs: int = self._make_jobs_option(),
+            incremental: bool = self._make_incremental_option(),
+            json_backend: decoders.JsonBackend = (
+                self._make_json_backend_option()
+            ),
+            rest_format: decoders.RestFormat = self._make_rest_format_option(),
+            profile: bool = self._make_profile_option(),
+            profile_output: str = self._make_profile_output_option(),
+            cprofile_output: str = self._make_cprofile_option(),
+            quiet: bool = self._make_quiet_option(),
+            verbose: bool = self._make_verbose_option(),
+            log_queue: bool = self._make_log_queue_option(),
+            progress_seconds: float = self._make_progress_seconds_option(),
+            progress_rows: int = self._make_progress_rows_option(),
+            atomic: bool = self._make_atomic_option(),
+            memory_limit: int = self._make_memory_limit_option(),
+            max_row_bytes: int = self._make_max_row_bytes_option(),
+            cache_dir: str = self._make_cache_dir_option(),
+            cache_size_mib: int = self._make_cache_size_option(),
+            type_check: extractors.TypeCheck = self._make_type_check_option(),
         ):
-            return self.build(source, out, do_clean)
+            with self._configure_logging(quiet, verbose, log_queue):
+                return self.build(
+                    source,
+                    out,
+                    do_clean,
+                    profile_output=profile_output,
+                    cprofile_output=cprofile_output,
+                    batch_size=batch_size,
+                    pragma_profile=pragma_profile,
+                    jobs=jobs,
+                    incremental=incremental,
+                    json_backend=json_backend,
+                    rest_format=rest_format,
+                    profile=profile or profile_output is not None,
+                    progress_seconds=progress_seconds,
+                    progress_rows=progress_rows,
+                    atomic=atomic,
+                    memory=memory.MemoryBudget(memory_limit, max_row_bytes),
+                    cache_dir=None if cache_dir is None else Path(cache_dir),
+                    cache_size_mib=cache_size_mib,
+                    type_check=type_check,
+                )
 
         return build_command
 
     def _make_release_command(self):
-        def release_command(source: str = typer.Option(..., "--source", "-s")):
-            return self.release(source)
+        def release_command(
+            *,
+            source: str = typer.Option(..., "--source", "-s"),
+            batch_size: int = self._make_batch_size_option(),
+            pragma_profile: builder.PragmaProfile = (
+                self._make_pragma_profile_option()
+            ),
+            jobs: int = self._make_jobs_option(),
+            incremental: bool = self._make_incremental_option(),
+            json_backend: decoders.JsonBackend = (
+                self._make_json_backend_option()
+            ),
+            rest_format: decoders.RestFormat = self._make_rest_format_option(),
+            profile: bool = self._make_profile_option(),
+            profile_output: str = self._make_profile_output_option(),
+            cprofile_output: str = self._make_cprofile_option(),
+            quiet: bool = self._make_quiet_option(),
+            verbose: bool = self._make_verbose_option(),
+            log_queue: bool = self._make_log_queue_option(),
+            progress_seconds: float = self._make_progress_seconds_option(),
+            progress_rows: int = self._make_progress_rows_option(),
+            atomic: bool = self._make_atomic_option(),
+            memory_limit: int = self._make_memory_limit_option(),
+            max_row_bytes: int = self._make_max_row_bytes_option(),
+            cache_dir: str = self._make_cache_dir_option(),
+            cache_size_mib: int = self._make_cache_size_option(),
+            type_check: extractors.TypeCheck = self._make_type_check_option(),
+            layout: builder.ReleaseLayout = self._make_layout_option(),
+            delta_from: str = typer.Option(
+                None,
+                "--delta-from",
+                help="previous release directory, the release contains a "
+                f"{delta.DELTA_FILE_NAME} with the rows that changed since",
+            ),
+            reuse_from: str = typer.Option(
+                None,
+                "--reuse-from",
+                help="previous release directory, databases of datasets "
+                "whose sources did not change are hardlinked from it instead "
+                "of being compiled again",
+            ),
+            compression: artifact.Compression = self._make_artifact_option(),
+            compression_level: int = self._make_artifact_level_option(),
+            page_size: int = self._make_page_size_option(),
+        ):
+            with self._configure_logging(quiet, verbose, log_queue):
+                return self.release(
+                    source,
+                    profile_output=profile_output,
+                    cprofile_output=cprofile_output,
+                    batch_size=batch_size,
+                    pragma_profile=pragma_profile,
+                    jobs=jobs,
+                    incremental=incremental,
+                    json_backend=json_backend,
+                    rest_format=rest_format,
+                    profile=profile or profile_output is not None,
+                    progress_seconds=progress_seconds,
+                    progress_rows=progress_rows,
+                    atomic=atomic,
+                    memory=memory.MemoryBudget(memory_limit, max_row_bytes),
+                    cache_dir=None if cache_dir is None else Path(cache_dir),
+                    cache_size_mib=cache_size_mib,
+                    type_check=type_check,
+                    layout=layout,
+                    delta_from=None if delta_from is None else Path(delta_from),
+                    reuse_from=None if reuse_from is None else Path(reuse_from),
+                    artifact=artifact.ArtifactConfig(
+                        compression, compression_level, page_size, jobs
+                    ),
+                )
 
         return release_command
 
+    def _make_validate_command(self):
+        def validate_command(
+            *,
+            release: str = typer.Option(
+                "release",
+                "--release",
+                "-r",
+                help="release directory with the manifest.json",
+            ),
+            source: str = typer.Option(
+                None,
+                "--source",
+                "-s",
+                help="source directory of the release, the row counts are "
+                "compared with the number of source documents",
+            ),
+            jobs: int = typer.Option(
+                1,
+                "--jobs",
+                "-j",
+                min=1,
+                help="number of datasets that are validated concurrently",
+            ),
+            integrity_check: validator.IntegrityCheck = typer.Option(
+                validator.IntegrityCheck.QUICK,
+                "--integrity",
+                help="'quick' runs PRAGMA quick_check, 'full' runs PRAGMA "
+                "integrity_check, which also verifies the indexes",
+            ),
+            sample_size: int = typer.Option(
+                None,
+                "--sample",
+                min=1,
+                help="check the json of this many random rows per dataset "
+                "instead of scanning every row",
+            ),
+            output: str = typer.Option(
+                None,
+                "--output",
+                "-o",
+                help="write the validation results as json to this file, "
+                "'-' writes them to stdout",
+            ),
+            quiet: bool = self._make_quiet_option(),
+            verbose: bool = self._make_verbose_option(),
+        ):
+            with self._configure_logging(quiet, verbose, False):
+                is_valid = self.validate(
+                    validator.ValidatorConfig(
+                        Path(release),
+                        None if source is None else Path(source),
+                        jobs=jobs,
+                        integrity_check=integrity_check,
+                        sample_size=sample_size,
+                    ),
+                    output,
+                )
+            if not is_valid:
+                raise typer.Exit(code=1)
+
+        return validate_command
+
+    def _make_apply_delta_command(self):
+        def apply_delta_command(
+            delta_file: str = typer.Option(
+                ...,
+                "--delta",
+                "-d",
+                help=f"{delta.DELTA_FILE_NAME} of the release to update to",
+            ),
+            release: str = typer.Option(
+                "release",
+                "--release",
+                "-r",
+                help="release directory that is patched in place",
+            ),
+            verify: bool = typer.Option(
+                True,
+                "--verify/--no-verify",
+                help="compare the content hash of every table before and "
+                "after the patch with the hashes of the delta",
+            ),
+            quiet: bool = self._make_quiet_option(),
+            verbose: bool = self._make_verbose_option(),
+        ):
+            with self._configure_logging(quiet, verbose, False):
+                if not self.apply_delta(
+                    Path(release), Path(delta_file), verify
+                ):
+                    raise typer.Exit(code=1)
+
+        return apply_delta_command
+
+    def _make_watch_command(self):
+        def watch_command(
+            *,
+            source: str = typer.Option(
+                ...,
+                "--source",
+                "-s",
+                help="source folder with the manifest.json, the source "
+                "folders of its datasets are watched",
+            ),
+            out: str = typer.Option(
+                "./build",
+                "--out",
+                "-o",
+                help="output folder of the databases that are kept up to date",
+            ),
+            interval: float = typer.Option(
+                watch.DEFAULT_INTERVAL,
+                "--interval",
+                min=0.01,
+                help="seconds between two scans of the source folders",
+            ),
+            debounce: float = typer.Option(
+                watch.DEFAULT_DEBOUNCE,
+                "--debounce",
+                min=0,
+                help="seconds without further edits before the changed files "
+                "are applied, so a burst of edits becomes one update",
+            ),
+            batch_size: int = self._make_batch_size_option(),
+            pragma_profile: builder.PragmaProfile = (
+                self._make_pragma_profile_option()
+            ),
+            jobs: int = self._make_jobs_option(),
+            json_backend: decoders.JsonBackend = (
+                self._make_json_backend_option()
+            ),
+            rest_format: decoders.RestFormat = self._make_rest_format_option(),
+            type_check: extractors.TypeCheck = self._make_type_check_option(),
+            quiet: bool = self._make_quiet_option(),
+            verbose: bool = self._make_verbose_option(),
+            log_queue: bool = self._make_log_queue_option(),
+        ):
+            with self._configure_logging(quiet, verbose, log_queue):
+                return self.watch(
+                    source,
+                    out,
+                    watch.WatchConfig(interval, debounce),
+                    batch_size=batch_size,
+                    pragma_profile=pragma_profile,
+                    jobs=jobs,
+                    json_backend=json_backend,
+                    rest_format=rest_format,
+                    type_check=type_check,
+                )
+
+        return watch_command
+
+    def _make_batch_size_option(self):
+        return typer.Option(
+            5000,
+            "--batch-size",
+            min=1,
+            help="number of rows that are inserted into the database at once",
+        )
+
+    def _make_pragma_profile_option(self):
+        return typer.Option(
+            builder.PragmaProfile.FAST,
+            "--pragma-profile",
+            help="sqlite settings used while compiling. 'fast' and 'unsafe' "
+            "trade crash safety during the build for speed, the settings "
+            "are restored before the database is finalized",
+        )
+
+    def _make_jobs_option(self):
+        return typer.Option(
+            1,
+            "--jobs",
+            "-j",
+            min=1,
+            help="number of worker processes that parse the source files, "
+            "datasets of a manifest are compiled concurrently up to this "
+            "limit",
+        )
+
+    def _make_incremental_option(self):
+        return typer.Option(
+            False,
+            "--incremental",
+            "-i",
+            is_flag=True,
+            help="only process source files that were added, changed or "
+            "removed since the last build. Falls back to a full build if "
+            "the column config changed",
+        )
+
+    def _make_json_backend_option(self):
+        return typer.Option(
+            decoders.JsonBackend.STDLIB,
+            "--json-backend",
+            help="library that decodes the json files. orjson and msgspec "
+            "have to be installed separately, e.g. with "
+            "'pip install dragon-compiler[fast]'",
+        )
+
+    def _make_rest_format_option(self):
+        return typer.Option(
+            decoders.RestFormat.TEXT,
+            "--rest-format",
+            help="how the json document is stored in the rest column. 'raw' "
+            "and 'minified' store the source text without serializing the "
+            "document again, 'jsonb' stores sqlite's binary json. A "
+            "'rest_format' of a manifest dataset takes precedence",
+        )
+
+    def _make_profile_option(self):
+        return typer.Option(
+            False,
+            "--profile",
+            is_flag=True,
+            help="measure the time spent in every build stage, print the "
+            "breakdown and add it to the release manifest",
+        )
+
+    def _make_profile_output_option(self):
+        return typer.Option(
+            None,
+            "--profile-output",
+            help="json file the stage timings are written to, implies "
+            "--profile",
+        )
+
+    def _make_cprofile_option(self):
+        return typer.Option(
+            None,
+            "--cprofile",
+            help="file the cProfile statistics of the main process are "
+            "written to, e.g. for snakeviz or pstats",
+        )
+
+    def _make_quiet_option(self):
+        return typer.Option(
+            False,
+            "--quiet",
+            "-q",
+            is_flag=True,
+            help="only log warnings and errors",
+        )
+
+    def _make_verbose_option(self):
+        return typer.Option(
+            False,
+            "--verbose",
+            "-v",
+            is_flag=True,
+            help="also log debug messages, e.g. every source file that is read",
+        )
+
+    def _make_log_queue_option(self):
+        return typer.Option(
+            False,
+            "--log-queue",
+            is_flag=True,
+            help="write log messages from a background thread, so slow "
+            "consoles do not block the build",
+        )
+
+    def _make_progress_seconds_option(self):
+        return typer.Option(
+            10.0,
+            "--progress-interval",
+            min=0,
+            help="seconds between two progress reports of a dataset, 0 "
+            "disables the time based reports",
+        )
+
+    def _make_progress_rows_option(self):
+        return typer.Option(
+            0,
+            "--progress-rows",
+            min=0,
+            help="also report the progress every n rows, 0 disables the row "
+            "based reports",
+        )
+
+    def _make_atomic_option(self):
+        return typer.Option(
+            True,
+            "--atomic/--no-atomic",
+            help="compile every database into a temporary file that replaces "
+            "the previous database only once it is complete, so a failed "
+            "build keeps the last release intact",
+        )
+
+    def _make_memory_limit_option(self):
+        return typer.Option(
+            None,
+            "--memory-limit",
+            min=16,
+            help="memory budget of the build in MiB. Insert batches are "
+            "limited by size and shrink if the process exceeds the budget, "
+            "very large documents are streamed into the database. It is not "
+            "a hard limit, parsed documents are held as a whole. Worker "
+            "processes of --jobs are not included",
+        )
+
+    def _make_max_row_bytes_option(self):
+        return typer.Option(
+            None,
+            "--max-row-bytes",
+            min=1,
+            help="documents with a larger rest column are written in chunks "
+            "with incremental blob i/o, defaults to 1/32 of --memory-limit",
+        )
+
+    def _make_cache_dir_option(self):
+        return typer.Option(
+            None,
+            "--cache-dir",
+            envvar="DRAGON_CACHE_DIR",
+            help="folder of a parse cache shared by builds, unchanged source "
+            "files are read from the cache instead of being parsed again",
+        )
+
+    def _make_cache_size_option(self):
+        return typer.Option(
+            1024,
+            "--cache-size",
+            min=1,
+            help="size limit of the parse cache in MiB, the least recently "
+            "used entries are removed after a build",
+        )
+
+    def _make_type_check_option(self):
+        return typer.Option(
+            extractors.TypeCheck.OFF,
+            "--type-check",
+            help="'off' inserts the values as they are. 'lenient' converts "
+            "values to the type of their column and stores values that can "
+            "not be converted as NULL, 'strict' fails the build if any value "
+            "does not have the type of its column, both report the wrong "
+            "values",
+        )
+
+    def _make_artifact_option(self):
+        return typer.Option(
+            None,
+            "--artifact",
+            help="also package the release into release.tar.gz or "
+            "release.tar.zst, compressed with --jobs threads. zstd requires "
+            "python 3.14",
+        )
+
+    def _make_artifact_level_option(self):
+        return typer.Option(
+            None,
+            "--artifact-level",
+            help="compression level of the artifact, defaults to 6 for gzip "
+            "and 3 for zstd",
+        )
+
+    def _make_page_size_option(self):
+        return typer.Option(
+            artifact.DEFAULT_PAGE_SIZE,
+            "--page-size",
+            help="page size the databases are compacted to with VACUUM "
+            "before they are packaged into the artifact",
+        )
+
+    def _make_layout_option(self):
+        return typer.Option(
+            builder.ReleaseLayout.PER_DATASET,
+            "--layout",
+            help="'per-dataset' writes a database file per dataset, 'single' "
+            "writes all datasets as tables of release.sqlite, which also "
+            "contains the manifest in its dragon_metadata table",
+        )
+
+    @contextmanager
+    def _configure_logging(self, quiet: bool, verbose: bool, log_queue: bool):
+        if quiet and verbose:
+            raise typer.BadParameter("--quiet and --verbose exclude each other")
+        level = logging.INFO
+        if quiet:
+            level = logging.WARNING
+        elif verbose:
+            level = logging.DEBUG
+
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        listener = None
+        if log_queue:
+            log_records = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_records, handler)
+            handler = logging.handlers.QueueHandler(log_records)
+            # the listener's handler adds the level to the message
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            listener.start()
+        logging.basicConfig(level=level, handlers=[handler], force=True)
+        try:
+            yield
+        finally:
+            if listener:
+                # flushes the messages that are still queued
+                listener.stop()
+
     def _create_builder(self, logger) -> builder.Builder:
         return builder.Builder(logger=logger)
 
+    @contextmanager
+    def _run_cprofile(self, cprofile_output: str | None):
+        if cprofile_output is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(cprofile_output)
+
+    def _report_profile(
+        self, db_builder: builder.Builder, profile_output: str | None
+    ):
+        build_profiler = db_builder.get_profiler()
+        if not build_profiler.enabled:
+            return
+        summary = db_builder.get_profile_summary()
+        typer.echo(build_profiler.format_report("build profile"))
+        if "peak_rss_mib" in summary:
+            typer.echo(f"  peak memory {summary["peak_rss_mib"]:>15} MiB")
+        if profile_output is not None:
+            with open(profile_output, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+
     def build(
-        self, source: str, out: str, do_clean: bool
-    ):  # pylint: disable=unused-argument
+        self,
+        source: str,
+        out: str,
+        do_clean: bool,
+        *,
+        profile_output: str | None = None,
+        cprofile_output: str | None = None,
+        **build_options,
+    ):
         db_builder = self._create_builder(logging.getLogger("dragon"))
 
         source_path = Path(source)
         db_builder.set_config(
-            builder.BuilderConfig(source_path, Path(out), "spells")
+            builder.BuilderConfig(
+                source_path, Path(out), "spells", **build_options
+            )
         )
-        if do_clean:
+        atomic = build_options.get("atomic")
+        if do_clean and not atomic:
             db_builder.clean_up_out_folder()
 
-        db_builder.build()
+        with self._run_cprofile(cprofile_output):
+            db_builder.build()
+        if do_clean and atomic:
+            db_builder.remove_stale_files()
+        self._report_profile(db_builder, profile_output)
 
-    def release(self, source: str):
+    def release(
+        self,
+        source: str,
+        *,
+        profile_output: str | None = None,
+        cprofile_output: str | None = None,
+        **build_options,
+    ):
         out = "release"
         self.logger = logging.getLogger("dragon")
         db_builder = self._create_builder(self.logger)
@@ -85,12 +662,90 @@ class CompilerCLI:
         manifest = self.load_db_manifest(source_path)
         db_builder.set_config(
             builder.BuilderConfig(
-                source_path, Path(out), None, db_manifest=manifest
+                source_path,
+                Path(out),
+                None,
+                db_manifest=manifest,
+                **build_options,
             )
         )
-        db_builder.clean_up_out_folder()
-        db_builder.build()
-        db_builder.package_release(dt.datetime.now(dt.timezone.utc))
+        # atomic builds replace the previous release file by file
+        do_clean = not build_options.get("incremental")
+        atomic = build_options.get("atomic")
+        if do_clean and not atomic:
+            db_builder.clean_up_out_folder()
+        with self._run_cprofile(cprofile_output):
+            db_builder.build()
+            db_builder.package_release(dt.datetime.now(dt.timezone.utc))
+        if do_clean and atomic:
+            db_builder.remove_stale_files()
+        self._report_profile(db_builder, profile_output)
+
+    def validate(
+        self, config: validator.ValidatorConfig, output: str | None = None
+    ) -> bool:
+        logger = logging.getLogger("dragon")
+        report = validator.Validator(logger).validate(config)
+        for result in report.get_failures():
+            logger.error(
+                "%s: %s failed: %s",
+                result.dataset,
+                result.check,
+                result.message,
+            )
+        if output == "-":
+            typer.echo(json.dumps(report.to_dict(), indent=2))
+        elif output is not None:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(report.to_dict(), f, indent=2)
+        failures = len(report.get_failures())
+        logger.info("%d checks, %d failed", len(report.results), failures)
+        return report.is_valid()
+
+    def apply_delta(
+        self, release_path: Path, delta_path: Path, verify: bool = True
+    ) -> bool:
+        logger = logging.getLogger("dragon")
+        try:
+            summary = delta.apply_delta(
+                release_path, delta_path, logger, verify
+            )
+        except delta.DeltaError as e:
+            logger.error("delta was not applied: %s", e)
+            return False
+        logger.info(
+            "updated release %s to %s",
+            summary["from"]["version"],
+            summary["to"]["version"],
+        )
+        return True
+
+    def watch(
+        self,
+        source: str,
+        out: str,
+        config: watch.WatchConfig,
+        **build_options,
+    ):
+        self.logger = logging.getLogger("dragon")
+        db_builder = self._create_builder(self.logger)
+        source_path = Path(source)
+        manifest = self.load_db_manifest(source_path)
+        # incremental builds update the databases in place
+        db_builder.set_config(
+            builder.BuilderConfig(
+                source_path,
+                Path(out),
+                None,
+                db_manifest=manifest,
+                incremental=True,
+                **build_options,
+            )
+        )
+        try:
+            watch.watch(db_builder, config, self.logger, threading.Event())
+        except KeyboardInterrupt:
+            self.logger.info("stopped watching")
 
     def load_db_manifest(self, source_path: Path) -> dict:
         self.logger.info("load database manifest")
@@ -0,0 +1,180 @@
+"""
+This module provides the json decoding backends of the compiler. The stdlib
+json module is always available, orjson and msgspec are used if they are
+installed.
+"""
+
+from collections.abc import Callable, Mapping
+from enum import StrEnum
+import importlib.util
+import json
+from typing import Any
+
+RowLoader = Callable[[bytes], tuple[Mapping, str]]
+
+
+class JsonBackend(StrEnum):
+    """Library that is used to decode the json source files"""
+
+    STDLIB = "json"
+    ORJSON = "orjson"
+    MSGSPEC = "msgspec"
+
+
+class RestFormat(StrEnum):
+    """How the json document is stored in the rest column"""
+
+    # the document is serialized again with json.dumps
+    TEXT = "text"
+    # the source text is stored as is
+    RAW = "raw"
+    # the document without insignificant whitespace
+    MINIFIED = "minified"
+    # sqlite's binary json format, requires sqlite 3.45 or newer
+    JSONB = "jsonb"
+
+
+class JsonDecoder:
+    """Decoder based on the json module of the standard library"""
+
+    backend = JsonBackend.STDLIB
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+    def dumps_minified(self, document: Any) -> str:
+        return json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+
+    def get_columns_loader(
+        self, column_names: list[str]  # pylint: disable=unused-argument
+    ) -> Callable[[bytes], Mapping]:
+        """
+        Returns a function that decodes a document far enough to read the
+        given top level columns. Backends that support it skip the rest of
+        the document.
+        """
+        return self.loads
+
+    def get_row_loader(
+        self, column_names: list[str], rest_format: RestFormat
+    ) -> RowLoader:
+        """
+        Returns a function that decodes a source document into a mapping
+        that contains at least the given columns and the value of the rest
+        column.
+        """
+        if rest_format == RestFormat.RAW:
+            load_columns = self.get_columns_loader(column_names)
+            return lambda data: (load_columns(data), _decode_raw(data))
+
+        if rest_format in (RestFormat.MINIFIED, RestFormat.JSONB):
+            # sqlite converts minified text to jsonb the fastest
+            dumps = self.dumps_minified
+        else:
+            dumps = _dumps_text
+
+        def load_row(data: bytes) -> tuple[Mapping, str]:
+            document = self.loads(data)
+            return document, dumps(document)
+
+        return load_row
+
+
+class OrjsonDecoder(JsonDecoder):
+    """Decoder based on orjson"""
+
+    backend = JsonBackend.ORJSON
+
+    def __init__(self):
+        import orjson  # pylint: disable=import-outside-toplevel
+
+        self._orjson = orjson
+
+    def loads(self, data: bytes) -> Any:
+        return self._orjson.loads(data)
+
+    def dumps_minified(self, document: Any) -> str:
+        return self._orjson.dumps(document).decode("utf-8")
+
+
+class MsgspecDecoder(JsonDecoder):
+    """Decoder based on msgspec, which supports partial decoding"""
+
+    backend = JsonBackend.MSGSPEC
+
+    def __init__(self):
+        import msgspec  # pylint: disable=import-outside-toplevel
+
+        self._msgspec = msgspec
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgspec.json.decode(data)
+
+    def dumps_minified(self, document: Any) -> str:
+        return self._msgspec.json.encode(document).decode("utf-8")
+
+    def get_columns_loader(
+        self, column_names: list[str]
+    ) -> Callable[[bytes], Mapping]:
+        fields = [f"f{idx}" for idx in range(len(column_names))]
+        columns_struct = self._msgspec.defstruct(
+            "Columns",
+            [(f, Any, None) for f in fields],
+            rename=dict(zip(fields, column_names)),
+        )
+        decoder = self._msgspec.json.Decoder(columns_struct)
+
+        def load_columns(data: bytes) -> Mapping:
+            columns = decoder.decode(data)
+            return {
+                name: getattr(columns, f)
+                for f, name in zip(fields, column_names)
+            }
+
+        return load_columns
+
+    def get_row_loader(
+        self, column_names: list[str], rest_format: RestFormat
+    ) -> RowLoader:
+        if rest_format not in (RestFormat.MINIFIED, RestFormat.JSONB):
+            return super().get_row_loader(column_names, rest_format)
+
+        # the source text is reformatted without creating python objects
+        load_columns = self.get_columns_loader(column_names)
+        json_format = self._msgspec.json.format
+        return lambda data: (
+            load_columns(data),
+            json_format(data, indent=-1).decode("utf-8"),
+        )
+
+
+def _decode_raw(data: bytes) -> str:
+    return data.decode("utf-8").strip()
+
+
+def _dumps_text(document: Any) -> str:
+    return json.dumps(document, ensure_ascii=False)
+
+
+_DECODERS = {
+    JsonBackend.STDLIB: JsonDecoder,
+    JsonBackend.ORJSON: OrjsonDecoder,
+    JsonBackend.MSGSPEC: MsgspecDecoder,
+}
+
+
+def is_backend_available(backend: JsonBackend) -> bool:
+    return (
+        backend == JsonBackend.STDLIB
+        or importlib.util.find_spec(backend.value) is not None
+    )
+
+
+def get_decoder(backend: JsonBackend) -> JsonDecoder:
+    backend = JsonBackend(backend)
+    if not is_backend_available(backend):
+        raise ValueError(
+            f"json backend '{backend}' is not installed, install it with "
+            f"'pip install {backend}'"
+        )
+    return _DECODERS[backend]()
@@ -0,0 +1,402 @@
+"""
+This module creates and applies delta releases. A delta is a small sqlite
+database with the rows that were inserted, updated or deleted per dataset
+since a previous release. Rows of both releases are matched by the row key
+of their dataset, e.g. a unique name, instead of their id, which changes
+whenever a source file is added before them. A fixed typo is shipped as a
+single updated row instead of a new database file.
+"""
+
+import json
+import logging
+import shutil
+import sqlite3
+from pathlib import Path
+from dragon_compiler.incremental import hash_file
+from dragon_compiler.manifest import (
+    METADATA_TABLE,
+    get_content_columns,
+    get_database_path,
+    get_release_version,
+    get_row_key,
+    hash_dataset,
+    load_release_manifest,
+)
+from dragon_compiler.publish import (
+    get_build_path,
+    replace_file,
+    write_json,
+)
+
+DELTA_FILE_NAME = "delta.sqlite"
+DELTA_METADATA_TABLE = "dragon_delta"
+
+
+class DeltaError(ValueError):
+    """Raised if a delta can not be created or applied"""
+
+
+def _get_uri(path: Path) -> str:
+    return f"{path.resolve().as_uri()}?mode=ro"
+
+
+def _get_column_defs(dataset: dict, names: list[str]) -> str:
+    types = {column["name"]: column["type"] for column in dataset["columns"]}
+    return ", ".join(f"{name} {types[name]}" for name in names)
+
+
+def create_delta(
+    old_release_path: Path,
+    new_release_path: Path,
+    new_manifest: dict,
+    delta_path: Path,
+    logger: logging.Logger,
+) -> dict:
+    """
+    Writes the delta from the release at old_release_path to the new
+    release and returns its summary for the manifest of the new release.
+    """
+    try:
+        old_manifest = load_release_manifest(old_release_path)
+    except (OSError, ValueError) as e:
+        raise DeltaError(f"previous release can not be read: {e}") from e
+    removed = old_manifest["datasets"].keys() - new_manifest["datasets"].keys()
+    if removed:
+        raise DeltaError(f"datasets {", ".join(sorted(removed))} were removed")
+
+    build_path = get_build_path(delta_path)
+    build_path.unlink(missing_ok=True)
+    # autocommit, databases can not be attached inside of a transaction
+    con = sqlite3.connect(build_path, isolation_level=None, uri=True)
+    try:
+        datasets = {}
+        for name, dataset in new_manifest["datasets"].items():
+            old_dataset = old_manifest["datasets"].get(name)
+            if old_dataset is None or (
+                old_dataset["columns"],
+                old_dataset.get("rest_format"),
+            ) != (dataset["columns"], dataset.get("rest_format")):
+                raise DeltaError(f"{name}: the schema changed")
+            con.execute(
+                "ATTACH ? AS old",
+                (
+                    _get_uri(
+                        get_database_path(old_release_path, old_manifest, name)
+                    ),
+                ),
+            )
+            con.execute(
+                "ATTACH ? AS new",
+                (
+                    _get_uri(
+                        get_database_path(new_release_path, new_manifest, name)
+                    ),
+                ),
+            )
+            try:
+                datasets[name] = _diff_dataset(con, name, dataset)
+            finally:
+                con.execute("DETACH old")
+                con.execute("DETACH new")
+            logger.info(
+                "delta of %s: %d inserted, %d updated, %d deleted rows",
+                name,
+                datasets[name]["inserted"],
+                datasets[name]["updated"],
+                datasets[name]["deleted"],
+            )
+
+        summary = {
+            "from": get_release_version(old_manifest),
+            "to": get_release_version(new_manifest),
+            "datasets": datasets,
+        }
+        con.execute(
+            f"CREATE TABLE {DELTA_METADATA_TABLE} "
+            "(key TEXT PRIMARY KEY, value TEXT)"
+        )
+        con.executemany(
+            f"INSERT INTO {DELTA_METADATA_TABLE} VALUES(?, ?)",
+            [
+                ("delta", json.dumps(summary)),
+                ("manifest", json.dumps(new_manifest)),
+            ],
+        )
+        con.execute("VACUUM")
+    except BaseException:
+        con.close()
+        build_path.unlink(missing_ok=True)
+        raise
+    con.close()
+    replace_file(build_path, delta_path)
+    return {
+        "file": delta_path.name,
+        "size": delta_path.stat().st_size,
+        "sha256": hash_file(delta_path),
+        **summary,
+    }
+
+
+def _match_key(key: list[str]) -> str:
+    """
+    Returns the join condition of the rows `r` and `k` with the same key.
+    Unlike = and IN, IS matches NULL values, so a key can be made of
+    columns without a value, like the content of a row.
+    """
+    return " AND ".join(f"r.{column} IS k.{column}" for column in key)
+
+
+def _diff_dataset(con: sqlite3.Connection, name: str, dataset: dict) -> dict:
+    """
+    Writes the rows of the attached new database that are not part of the
+    attached old database into the upsert table of the delta and the keys
+    of the old rows that are replaced or removed into its delete table.
+    """
+    columns = get_content_columns(dataset)
+    column_str = ", ".join(columns)
+    key = get_row_key(dataset)
+    key_str = ", ".join(key)
+    for schema in ("old", "new"):
+        # GROUP BY compares NULL values as equal, like the key matching
+        duplicate = con.execute(
+            f"SELECT {key_str} FROM {schema}.{name} "
+            f"GROUP BY {key_str} HAVING COUNT(*) > 1 LIMIT 1"
+        ).fetchone()
+        if duplicate is not None:
+            raise DeltaError(
+                f"{name}: the row key ({key_str}) is not unique, "
+                f"{duplicate} exists twice"
+            )
+
+    con.execute("BEGIN")
+    con.execute(
+        f"CREATE TABLE {name}_upsert ({_get_column_defs(dataset, columns)})"
+    )
+    con.execute(
+        f"CREATE TABLE {name}_delete ({_get_column_defs(dataset, key)}, "
+        f"PRIMARY KEY ({key_str}))"
+    )
+    # EXCEPT compares NULL values as equal, unlike =
+    con.execute(
+        f"INSERT INTO {name}_upsert SELECT {column_str} FROM new.{name} "
+        f"EXCEPT SELECT {column_str} FROM old.{name}"
+    )
+    con.execute(
+        f"INSERT INTO {name}_delete SELECT {key_str} FROM ("
+        f"SELECT {column_str} FROM old.{name} "
+        f"EXCEPT SELECT {column_str} FROM new.{name})"
+    )
+    updated = con.execute(
+        f"SELECT COUNT(*) FROM {name}_upsert AS r JOIN {name}_delete AS k "
+        f"ON {_match_key(key)}"
+    ).fetchone()[0]
+    upserted = con.execute(f"SELECT COUNT(*) FROM {name}_upsert").fetchone()[0]
+    deleted = con.execute(f"SELECT COUNT(*) FROM {name}_delete").fetchone()[0]
+    con.execute("COMMIT")
+    return {
+        "inserted": upserted - updated,
+        "updated": updated,
+        "deleted": deleted - updated,
+        "before_sha256": hash_dataset(con, name, dataset, "old"),
+        "after_sha256": hash_dataset(con, name, dataset, "new"),
+    }
+
+
+def load_delta(delta_path: Path) -> tuple[dict, dict]:
+    """Returns the summary of a delta and the manifest it leads to"""
+    con = sqlite3.connect(_get_uri(delta_path), uri=True)
+    try:
+        values = dict(
+            con.execute(f"SELECT key, value FROM {DELTA_METADATA_TABLE}")
+        )
+    except sqlite3.DatabaseError as e:
+        raise DeltaError(f"{delta_path} is not a delta: {e}") from e
+    finally:
+        con.close()
+    return json.loads(values["delta"]), json.loads(values["manifest"])
+
+
+def apply_delta(
+    release_path: Path,
+    delta_path: Path,
+    logger: logging.Logger,
+    verify: bool = True,
+) -> dict:
+    """
+    Patches the databases of a release with a delta. The content hash of
+    every table is compared with the release of the delta before the first
+    database is patched and with the new release after it. The databases
+    are patched as copies, which only replace the originals, followed by
+    the manifest, once all of them were patched, so a failed delta leaves
+    the release unchanged. Returns the summary of the applied delta.
+    """
+    summary, new_manifest = load_delta(delta_path)
+    manifest = load_release_manifest(release_path)
+    if get_release_version(manifest) != summary["from"]:
+        raise DeltaError(
+            f"the delta requires release {summary["from"]}, found "
+            f"{get_release_version(manifest)}"
+        )
+    if manifest.get("database_file") != new_manifest.get("database_file"):
+        raise DeltaError("the release layout changed")
+
+    db_datasets: dict[Path, list[str]] = {}
+    for name in summary["datasets"]:
+        db_path = get_database_path(release_path, manifest, name)
+        db_datasets.setdefault(db_path, []).append(name)
+    if verify:
+        db_datasets = _get_unpatched_databases(
+            db_datasets, new_manifest, summary, logger
+        )
+
+    build_paths: dict[Path, Path] = {}
+    try:
+        for db_path, names in db_datasets.items():
+            # a copy also keeps a hardlinked database of a previous release
+            # unchanged when it replaces the link
+            build_paths[db_path] = get_build_path(db_path)
+            shutil.copy2(db_path, build_paths[db_path])
+            _patch_database(
+                build_paths[db_path],
+                delta_path,
+                names,
+                new_manifest=new_manifest,
+                summary=summary,
+                verify=verify,
+            )
+    except BaseException:
+        for build_path in build_paths.values():
+            build_path.unlink(missing_ok=True)
+        raise
+
+    for db_path, build_path in build_paths.items():
+        replace_file(build_path, db_path)
+        logger.info("patched %s", db_path)
+    write_json(release_path / "manifest.json", new_manifest)
+    return summary
+
+
+def _get_unpatched_databases(
+    db_datasets: dict[Path, list[str]],
+    new_manifest: dict,
+    summary: dict,
+    logger: logging.Logger,
+) -> dict[Path, list[str]]:
+    """
+    Compares the tables of every database with the release of the delta and
+    returns the databases that still have to be patched. Databases that
+    already match the new release were published by an earlier attempt that
+    failed before the manifest was written and are skipped.
+    """
+    unpatched = {}
+    for db_path, names in db_datasets.items():
+        con = sqlite3.connect(_get_uri(db_path), uri=True)
+        try:
+            hashes = {
+                name: hash_dataset(con, name, new_manifest["datasets"][name])
+                for name in names
+            }
+        finally:
+            con.close()
+        for name, content_hash in hashes.items():
+            if content_hash not in (
+                summary["datasets"][name]["before_sha256"],
+                summary["datasets"][name]["after_sha256"],
+            ):
+                raise DeltaError(
+                    f"{name}: the database does not match the release of "
+                    "the delta"
+                )
+        if all(
+            hashes[name] == summary["datasets"][name]["after_sha256"]
+            and hashes[name] != summary["datasets"][name]["before_sha256"]
+            for name in names
+        ):
+            logger.info("%s is already patched", db_path)
+        else:
+            unpatched[db_path] = names
+    return unpatched
+
+
+def _patch_database(
+    db_path: Path,
+    delta_path: Path,
+    names: list[str],
+    *,
+    new_manifest: dict,
+    summary: dict,
+    verify: bool,
+):
+    """Patches the datasets of a database in a single transaction"""
+    # uri=True lets ATTACH open the delta read-only
+    con = sqlite3.connect(db_path, isolation_level=None, uri=True)
+    try:
+        con.execute("ATTACH ? AS delta", (_get_uri(delta_path),))
+        con.execute("BEGIN IMMEDIATE")
+        for name in names:
+            _patch_dataset(
+                con,
+                name,
+                new_manifest["datasets"][name],
+                summary["datasets"][name],
+                verify,
+            )
+        if "database_file" in new_manifest:
+            con.execute(
+                f"INSERT OR REPLACE INTO {METADATA_TABLE} "
+                "VALUES('manifest', ?)",
+                (json.dumps(new_manifest),),
+            )
+        con.execute("COMMIT")
+    finally:
+        con.close()
+
+
+def _patch_dataset(
+    con: sqlite3.Connection,
+    name: str,
+    dataset: dict,
+    dataset_delta: dict,
+    verify: bool,
+):
+    """
+    Deletes the rows of the delete table by their key and inserts the rows
+    of the upsert table. Inserted rows get new ids unless the id is the key.
+    The rows were compared with the previous release before.
+    """
+    columns = get_content_columns(dataset)
+    column_str = ", ".join(columns)
+    key_match = _match_key(get_row_key(dataset))
+    fts = dataset.get("fts")
+    if fts:
+        # the fts table has external content and needs the old texts
+        fts_columns = ", ".join(column["name"] for column in fts["columns"])
+        con.execute(
+            f"INSERT INTO {fts["table"]}({fts["table"]}, rowid, "
+            f"{fts_columns}) SELECT 'delete', id, {fts_columns} "
+            f"FROM {fts["table"]}_content WHERE id IN ("
+            f"SELECT r.id FROM delta.{name}_delete AS k "
+            f"JOIN {name} AS r ON {key_match})"
+        )
+    con.execute(
+        f"DELETE FROM {name} WHERE id IN (SELECT r.id FROM "
+        f"delta.{name}_delete AS k JOIN {name} AS r ON {key_match})"
+    )
+    con.execute(
+        f"INSERT INTO {name}({column_str}) "
+        f"SELECT {column_str} FROM delta.{name}_upsert"
+    )
+    if fts:
+        con.execute(
+            f"INSERT INTO {fts["table"]}(rowid, {fts_columns}) "
+            f"SELECT id, {fts_columns} FROM {fts["table"]}_content "
+            f"WHERE id IN (SELECT r.id FROM delta.{name}_upsert AS k "
+            f"JOIN {name} AS r ON {key_match})"
+        )
+
+    if verify and hash_dataset(con, name, dataset) != (
+        dataset_delta["after_sha256"]
+    ):
+        raise DeltaError(
+            f"{name}: the patched database differs from the release"
+        )
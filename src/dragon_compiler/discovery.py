@@ -0,0 +1,100 @@
+"""
+This module discovers the source files of a dataset. Folders are scanned
+with os.scandir, every folder is sorted by name, so the files and therefore
+the row ids come in the same order on every machine, and the files are
+yielded while the scan is still running.
+"""
+
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+import os
+from pathlib import Path, PurePosixPath
+from dragon_compiler.sources import is_source_file
+
+
+class SourceFile(Path):
+    """Path of a source file that keeps the stat result of the folder scan"""
+
+    def __init__(self, *args, stat_result: os.stat_result | None = None):
+        super().__init__(*args)
+        self._stat_result = stat_result
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat_result is None or not follow_symlinks:
+            return super().stat(follow_symlinks=follow_symlinks)
+        return self._stat_result
+
+
+@dataclass
+class SourceDiscovery:
+    """
+    Finds the source files of a dataset. Without patterns every json or
+    json lines file directly in the source folder is a source file.
+    Patterns are matched against the path relative to the source folder and
+    support `**`, e.g. `"exclude": ["drafts/**", "**/*.bak.json"]`. A
+    folder that matches an exclude pattern is not scanned at all.
+    """
+
+    recursive: bool = False
+    include: list[str] = field(default_factory=list)
+    exclude: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_manifest(cls, dataset: dict) -> "SourceDiscovery":
+        return cls(
+            dataset.get("recursive", False),
+            list(dataset.get("include", [])),
+            list(dataset.get("exclude", [])),
+        )
+
+    def iter_files(self, source_folder: Path) -> Iterator[SourceFile]:
+        for _, entry in self.iter_entries(source_folder):
+            yield SourceFile(entry.path, stat_result=entry.stat())
+
+    def iter_entries(
+        self, source_folder: Path
+    ) -> Iterator[tuple[str, os.DirEntry]]:
+        """
+        Yields the relative posix path and the directory entry of every
+        source file. Cheaper than `iter_files` if the files are only
+        compared by their stat results, e.g. by watch mode.
+        """
+        yield from self._scan(source_folder, PurePosixPath())
+
+    def _scan(
+        self, folder: Path | str, rel_folder: PurePosixPath
+    ) -> Iterator[tuple[str, os.DirEntry]]:
+        with os.scandir(folder) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        # relative paths of files are plain strings, creating a path
+        # object per file would take longer than the scan itself
+        prefix = f"{rel_folder}/" if rel_folder.parts else ""
+        for entry in entries:
+            # symlinked folders are not followed to rule out cycles
+            if entry.is_dir(follow_symlinks=False):
+                rel_path = rel_folder / entry.name
+                if self.recursive and not self._is_excluded_folder(rel_path):
+                    yield from self._scan(entry.path, rel_path)
+            elif entry.is_file() and self._is_included(prefix + entry.name):
+                yield prefix + entry.name, entry
+
+    def _is_included(self, rel_path: str) -> bool:
+        if not is_source_file(rel_path):
+            return False
+        if not self.include and not self.exclude:
+            return True
+        path = PurePosixPath(rel_path)
+        if self.include and not any(
+            path.full_match(pattern) for pattern in self.include
+        ):
+            return False
+        return not any(path.full_match(pattern) for pattern in self.exclude)
+
+    def _is_excluded_folder(self, rel_path: PurePosixPath) -> bool:
+        for pattern in self.exclude:
+            # "drafts/**" excludes the drafts folder itself, too
+            if rel_path.full_match(pattern) or (
+                pattern.endswith("/**") and rel_path.full_match(pattern[:-3])
+            ):
+                return True
+        return False
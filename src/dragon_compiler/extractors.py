@@ -0,0 +1,276 @@
+"""
+This module compiles the extraction of the column values of a dataset. The
+extractor of a dataset is generated python code that reads every column
+path from a decoded document and checks the value against the declared
+sqlite type in a single pass. Values that do not match are coerced or
+reported depending on the type check mode.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import StrEnum
+import json
+from pathlib import Path
+from typing import Any
+
+MAX_REPORTED_VALUE_CHARS = 80
+
+Extractor = Callable[[Any, str], tuple]
+Converter = Callable[[Any], Any]
+
+
+class TypeCheck(StrEnum):
+    """How extracted values are checked against their column type"""
+
+    # values are inserted as they are
+    OFF = "off"
+    # values are converted to the column type, values that can not be
+    # converted are stored as NULL and reported
+    LENIENT = "lenient"
+    # values that do not have the column type are reported and fail the
+    # build once the whole dataset was read
+    STRICT = "strict"
+
+
+class Affinity(StrEnum):
+    """Type affinity of a declared sqlite column type"""
+
+    INTEGER = "INTEGER"
+    TEXT = "TEXT"
+    BLOB = "BLOB"
+    REAL = "REAL"
+    NUMERIC = "NUMERIC"
+
+
+def get_affinity(declared_type: str) -> Affinity:
+    """Determines the affinity with the rules of sqlite"""
+    declared_type = declared_type.upper()
+    if "INT" in declared_type:
+        return Affinity.INTEGER
+    if any(name in declared_type for name in ("CHAR", "CLOB", "TEXT")):
+        return Affinity.TEXT
+    if "BLOB" in declared_type or not declared_type:
+        return Affinity.BLOB
+    if any(name in declared_type for name in ("REAL", "FLOA", "DOUB")):
+        return Affinity.REAL
+    return Affinity.NUMERIC
+
+
+# python types that are stored as they are
+_EXACT_TYPES = {
+    Affinity.INTEGER: (int,),
+    Affinity.TEXT: (str,),
+    Affinity.BLOB: (str, int, float),
+    Affinity.REAL: (float,),
+    Affinity.NUMERIC: (int, float),
+}
+
+
+class ColumnTypeError(ValueError):
+    """Raised if a strictly checked dataset contains values of wrong type"""
+
+
+@dataclass
+class TypeIssue:
+    """A value that does not match the type of its column"""
+
+    column: str
+    type: str
+    value: str
+
+
+class _NotConvertible(Exception):
+    pass
+
+
+def _to_integer(value: Any) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return _to_integer(_to_real(value))
+    raise _NotConvertible
+
+
+def _to_real(value: Any) -> float:
+    if isinstance(value, (bool, int)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError as e:
+            raise _NotConvertible from e
+    raise _NotConvertible
+
+
+def _to_numeric(value: Any) -> int | float:
+    try:
+        return _to_integer(value)
+    except _NotConvertible:
+        return _to_real(value)
+
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    # booleans, objects and arrays are stored as json like in rest
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _to_blob(value: Any) -> str | int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, bytes):
+        return value
+    return _to_text(value)
+
+
+_CONVERSIONS = {
+    Affinity.INTEGER: _to_integer,
+    Affinity.TEXT: _to_text,
+    Affinity.BLOB: _to_blob,
+    Affinity.REAL: _to_real,
+    Affinity.NUMERIC: _to_numeric,
+}
+
+
+def _make_converter(
+    affinity: Affinity,
+    column: str,
+    declared_type: str,
+    type_check: TypeCheck,
+    issues: list[TypeIssue],
+) -> Converter:
+    """
+    Returns the slow path of a column, which is only called for values that
+    are not None and not of an exact type of the column.
+    """
+    conversion = _CONVERSIONS[affinity]
+
+    def convert(value: Any) -> Any:
+        if type_check == TypeCheck.LENIENT:
+            try:
+                return conversion(value)
+            except (_NotConvertible, ValueError, OverflowError):
+                pass
+        elif affinity == Affinity.REAL and value.__class__ is int:
+            # json does not distinguish 1 and 1.0
+            return float(value)
+        issues.append(TypeIssue(column, declared_type, _format_value(value)))
+        return None
+
+    return convert
+
+
+def _format_value(value: Any) -> str:
+    text = repr(value)
+    if len(text) > MAX_REPORTED_VALUE_CHARS:
+        return text[: MAX_REPORTED_VALUE_CHARS - 3] + "..."
+    return text
+
+
+def _get_lookup_code(keys: list[str | int]) -> list[str]:
+    lines = ["    value = document"]
+    for key in keys:
+        if isinstance(key, str):
+            lines.append(
+                f"    value = value.get({key!r}) "
+                "if isinstance(value, dict) else None"
+            )
+        else:
+            lines.append(
+                f"    value = value[{key}] if isinstance(value, list) and "
+                f"{-key - 1 if key < 0 else key} < len(value) else None"
+            )
+    return lines
+
+
+def compile_extractor(
+    paths: list[list[str | int]],
+    column_types: list[str],
+    type_check: TypeCheck,
+    issues: list[TypeIssue],
+    column_names: list[str] | None = None,
+) -> Extractor:
+    """
+    Generates a function that returns the row of a decoded document and its
+    rest. Values that do not match their column type are added to `issues`.
+    """
+    column_names = column_names or [".".join(map(str, p)) for p in paths]
+    namespace = {}
+    lines = ["def extract(document, rest):"]
+    values = []
+    for idx, keys in enumerate(paths):
+        lines += _get_lookup_code(keys)
+        lines.append(f"    c{idx} = value")
+        if type_check == TypeCheck.OFF or idx >= len(column_types):
+            values.append(f"c{idx}")
+            continue
+        affinity = get_affinity(column_types[idx])
+        namespace[f"convert{idx}"] = _make_converter(
+            affinity,
+            column_names[idx],
+            column_types[idx],
+            type_check,
+            issues,
+        )
+        exact_check = " or ".join(
+            f"c{idx}.__class__ is {t.__name__}" for t in _EXACT_TYPES[affinity]
+        )
+        values.append(
+            f"(c{idx} if c{idx} is None or {exact_check} "
+            f"else convert{idx}(c{idx}))"
+        )
+    values.append("rest")
+    lines.append(f"    return ({", ".join(values)},)")
+    # pylint: disable-next=exec-used
+    exec("\n".join(lines), namespace)
+    return namespace["extract"]
+
+
+@dataclass
+class TypeReport:
+    """Values of a dataset that did not match their column type"""
+
+    type_check: TypeCheck
+    max_examples: int = 20
+    count: int = 0
+    columns: dict[str, int] = field(default_factory=dict)
+    examples: list[dict] = field(default_factory=list)
+
+    def add(self, file: Path, issues: list[TypeIssue]):
+        for issue in issues:
+            self.count += 1
+            self.columns[issue.column] = self.columns.get(issue.column, 0) + 1
+            if len(self.examples) < self.max_examples:
+                self.examples.append(
+                    {
+                        "file": str(file),
+                        "column": issue.column,
+                        "type": issue.type,
+                        "value": issue.value,
+                    }
+                )
+
+    def to_manifest(self) -> dict:
+        return {
+            "mode": self.type_check,
+            "count": self.count,
+            "columns": dict(self.columns),
+            "examples": list(self.examples),
+        }
+
+    def format_summary(self, name: str) -> str:
+        columns = ", ".join(
+            f"{column} ({count})" for column, count in self.columns.items()
+        )
+        lines = [f"{name}: {self.count} values of wrong type in {columns}"]
+        lines += [
+            f"  {e["file"]}: {e["column"]} {e["type"]} = {e["value"]}"
+            for e in self.examples
+        ]
+        return "\n".join(lines)
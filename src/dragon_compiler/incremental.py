@@ -0,0 +1,206 @@
+"""This module tracks the source files of a dataset for incremental builds"""
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+@dataclass
+class SourceIndexEntry:
+    """State of a source file at the time its rows were written"""
+
+    mtime_ns: int
+    size: int
+    sha256: str
+    # ids of the rows of the file as [first id, number of ids]
+    row_ranges: list[list[int]] = field(default_factory=list)
+
+    def iter_row_ids(self) -> Iterator[int]:
+        for first_id, count in self.row_ranges:
+            yield from range(first_id, first_id + count)
+
+    def add_row_id(self, row_id: int):
+        if self.row_ranges:
+            first_id, count = self.row_ranges[-1]
+            if first_id + count == row_id:
+                self.row_ranges[-1][1] += 1
+                return
+        self.row_ranges.append([row_id, 1])
+
+
+@dataclass
+class SourceChanges:
+    """Difference between the source folder and the last build"""
+
+    added: list[Path] = field(default_factory=list)
+    changed: list[Path] = field(default_factory=list)
+    # rows of changed and removed files
+    obsolete_ids: list[int] = field(default_factory=list)
+    unchanged: int = 0
+
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.obsolete_ids)
+
+
+@dataclass
+class SourceIndex:
+    """
+    Sidecar index of a dataset database. It maps every source file to the
+    rows it produced, so that only added, changed or removed files have to
+    be processed by the next build.
+    """
+
+    config_hash: str
+    entries: dict[str, SourceIndexEntry] = field(default_factory=dict)
+    next_id: int = 0
+    _reusable_ids: dict[str, Iterator[int]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    @staticmethod
+    def get_path(db_path: Path) -> Path:
+        return db_path.with_suffix(".index.json")
+
+    @classmethod
+    def load(cls, path: Path) -> "SourceIndex | None":
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(
+                data["config_hash"],
+                {
+                    rel_path: SourceIndexEntry(**entry)
+                    for rel_path, entry in data["entries"].items()
+                },
+                data["next_id"],
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, path: Path):
+        tmp_path = path.with_suffix(".tmp")
+        data = {
+            "config_hash": self.config_hash,
+            "next_id": self.next_id,
+            "entries": {
+                # the fields without the deep copy of asdict
+                rel_path: vars(entry)
+                for rel_path, entry in sorted(self.entries.items())
+            },
+        }
+        with tmp_path.open("w", encoding="utf-8") as f:
+            # json.dumps uses the c encoder, json.dump encodes in python
+            f.write(json.dumps(data))
+        os.replace(tmp_path, path)
+
+    def get_row_count(self) -> int:
+        return sum(
+            count
+            for entry in self.entries.values()
+            for _, count in entry.row_ranges
+        )
+
+    def update(
+        self, source_folder: Path, files: Iterable[Path]
+    ) -> SourceChanges:
+        """
+        Compares the given files against the index and updates the index in
+        place. Files are only hashed if their size or modification time
+        changed. Added files are returned in sorted path order.
+
+        The rows of changed files have to be registered again with
+        `new_row_id`, which hands out their previous ids first.
+        """
+        changes = SourceChanges()
+        seen = set()
+        new_files = []
+        for file in files:
+            rel_path = file.relative_to(source_folder).as_posix()
+            seen.add(rel_path)
+            self._compare_file(rel_path, file, changes, new_files)
+
+        for rel_path in sorted(self.entries.keys() - seen):
+            changes.obsolete_ids.extend(
+                self.entries.pop(rel_path).iter_row_ids()
+            )
+
+        self._add_files(new_files, changes)
+        return changes
+
+    def update_files(
+        self, source_folder: Path, rel_paths: Iterable[str]
+    ) -> SourceChanges:
+        """
+        Like `update`, but only compares the given files instead of every
+        file of the source folder, e.g. the files that a watcher saw
+        changing. Given files that do not exist anymore were removed.
+        """
+        changes = SourceChanges()
+        new_files = []
+        for rel_path in sorted(set(rel_paths)):
+            file = source_folder / rel_path
+            if file.is_file():
+                self._compare_file(rel_path, file, changes, new_files)
+            elif rel_path in self.entries:
+                changes.obsolete_ids.extend(
+                    self.entries.pop(rel_path).iter_row_ids()
+                )
+        self._add_files(new_files, changes)
+        return changes
+
+    def _compare_file(
+        self,
+        rel_path: str,
+        file: Path,
+        changes: SourceChanges,
+        new_files: list[tuple[str, Path, os.stat_result]],
+    ):
+        stat = file.stat()
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            new_files.append((rel_path, file, stat))
+            return
+        if entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            changes.unchanged += 1
+            return
+
+        sha256 = hash_file(file)
+        if sha256 == entry.sha256:
+            changes.unchanged += 1
+            row_ranges = entry.row_ranges
+        else:
+            changes.changed.append(file)
+            changes.obsolete_ids.extend(entry.iter_row_ids())
+            self._reusable_ids[rel_path] = entry.iter_row_ids()
+            row_ranges = []
+        self.entries[rel_path] = SourceIndexEntry(
+            stat.st_mtime_ns, stat.st_size, sha256, row_ranges
+        )
+
+    def _add_files(
+        self,
+        new_files: list[tuple[str, Path, os.stat_result]],
+        changes: SourceChanges,
+    ):
+        for rel_path, file, stat in sorted(new_files):
+            self.entries[rel_path] = SourceIndexEntry(
+                stat.st_mtime_ns, stat.st_size, hash_file(file)
+            )
+            changes.added.append(file)
+
+    def new_row_id(self, rel_path: str) -> int:
+        """Returns the id for the next row of a changed or added file"""
+        row_id = next(self._reusable_ids.get(rel_path, iter(())), None)
+        if row_id is None:
+            row_id = self.next_id
+            self.next_id += 1
+        self.entries[rel_path].add_row_id(row_id)
+        return row_id
+
+
+def hash_file(file: Path) -> str:
+    with file.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
@@ -0,0 +1,121 @@
+"""
+This module reads compiled releases through their manifest.json. It locates
+the database of a dataset in either release layout and computes the
+content hash of a dataset table.
+"""
+
+from enum import StrEnum
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+
+MANIFEST_FILE_NAME = "manifest.json"
+# table of the single layout that stores the manifest in the database
+METADATA_TABLE = "dragon_metadata"
+
+
+class ColumnStorage(StrEnum):
+    """How the value of a manifest column is stored"""
+
+    # the compiler extracts the value from the json document
+    EXTRACTED = "extracted"
+    # sqlite generated column over the rest column
+    VIRTUAL = "virtual"
+    STORED = "stored"
+
+
+def is_generated_column(column: dict) -> bool:
+    return ColumnStorage(column.get("storage", ColumnStorage.EXTRACTED)) in (
+        ColumnStorage.VIRTUAL,
+        ColumnStorage.STORED,
+    )
+
+
+def get_stored_columns(dataset: dict) -> list[str]:
+    """Returns the names of the columns that are not generated by sqlite"""
+    return [
+        column["name"]
+        for column in dataset["columns"]
+        if not is_generated_column(column)
+    ]
+
+
+def get_row_key(dataset: dict) -> list[str]:
+    """Returns the columns that identify a row across releases"""
+    return dataset.get("key", ["id"])
+
+
+def get_content_columns(dataset: dict) -> list[str]:
+    """
+    Returns the columns that make up the content of a dataset. The id is
+    only part of it if it is the key, otherwise it is a detail of the
+    database file, like the order of the source files.
+    """
+    key = get_row_key(dataset)
+    return [
+        name
+        for name in get_stored_columns(dataset)
+        if name != "id" or "id" in key
+    ]
+
+
+def load_release_manifest(release_path: Path) -> dict:
+    with (release_path / MANIFEST_FILE_NAME).open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_database_path(release_path: Path, manifest: dict, name: str) -> Path:
+    """Returns the database file of a dataset of a release"""
+    # releases with the single layout name their database file
+    return release_path / manifest.get("database_file", f"{name}.sqlite")
+
+
+def get_release_version(manifest: dict) -> dict:
+    return {
+        "version": manifest.get("database_info", {}).get("version"),
+        "build_time": manifest.get("build_time"),
+    }
+
+
+def hash_table_rows(
+    con: sqlite3.Connection,
+    table: str,
+    columns: list[str],
+    schema: str = "main",
+    order_by: list[str] | None = None,
+) -> str:
+    """
+    Hashes the rows of a table in id order or the order of unique columns.
+    The hash only depends on the column names and values, not on the page
+    layout of the database file.
+    """
+    content_hash = hashlib.sha256(repr(columns).encode("utf-8"))
+    cursor = con.execute(
+        f"SELECT {", ".join(columns)} FROM {schema}.{table} "
+        f"ORDER BY {", ".join(order_by or ["id"])}"
+    )
+    while rows := cursor.fetchmany(1000):
+        for row in rows:
+            # the repr of ints, floats, strings and bytes is canonical
+            content_hash.update(repr(row).encode("utf-8"))
+    return content_hash.hexdigest()
+
+
+def hash_dataset(
+    con: sqlite3.Connection, name: str, dataset: dict, schema: str = "main"
+) -> str:
+    """
+    Returns the content hash of a dataset table. The rows are hashed in the
+    order of their key and then their values, so the hash does not change
+    with the ids either.
+    """
+    columns = get_content_columns(dataset)
+    key = get_row_key(dataset)
+    return hash_table_rows(
+        con,
+        name,
+        columns,
+        schema,
+        key + [column for column in columns if column not in key],
+    )
@@ -0,0 +1,133 @@
+"""
+This module limits the memory the inserts of a build add to the parsed
+documents. Rows are grouped into insert batches by size instead of only by
+count, and rows that are too large to be bound as a parameter are written
+in chunks with sqlite's incremental blob i/o. The budget is not a hard
+limit: the rest of a row is still built as one string, and a build that
+exceeds the budget with the smallest batches only logs a warning.
+"""
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+import itertools
+import logging
+from dragon_compiler.profiling import get_current_rss_mib
+
+STREAM_CHUNK_CHARS = 1 << 20
+
+
+@dataclass
+class MemoryBudget:
+    """Memory limits of a build, None means unlimited"""
+
+    limit_mib: int | None = None
+    # rows with a larger rest are streamed into the database
+    max_row_bytes: int | None = None
+
+    def get_max_batch_bytes(self) -> int | None:
+        if self.limit_mib is None:
+            return None
+        # leaves room for the parser, the page cache and python itself
+        return self.limit_mib * 2**20 // 8
+
+    def get_max_row_bytes(self) -> int | None:
+        if self.max_row_bytes is not None:
+            return self.max_row_bytes
+        if self.limit_mib is None:
+            return None
+        return self.limit_mib * 2**20 // 32
+
+
+class RowBatcher:
+    """
+    Groups rows into insert batches of at most `batch_size` rows and
+    `max_batch_bytes` bytes of rest. A row whose rest exceeds
+    `max_row_bytes` is yielded as a batch of its own that is marked as
+    oversized. If the resident memory exceeds the limit the byte budget of
+    the batches is halved down to 1 MiB, below that the limit is only
+    reported once.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        *,
+        max_batch_bytes: int | None = None,
+        max_row_bytes: int | None = None,
+        limit_mib: int | None = None,
+        logger: logging.Logger | None = None,
+    ):
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_row_bytes = max_row_bytes
+        self.limit_mib = limit_mib
+        self.logger = logger or logging.getLogger(__name__)
+        self._exceeded_logged = False
+
+    def iter_batches(
+        self, rows: Iterable[tuple]
+    ) -> Iterator[tuple[tuple | list, bool]]:
+        if self.max_batch_bytes is None and self.max_row_bytes is None:
+            for batch in itertools.batched(rows, self.batch_size):
+                yield batch, False
+            return
+
+        max_batch_bytes = self.max_batch_bytes or float("inf")
+        max_row_bytes = self.max_row_bytes or float("inf")
+        batch = []
+        batch_bytes = 0
+        for row in rows:
+            # the length of the rest is a cheap estimate of the row size
+            row_bytes = len(row[-1] or "")
+            if row_bytes > max_row_bytes:
+                yield [row], True
+                continue
+            if batch and (
+                len(batch) >= self.batch_size
+                or batch_bytes + row_bytes > max_batch_bytes
+            ):
+                yield batch, False
+                batch = []
+                batch_bytes = 0
+                max_batch_bytes = self._check_memory(max_batch_bytes)
+            batch.append(row)
+            batch_bytes += row_bytes
+        if batch:
+            yield batch, False
+
+    def _check_memory(self, max_batch_bytes: float) -> float:
+        if self.limit_mib is None:
+            return max_batch_bytes
+        rss_mib = get_current_rss_mib()
+        if rss_mib is None or rss_mib <= self.limit_mib:
+            return max_batch_bytes
+        if max_batch_bytes > 2**20:
+            max_batch_bytes //= 2
+            self.logger.warning(
+                "memory use of %.0f MiB exceeds the limit of %d MiB, reduce "
+                "the insert batches to %.1f MiB",
+                rss_mib,
+                self.limit_mib,
+                max_batch_bytes / 2**20,
+            )
+        elif not self._exceeded_logged:
+            self._exceeded_logged = True
+            self.logger.warning(
+                "memory use of %.0f MiB exceeds the limit of %d MiB with the "
+                "smallest insert batches, the limit can not be kept",
+                rss_mib,
+                self.limit_mib,
+            )
+        return max_batch_bytes
+
+
+def get_utf8_length(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return sum(len(chunk) for chunk in iter_utf8_chunks(text))
+
+
+def iter_utf8_chunks(text: str) -> Iterator[bytes]:
+    """Encodes a large text piece by piece instead of copying it at once"""
+    for start in range(0, len(text), STREAM_CHUNK_CHARS):
+        yield text[start : start + STREAM_CHUNK_CHARS].encode("utf-8")
@@ -0,0 +1,123 @@
+"""This module provides the ordered parallel processing of source files"""
+
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+import queue
+import threading
+
+_DONE = object()
+
+
+@dataclass
+class Resolved:
+    """
+    Work item whose results are already known, e.g. from a cache. It is not
+    submitted, its results are yielded in order with the others.
+    """
+
+    results: Iterable
+
+
+class OrderedTaskQueue:
+    """
+    Submits chunks of work items to an executor and yields the results in
+    submission order.
+
+    A feeder thread consumes the work items and keeps at most `max_pending`
+    chunks in flight. The results are drained by the calling thread, which
+    is therefore the only thread that needs to talk to the database. The
+    results of `Resolved` items are iterated by the calling thread as well.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        func: Callable[[list], list],
+        chunk_size: int,
+        max_pending: int,
+    ):
+        self._executor = executor
+        self._func = func
+        self._chunk_size = chunk_size
+        self._max_pending = max_pending
+
+    def map(self, items: Iterable) -> Iterator:
+        futures: queue.Queue[Future | object] = queue.Queue(
+            maxsize=self._max_pending
+        )
+        stop = threading.Event()
+        feeder = threading.Thread(
+            target=self._feed, args=(items, futures, stop), daemon=True
+        )
+        feeder.start()
+        try:
+            while (future := futures.get()) is not _DONE:
+                if isinstance(future, BaseException):
+                    raise future
+                if isinstance(future, Resolved):
+                    yield from future.results
+                else:
+                    yield from future.result()
+        finally:
+            stop.set()
+            self._cancel_pending(futures)
+            feeder.join()
+
+    def _feed(
+        self,
+        items: Iterable,
+        futures: queue.Queue,
+        stop: threading.Event,
+    ):
+        try:
+            chunk = []
+            for item in items:
+                if isinstance(item, Resolved):
+                    # the pending chunk comes first to keep the order
+                    if chunk and not self._submit(chunk, futures, stop):
+                        return
+                    chunk = []
+                    if not self._put(futures, item, stop):
+                        return
+                    continue
+                chunk.append(item)
+                if len(chunk) == self._chunk_size:
+                    if not self._submit(chunk, futures, stop):
+                        return
+                    chunk = []
+            if chunk and not self._submit(chunk, futures, stop):
+                return
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self._put(futures, e, stop)
+            return
+        self._put(futures, _DONE, stop)
+
+    def _submit(
+        self, chunk: list, futures: queue.Queue, stop: threading.Event
+    ) -> bool:
+        future = self._executor.submit(self._func, chunk)
+        if not self._put(futures, future, stop):
+            future.cancel()
+            return False
+        return True
+
+    def _put(
+        self, futures: queue.Queue, item: object, stop: threading.Event
+    ) -> bool:
+        while not stop.is_set():
+            try:
+                futures.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _cancel_pending(self, futures: queue.Queue):
+        while True:
+            try:
+                future = futures.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(future, Future):
+                future.cancel()
@@ -0,0 +1,175 @@
+"""
+This module collects the time spent in the stages of a build, e.g. reading
+the source files, decoding json or inserting rows, together with a few
+counters and the peak memory of the build.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+import os
+import sys
+import threading
+import time
+from typing import Any
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on windows
+    resource = None
+
+
+@dataclass
+class StageStats:
+    """Accumulated time of a single build stage"""
+
+    seconds: float = 0.0
+    calls: int = 0
+
+
+class BuildProfiler:
+    """
+    Collects stage timings and counters. The instance of a dataset is used
+    by the thread that writes the database and the thread that discovers
+    the source files, so updates are guarded by a lock.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, int] = {}
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        with self._lock:
+            stats = self.stages.setdefault(stage, StageStats())
+            stats.seconds += seconds
+            stats.calls += calls
+
+    def add(self, counter: str, value: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start_time)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """Returns a function that adds the run time of func to a stage"""
+
+        def timed(*args: Any) -> Any:
+            start_time = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.add_time(name, time.perf_counter() - start_time)
+
+        return timed
+
+    def iter(self, name: str, items: Iterable) -> Iterator:
+        """
+        Yields the items and adds the time spent to produce them to a
+        stage, the time the consumer spends between two items is excluded.
+        """
+        iterator = iter(items)
+        while True:
+            start_time = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start_time, 0)
+                return
+            self.add_time(name, time.perf_counter() - start_time)
+            yield item
+
+    def merge(self, other: "BuildProfiler"):
+        for name, stats in other.stages.items():
+            self.add_time(name, stats.seconds, stats.calls)
+        for name, value in other.counters.items():
+            self.add(name, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "seconds": round(self.wall_seconds, 3),
+            "stages": {
+                name: {"seconds": round(stats.seconds, 3), "calls": stats.calls}
+                for name, stats in self.stages.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def format_report(self, title: str) -> str:
+        """Returns the stage breakdown as a table for the console"""
+        lines = [
+            title,
+            f"  {"stage":<16}{"seconds":>10}{"share":>9}{"calls":>12}",
+        ]
+        for name, stats in sorted(
+            self.stages.items(), key=lambda item: -item[1].seconds
+        ):
+            share = (
+                stats.seconds / self.wall_seconds if self.wall_seconds else 0
+            )
+            lines.append(
+                f"  {name:<16}{stats.seconds:>10.3f}{share:>9.1%}"
+                f"{stats.calls:>12}"
+            )
+        lines.append(f"  {"total":<16}{self.wall_seconds:>10.3f}")
+        for name, value in self.counters.items():
+            lines.append(f"  {name:<16}{value:>10}")
+        return "\n".join(lines)
+
+
+class NullProfiler(BuildProfiler):
+    """Profiler that records nothing and adds no overhead to the build"""
+
+    enabled = False
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        pass
+
+    def add(self, counter: str, value: int = 1):
+        pass
+
+    def stage(self, name: str) -> nullcontext:
+        return nullcontext()
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        return func
+
+    def iter(self, name: str, items: Iterable) -> Iterable:
+        return items
+
+
+def get_peak_rss_mib() -> float | None:
+    """
+    Returns the peak resident memory of this process and its largest worker
+    process in MiB or None if the platform does not report it.
+    """
+    if resource is None:
+        return None
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macos and in KiB everywhere else
+    return peak_rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def get_current_rss_mib() -> float | None:
+    """
+    Returns the current resident memory of this process in MiB. Only linux
+    reports it, other platforms return None.
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
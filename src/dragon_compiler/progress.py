@@ -0,0 +1,104 @@
+"""
+This module reports the progress of a dataset build in regular intervals,
+so large builds do not log a line per source file or row.
+"""
+
+from collections.abc import Iterable, Iterator
+import datetime
+import logging
+import time
+from pathlib import Path
+
+
+class ProgressReporter:
+    """
+    Logs the number of rows and files processed, the insert rate and the
+    estimated remaining time of a dataset. A report is logged if at least
+    `interval_seconds` passed or `interval_rows` rows were added since the
+    last one. The reporter is only updated per insert batch, so it does not
+    slow down the build.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        name: str,
+        interval_seconds: float = 10.0,
+        interval_rows: int = 0,
+    ):
+        self.logger = logger
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.interval_rows = interval_rows
+        self.enabled = (
+            interval_seconds > 0 or interval_rows > 0
+        ) and logger.isEnabledFor(logging.INFO)
+        self.rows = 0
+        self.files = 0
+        self.total_files: int | None = None
+        self._start_time = time.perf_counter()
+        self._last_report_time = self._start_time
+        self._last_report_rows = 0
+
+    def track_files(self, files: Iterable[Path]) -> Iterable[Path]:
+        """
+        Counts the source files as they are consumed by the build. The
+        files are not scanned in advance, so unless `total_files` was set
+        the total is only known and an eta reported once they are all
+        discovered.
+        """
+        if not self.enabled:
+            return files
+        return self._count_files(files)
+
+    def _count_files(self, files: Iterable[Path]) -> Iterator[Path]:
+        for file in files:
+            self.files += 1
+            yield file
+        if self.total_files is None:
+            self.total_files = self.files
+
+    def update(self, rows: int):
+        """Adds the rows of an insert batch and logs a report if it is due"""
+        self.rows += rows
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if (
+            0 < self.interval_seconds <= now - self._last_report_time
+            or 0 < self.interval_rows <= self.rows - self._last_report_rows
+        ):
+            self._report(now)
+
+    def _report(self, now: float):
+        self._last_report_time = now
+        self._last_report_rows = self.rows
+        elapsed = now - self._start_time
+        rate = self.rows / elapsed if elapsed else 0.0
+        if not self.total_files:
+            self.logger.info(
+                "%s: %d rows, %d files, %.0f rows/s",
+                self.name,
+                self.rows,
+                self.files,
+                rate,
+            )
+            return
+
+        # the files are the only total that is known in advance
+        done = min(self.files, self.total_files)
+        eta = elapsed * (self.total_files - done) / done if done else None
+        self.logger.info(
+            "%s: %d rows, %d/%d files (%.0f%%), %.0f rows/s, eta %s",
+            self.name,
+            self.rows,
+            done,
+            self.total_files,
+            100 * done / self.total_files,
+            rate,
+            (
+                "unknown"
+                if eta is None
+                else datetime.timedelta(seconds=round(eta))
+            ),
+        )
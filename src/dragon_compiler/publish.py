@@ -0,0 +1,111 @@
+"""
+This module publishes build results atomically. Databases are compiled into
+a temporary file next to their final location and renamed over the old file
+once they are complete, so readers never see a partially written database.
+"""
+
+import json
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+
+
+def get_build_path(db_path: Path) -> Path:
+    """Returns the temporary file a database is compiled into"""
+    return db_path.with_name(f".{db_path.name}.build")
+
+
+def get_publish_path(path: Path) -> Path:
+    """Returns the temporary file that is renamed over the given file"""
+    return path.with_name(f".{path.name}.publish")
+
+
+def iter_temp_files(folder: Path):
+    yield from folder.glob(".*.build")
+    yield from folder.glob(".*.publish")
+
+
+def fsync_file(path: Path):
+    with path.open("rb") as f:
+        os.fsync(f.fileno())
+
+
+def fsync_directory(folder: Path):
+    """Makes a rename in the folder durable, not supported on windows"""
+    if os.name != "posix":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replace_file(src: Path, dst: Path):
+    """Moves a complete file durably over its destination"""
+    fsync_file(src)
+    os.replace(src, dst)
+    fsync_directory(dst.parent)
+
+
+def publish_database(build_path: Path, db_path: Path) -> bool:
+    """
+    Replaces db_path with the database compiled at build_path. Databases
+    with free pages, e.g. after an incremental build deleted rows, are
+    compacted with VACUUM INTO on the way. Returns if it was compacted.
+    """
+    con = sqlite3.connect(build_path)
+    try:
+        free_pages = con.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages:
+            publish_path = get_publish_path(db_path)
+            publish_path.unlink(missing_ok=True)
+            con.execute("VACUUM INTO ?", (str(publish_path),))
+    finally:
+        con.close()
+
+    if free_pages:
+        build_path.unlink()
+    else:
+        publish_path = build_path
+    replace_file(publish_path, db_path)
+    return bool(free_pages)
+
+
+def write_json(path: Path, data: dict):
+    """Writes a json file that is either complete or not there at all"""
+    publish_path = get_publish_path(path)
+    with publish_path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    replace_file(publish_path, path)
+
+
+def link_file(src: Path, dst: Path) -> bool:
+    """
+    Replaces dst with a hardlink to src, or a copy of it if the file system
+    does not support hardlinks. Returns if it was linked.
+    """
+    publish_path = get_publish_path(dst)
+    publish_path.unlink(missing_ok=True)
+    try:
+        os.link(src, publish_path)
+        linked = True
+    except OSError:
+        shutil.copy2(src, publish_path)
+        linked = False
+    replace_file(publish_path, dst)
+    return linked
+
+
+def unshare_file(path: Path) -> bool:
+    """
+    Replaces a hardlinked file with a copy of its own, so it can be changed
+    without changing the other links. Returns if it was hardlinked.
+    """
+    if path.stat().st_nlink < 2:
+        return False
+    publish_path = get_publish_path(path)
+    shutil.copy2(path, publish_path)
+    replace_file(publish_path, path)
+    return True
@@ -0,0 +1,323 @@
+"""
+This module reads compiled releases. A release is opened through its
+manifest.json, so services look up rows by id, column or json path without
+knowing the database files or columns of a release. Every database file
+has a pool of read-only connections that is shared by all threads, and
+the json of the rest column is only decoded if a row's document is used.
+"""
+
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+import queue
+import threading
+from pathlib import Path
+import sqlite3
+from typing import Any
+from dragon_compiler.builder import split_json_path, to_json_path
+from dragon_compiler.decoders import (
+    JsonBackend,
+    JsonDecoder,
+    RestFormat,
+    get_decoder,
+)
+from dragon_compiler.manifest import get_database_path, load_release_manifest
+
+DEFAULT_POOL_SIZE = 4
+# the statements of every lookup of every dataset fit into the cache
+CACHED_STATEMENTS = 256
+MAX_MMAP_SIZE = 2**30
+# rows of a lookup unless a limit is given, a negative limit returns all
+DEFAULT_LIMIT = 20
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of read-only connections to a database file. The
+    connections are opened on demand up to `size`, further threads wait
+    until a connection is returned. Every connection keeps the prepared
+    statements of its last queries, so a repeated lookup is not parsed
+    again.
+
+    With `immutable` sqlite does not lock the file or check it for changes,
+    so the file must not be changed while the pool is open, e.g. by
+    `dragon apply-delta`. A file that is replaced by an atomic build is
+    fine, open connections keep reading the previous file.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        *,
+        size: int = DEFAULT_POOL_SIZE,
+        immutable: bool = True,
+        mmap_size: int | None = None,
+        timeout: float | None = None,
+    ):
+        if size < 1:
+            raise ValueError("the pool needs at least one connection")
+        self.db_path = db_path
+        self.size = size
+        self.immutable = immutable
+        self.timeout = timeout
+        if mmap_size is None:
+            # the whole file is mapped, reads do not copy pages
+            mmap_size = min(db_path.stat().st_size, MAX_MMAP_SIZE)
+        self.mmap_size = mmap_size
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        params = "mode=ro&immutable=1" if self.immutable else "mode=ro"
+        con = sqlite3.connect(
+            f"{self.db_path.resolve().as_uri()}?{params}",
+            uri=True,
+            # connections are used by one thread at a time
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        con.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        return con
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"the pool of {self.db_path} is closed")
+            if len(self._connections) < self.size:
+                con = self._connect()
+                self._connections.append(con)
+                return con
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty as e:
+            raise TimeoutError(
+                f"no connection to {self.db_path} became available"
+            ) from e
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        con = self._acquire()
+        try:
+            yield con
+        finally:
+            self._idle.put(con)
+
+    def close(self):
+        """Closes all connections, they must not be in use anymore"""
+        with self._lock:
+            self._closed = True
+            for con in self._connections:
+                con.close()
+            self._connections.clear()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+
+class Row(Mapping):
+    """
+    A row of a dataset. It maps the column names to their values, the json
+    document of the rest column is decoded on first access of `document`.
+    """
+
+    __slots__ = ("_columns", "_values", "_decoder", "_document")
+
+    def __init__(
+        self, columns: dict[str, int], values: tuple, decoder: JsonDecoder
+    ):
+        self._columns = columns
+        self._values = values
+        self._decoder = decoder
+        self._document = None
+
+    def __getitem__(self, column: str) -> Any:
+        return self._values[self._columns[column]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def __repr__(self) -> str:
+        return f"Row({dict(self)!r})"
+
+    @property
+    def id(self) -> int:
+        return self["id"]
+
+    @property
+    def document(self) -> Any:
+        if self._document is None:
+            self._document = self._decoder.loads(self["rest"])
+        return self._document
+
+    def get_path(self, path: str) -> Any:
+        """
+        Returns the value of a path like 'casting_time.unit' or
+        '$.components[0]', the same paths `find_path` accepts
+        """
+        value = self.document
+        for key in split_json_path(path):
+            if isinstance(key, int):
+                if not isinstance(value, list) or key >= len(value):
+                    return None
+                value = value[key]
+            elif isinstance(value, dict):
+                value = value.get(key)
+            else:
+                return None
+        return value
+
+
+class DatasetReader:
+    """Lookups in the table of a dataset"""
+
+    def __init__(
+        self,
+        name: str,
+        dataset: dict,
+        pool: ConnectionPool,
+        decoder: JsonDecoder,
+    ):
+        self.name = name
+        self.dataset = dataset
+        self._pool = pool
+        self._decoder = decoder
+        self.column_names = [column["name"] for column in dataset["columns"]]
+        self._columns = {
+            name: idx for idx, name in enumerate(self.column_names)
+        }
+        rest = (
+            "json(rest)"
+            if dataset.get("rest_format") == RestFormat.JSONB
+            else "rest"
+        )
+        self._select = (
+            f"SELECT {", ".join(self.column_names[:-1] + [rest])} FROM {name}"
+        )
+        # the same lookup always has the same sql text, so its prepared
+        # statement is found in the statement cache of the connection
+        self._queries: dict[tuple, str] = {}
+
+    def _get_query(self, kind: str, term: str = "") -> str:
+        query = self._queries.get((kind, term))
+        if query is not None:
+            return query
+        if kind == "id":
+            query = f"{self._select} WHERE id = ?"
+        elif kind == "column":
+            if term not in self._columns:
+                raise ValueError(f"{self.name} has no column '{term}'")
+            query = f"{self._select} WHERE {term} = ? ORDER BY id LIMIT ?"
+        elif kind == "path":
+            # the same expression as a path index, so sqlite can use it
+            json_path = to_json_path(term).replace("'", "''")
+            query = (
+                f"{self._select} WHERE json_extract(rest, '{json_path}') = ? "
+                "ORDER BY id LIMIT ?"
+            )
+        else:
+            fts_table = self.dataset["fts"]["table"]
+            query = (
+                f"{self._select} WHERE id IN (SELECT rowid FROM {fts_table} "
+                f"WHERE {fts_table} MATCH ? ORDER BY rank LIMIT ?)"
+            )
+        self._queries[(kind, term)] = query
+        return query
+
+    def _fetch(self, query: str, params: tuple) -> list[Row]:
+        with self._pool.connection() as con:
+            rows = con.execute(query, params).fetchall()
+        return [Row(self._columns, values, self._decoder) for values in rows]
+
+    def get(self, row_id: int) -> Row | None:
+        rows = self._fetch(self._get_query("id"), (row_id,))
+        return rows[0] if rows else None
+
+    def find(
+        self, column: str, value: Any, limit: int = DEFAULT_LIMIT
+    ) -> list[Row]:
+        """Returns the first rows whose column has the value in id order"""
+        return self._fetch(self._get_query("column", column), (value, limit))
+
+    def find_path(
+        self, path: str, value: Any, limit: int = DEFAULT_LIMIT
+    ) -> list[Row]:
+        """
+        Returns the first rows whose json document has the value at a path
+        like 'casting_time.unit'. It uses an index of the manifest over the path
+        and scans the table otherwise.
+        """
+        return self._fetch(self._get_query("path", path), (value, limit))
+
+    def search(self, text: str, limit: int = DEFAULT_LIMIT) -> list[Row]:
+        """Returns the best matches of a full text search query"""
+        if not self.dataset.get("fts"):
+            raise ValueError(f"{self.name} has no full text search table")
+        return self._fetch(self._get_query("fts"), (text, limit))
+
+    def count(self) -> int:
+        with self._pool.connection() as con:
+            (count,) = con.execute(
+                f"SELECT COUNT(*) FROM {self.name}"
+            ).fetchone()
+        return count
+
+
+class ReleaseReader:
+    """
+    Opens the datasets of a release directory. Datasets of the single
+    layout share the pool of release.sqlite. The reader can be used by any
+    number of threads and should be closed once they are done.
+    """
+
+    def __init__(
+        self,
+        release_path: Path,
+        *,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        immutable: bool = True,
+        mmap_size: int | None = None,
+        json_backend: JsonBackend = JsonBackend.STDLIB,
+    ):
+        self.release_path = Path(release_path)
+        self.manifest = load_release_manifest(self.release_path)
+        decoder = get_decoder(json_backend)
+        self._pools: dict[Path, ConnectionPool] = {}
+        self._datasets: dict[str, DatasetReader] = {}
+        for name, dataset in self.manifest["datasets"].items():
+            db_path = get_database_path(self.release_path, self.manifest, name)
+            if db_path not in self._pools:
+                self._pools[db_path] = ConnectionPool(
+                    db_path,
+                    size=pool_size,
+                    immutable=immutable,
+                    mmap_size=mmap_size,
+                )
+            self._datasets[name] = DatasetReader(
+                name, dataset, self._pools[db_path], decoder
+            )
+
+    def __enter__(self) -> "ReleaseReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, name: str) -> DatasetReader:
+        try:
+            return self._datasets[name]
+        except KeyError:
+            raise KeyError(f"the release has no dataset '{name}'") from None
+
+    def get_dataset_names(self) -> list[str]:
+        return list(self._datasets)
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.close()
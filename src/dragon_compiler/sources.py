@@ -0,0 +1,135 @@
+"""
+This module reads the json documents of a dataset source folder. A source
+file either contains a single json object, a json array of objects or one
+json object per line (json lines). Files can be gzip or zstd compressed.
+"""
+
+from collections.abc import Iterator
+import gzip
+import os
+import re
+from pathlib import Path
+from typing import BinaryIO
+
+JSON_SUFFIXES = (".json",)
+JSON_LINES_SUFFIXES = (".jsonl", ".ndjson")
+COMPRESSION_SUFFIXES = (".gz", ".zst")
+
+READ_CHUNK_SIZE = 1 << 16
+
+# characters that change the nesting inside of a json array
+_STRUCTURE_PATTERN = re.compile(rb'[\[\]{},"]')
+# the remainder of a json string literal after the opening quote
+_STRING_END_PATTERN = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"')
+_WHITESPACE = b" \t\n\r"
+
+
+class SourceFormatError(ValueError):
+    """Raised if a source file does not contain valid json documents"""
+
+
+def _split_suffixes(path: Path | str) -> tuple[str, str]:
+    """Returns the document suffix and the compression suffix of a file"""
+    # os.path is much faster than pathlib for the names of a folder scan
+    stem, suffix = os.path.splitext(os.path.basename(path))
+    suffix = suffix.lower()
+    if suffix in COMPRESSION_SUFFIXES:
+        return os.path.splitext(stem)[1].lower(), suffix
+    return suffix, ""
+
+
+def is_source_file(path: Path | str) -> bool:
+    suffix, _ = _split_suffixes(path)
+    return suffix in JSON_SUFFIXES + JSON_LINES_SUFFIXES
+
+
+def is_json_lines_file(path: Path) -> bool:
+    suffix, _ = _split_suffixes(path)
+    return suffix in JSON_LINES_SUFFIXES
+
+
+def open_source_file(path: Path) -> BinaryIO:
+    _, compression = _split_suffixes(path)
+    if compression == ".gz":
+        return gzip.open(path, "rb")
+    if compression == ".zst":
+        try:
+            # pylint: disable-next=import-outside-toplevel
+            from compression import zstd
+        except ImportError as e:
+            raise SourceFormatError(
+                f"{path}: zstd compressed sources require python 3.14"
+            ) from e
+        return zstd.open(path, "rb")
+    return path.open("rb")
+
+
+def iter_records(path: Path) -> Iterator[bytes]:
+    """
+    Yields the raw text of every json document in a source file. Only one
+    document is held in memory at a time, so bundles of any size can be
+    read.
+    """
+    with open_source_file(path) as f:
+        if is_json_lines_file(path):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+            return
+
+        data = f.read(READ_CHUNK_SIZE)
+        first_char = data.lstrip(_WHITESPACE)[:1]
+        if first_char == b"[":
+            yield from _iter_array_elements(path, f, data)
+        else:
+            yield data + f.read()
+
+
+def _iter_array_elements(
+    path: Path, f: BinaryIO, data: bytes
+) -> Iterator[bytes]:
+    """Splits a json array into its elements without decoding them"""
+    buffer = bytearray(data)
+    pos = buffer.index(b"[") + 1
+    element_start = pos
+    depth = 0
+    is_eof = False
+
+    while True:
+        match = _STRUCTURE_PATTERN.search(buffer, pos)
+        if match and match.group() == b'"':
+            string_end = _STRING_END_PATTERN.match(buffer, match.end())
+            if string_end:
+                pos = string_end.end()
+                continue
+            match = None
+
+        if match is None:
+            if is_eof:
+                raise SourceFormatError(f"{path}: json array is not closed")
+            # drop everything before the current element and read more
+            del buffer[:element_start]
+            pos -= element_start
+            element_start = 0
+            chunk = f.read(READ_CHUNK_SIZE)
+            is_eof = not chunk
+            buffer += chunk
+            continue
+
+        char = match.group()
+        pos = match.end()
+        if char in (b"{", b"["):
+            depth += 1
+        elif char in (b"}", b"]") and depth > 0:
+            depth -= 1
+        elif depth == 0:
+            # a comma or the closing bracket of the array
+            element = bytes(buffer[element_start : match.start()]).strip()
+            if element:
+                yield element
+            elif char == b",":
+                raise SourceFormatError(f"{path}: empty json array element")
+            if char == b"]":
+                return
+            element_start = pos
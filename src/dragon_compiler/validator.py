@@ -0,0 +1,330 @@
+"""
+This module validates a release directory against its manifest. Every
+dataset is checked for the integrity of its database, its schema, its
+indexes, its row count and the json documents in its rest column.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from enum import StrEnum
+import json
+import logging
+import random
+import sqlite3
+from pathlib import Path
+from dragon_compiler.builder import get_index_name
+from dragon_compiler.decoders import RestFormat
+from dragon_compiler.manifest import get_database_path
+from dragon_compiler.discovery import SourceDiscovery
+from dragon_compiler.sources import iter_records
+
+
+class IntegrityCheck(StrEnum):
+    """Which sqlite consistency check is run on every database"""
+
+    QUICK = "quick"
+    FULL = "full"
+    OFF = "off"
+
+
+@dataclass
+class ValidatorConfig:
+    release_path: Path
+    # source folder with the manifest.json the release was compiled from,
+    # enables the comparison of row counts and source documents
+    source_folder: Path | None = None
+    jobs: int = 1
+    integrity_check: IntegrityCheck = IntegrityCheck.QUICK
+    # check the json of this many random rows instead of all rows
+    sample_size: int | None = None
+    seed: int = 0
+
+
+@dataclass
+class CheckResult:
+    """Outcome of a single check of a dataset"""
+
+    dataset: str
+    check: str
+    passed: bool
+    message: str = ""
+
+
+@dataclass
+class ValidationReport:
+    """Results of all checks of a release"""
+
+    release_path: str
+    results: list[CheckResult] = field(default_factory=list)
+
+    def is_valid(self) -> bool:
+        return all(result.passed for result in self.results)
+
+    def get_failures(self) -> list[CheckResult]:
+        return [result for result in self.results if not result.passed]
+
+    def to_dict(self) -> dict:
+        return {
+            "release_path": self.release_path,
+            "valid": self.is_valid(),
+            "results": [asdict(result) for result in self.results],
+        }
+
+
+class Validator:
+    """This class validates a compiled release"""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def validate(self, config: ValidatorConfig) -> ValidationReport:
+        report = ValidationReport(str(config.release_path))
+        manifest_path = config.release_path / "manifest.json"
+        try:
+            with manifest_path.open("r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            report.results.append(
+                CheckResult("release", "manifest", False, str(e))
+            )
+            return report
+        report.results.append(CheckResult("release", "manifest", True))
+
+        try:
+            sources = self._get_sources(config)
+        except (OSError, ValueError) as e:
+            report.results.append(
+                CheckResult("source", "manifest", False, str(e))
+            )
+            return report
+        datasets = list(manifest["datasets"].items())
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(config.jobs, len(datasets))),
+            thread_name_prefix="validate",
+        ) as pool:
+            all_results = pool.map(
+                lambda item: self._validate_dataset(
+                    config,
+                    manifest,
+                    item[0],
+                    item[1],
+                    source=sources.get(item[0]),
+                ),
+                datasets,
+            )
+            for results in all_results:
+                report.results.extend(results)
+        return report
+
+    def _get_sources(
+        self, config: ValidatorConfig
+    ) -> dict[str, tuple[Path, SourceDiscovery]]:
+        """
+        Returns the source folder and discovery of every dataset of the
+        source manifest, raises a ValueError if the manifest is invalid.
+        """
+        if config.source_folder is None:
+            return {}
+        manifest_path = config.source_folder / "manifest.json"
+        with manifest_path.open("r", encoding="utf-8") as f:
+            source_manifest = json.load(f)
+        try:
+            return {
+                dataset["name"]: (
+                    config.source_folder / dataset["source"],
+                    SourceDiscovery.from_manifest(dataset),
+                )
+                for dataset in source_manifest["datasets"]
+            }
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"{manifest_path} is invalid: {e!r}") from e
+
+    def _validate_dataset(
+        self,
+        config: ValidatorConfig,
+        manifest: dict,
+        name: str,
+        dataset: dict,
+        *,
+        source: tuple[Path, SourceDiscovery] | None,
+    ) -> list[CheckResult]:
+        self.logger.info("validate %s", name)
+        db_path = get_database_path(config.release_path, manifest, name)
+        if not db_path.is_file():
+            return [CheckResult(name, "database", False, f"{db_path} missing")]
+
+        con = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            results = [CheckResult(name, "database", True)]
+            if config.integrity_check != IntegrityCheck.OFF:
+                results.append(
+                    self._check_integrity(con, name, config.integrity_check)
+                )
+            schema_result = self._check_schema(con, name, dataset)
+            results.append(schema_result)
+            if not schema_result.passed:
+                return results
+            results.append(self._check_indexes(con, name, dataset))
+            results.append(self._check_row_count(con, name, dataset, source))
+            results.append(self._check_json(con, name, dataset, config))
+            return results
+        except sqlite3.DatabaseError as e:
+            return [CheckResult(name, "database", False, str(e))]
+        finally:
+            con.close()
+
+    def _check_integrity(
+        self, con: sqlite3.Connection, name: str, mode: IntegrityCheck
+    ) -> CheckResult:
+        pragma = (
+            "integrity_check" if mode == IntegrityCheck.FULL else "quick_check"
+        )
+        # the report of a single table is enough in a consolidated release
+        problems = [
+            row[0] for row in con.execute(f"PRAGMA {pragma}({name})").fetchall()
+        ]
+        if problems == ["ok"]:
+            return CheckResult(name, pragma, True)
+        return CheckResult(name, pragma, False, "; ".join(problems[:10]))
+
+    def _check_schema(
+        self, con: sqlite3.Connection, name: str, dataset: dict
+    ) -> CheckResult:
+        # table_xinfo also lists generated columns
+        actual = [
+            (row[1], row[2].upper())
+            for row in con.execute(f"PRAGMA table_xinfo({name})")
+        ]
+        expected = [
+            (column["name"], column["type"].upper())
+            for column in dataset["columns"]
+        ]
+        if not actual:
+            return CheckResult(name, "schema", False, "table is missing")
+        if actual != expected:
+            return CheckResult(
+                name,
+                "schema",
+                False,
+                f"expected columns {expected} but found {actual}",
+            )
+        return CheckResult(name, "schema", True)
+
+    def _check_indexes(
+        self, con: sqlite3.Connection, name: str, dataset: dict
+    ) -> CheckResult:
+        expected = {
+            get_index_name(name, idx, index)
+            for idx, index in enumerate(dataset.get("indexes", []))
+        }
+        tables = set()
+        if "fts" in dataset:
+            tables.add(dataset["fts"]["table"])
+        existing = {
+            row[0]
+            for row in con.execute(
+                "SELECT name FROM sqlite_schema WHERE type IN "
+                "('index', 'table')"
+            )
+        }
+        missing = sorted((expected | tables) - existing)
+        if missing:
+            return CheckResult(
+                name, "indexes", False, f"missing {", ".join(missing)}"
+            )
+        return CheckResult(name, "indexes", True)
+
+    def _check_row_count(
+        self,
+        con: sqlite3.Connection,
+        name: str,
+        dataset: dict,
+        source: tuple[Path, SourceDiscovery] | None,
+    ) -> CheckResult:
+        count = con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        expected = {}
+        if "build" in dataset:
+            expected["manifest"] = dataset["build"]["rows"]
+        if source is not None:
+            source_folder, discovery = source
+            expected["source documents"] = sum(
+                1
+                for file in discovery.iter_files(source_folder)
+                for _ in iter_records(file)
+            )
+        mismatches = [
+            f"{count} rows but {value} {origin}"
+            for origin, value in expected.items()
+            if value != count
+        ]
+        if mismatches:
+            return CheckResult(name, "row count", False, ", ".join(mismatches))
+        return CheckResult(name, "row count", True, f"{count} rows")
+
+    def _check_json(
+        self,
+        con: sqlite3.Connection,
+        name: str,
+        dataset: dict,
+        config: ValidatorConfig,
+    ) -> CheckResult:
+        if dataset.get("rest_format") == RestFormat.JSONB:
+            # strictly check the jsonb encoding
+            valid_str = "json_valid(rest, 8)"
+        else:
+            valid_str = "json_valid(rest)"
+
+        if config.sample_size is None:
+            invalid_ids = [
+                row[0]
+                for row in con.execute(
+                    f"SELECT id FROM {name} WHERE NOT {valid_str} LIMIT 10"
+                )
+            ]
+            checked = "all rows"
+        else:
+            invalid_ids, sampled = self._check_json_sample(
+                con, name, valid_str, config
+            )
+            checked = f"{sampled} sampled rows"
+
+        if invalid_ids:
+            return CheckResult(
+                name,
+                "json",
+                False,
+                f"invalid json in rows with id {invalid_ids}",
+            )
+        return CheckResult(name, "json", True, checked)
+
+    def _check_json_sample(
+        self,
+        con: sqlite3.Connection,
+        name: str,
+        valid_str: str,
+        config: ValidatorConfig,
+    ) -> tuple[list[int], int]:
+        """
+        Checks the rows at random positions of the id range. Every sample is
+        a lookup of the primary key, so the table is never scanned.
+        """
+        min_id, max_id = con.execute(
+            f"SELECT MIN(id), MAX(id) FROM {name}"
+        ).fetchone()
+        if min_id is None:
+            return [], 0
+        rng = random.Random(config.seed)
+        sampled_ids = set()
+        invalid_ids = []
+        for _ in range(config.sample_size):
+            row = con.execute(
+                f"SELECT id, {valid_str} FROM {name} WHERE id >= ? "
+                "ORDER BY id LIMIT 1",
+                (rng.randint(min_id, max_id),),
+            ).fetchone()
+            if row[0] in sampled_ids:
+                continue
+            sampled_ids.add(row[0])
+            if not row[1]:
+                invalid_ids.append(row[0])
+        return invalid_ids[:10], len(sampled_ids)
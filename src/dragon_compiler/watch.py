@@ -0,0 +1,151 @@
+"""
+This module keeps the databases of a manifest up to date while its source
+files are edited. The source folders of the datasets are polled, a burst of
+edits is collected until the folders were quiet for a moment, and only the
+rows of the changed files are written to the databases by the builder.
+"""
+
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from pathlib import Path
+from dragon_compiler.builder import Builder
+from dragon_compiler.discovery import SourceDiscovery
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_DEBOUNCE = 0.3
+
+
+@dataclass
+class WatchConfig:
+    # seconds between two scans of the source folders
+    interval: float = DEFAULT_INTERVAL
+    # seconds without further edits before the changes are applied
+    debounce: float = DEFAULT_DEBOUNCE
+
+    def __post_init__(self):
+        if self.interval <= 0 or self.debounce < 0:
+            raise ValueError(
+                "the interval must be positive and the debounce must not be "
+                "negative"
+            )
+
+
+class SourceWatcher:
+    """
+    Polls the source folders of datasets for added, changed and removed
+    files. A scan only lists the folders and compares the modification time
+    and size of the files with the previous scan, it does not read them.
+    """
+
+    def __init__(self, sources: dict[str, tuple[Path, SourceDiscovery]]):
+        self._sources = sources
+        self._snapshots = {name: self._scan(name) for name in sources}
+
+    def _scan(self, name: str) -> dict[str, tuple[int, int]]:
+        source_folder, discovery = self._sources[name]
+        if not source_folder.is_dir():
+            return {}
+        snapshot = {}
+        for rel_path, entry in discovery.iter_entries(source_folder):
+            stat = entry.stat()
+            snapshot[rel_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self) -> dict[str, set[str]]:
+        """
+        Returns the relative paths of the files that were added, changed or
+        removed per dataset since the last poll.
+        """
+        changes = {}
+        for name, previous in self._snapshots.items():
+            try:
+                snapshot = self._scan(name)
+            except OSError:
+                # the folder changed during the scan, the next poll
+                # scans it again
+                continue
+            changed = {
+                rel_path
+                for rel_path, state in snapshot.items()
+                if previous.get(rel_path) != state
+            }
+            changed.update(previous.keys() - snapshot.keys())
+            self._snapshots[name] = snapshot
+            if changed:
+                changes[name] = changed
+        return changes
+
+
+def apply_changes(
+    db_builder: Builder,
+    changes: dict[str, set[str]],
+    logger: logging.Logger,
+) -> dict[str, set[str]]:
+    """
+    Updates the databases of the changed datasets and returns the changes
+    of the datasets whose update failed, e.g. because a file was saved
+    with invalid json.
+    """
+    failed = {}
+    for name, rel_paths in changes.items():
+        try:
+            db_builder.update_dataset(name, rel_paths)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(
+                "%s was not updated, it is updated again with the next "
+                "change of its files: %s",
+                name,
+                e,
+            )
+            failed[name] = rel_paths
+    return failed
+
+
+def watch(
+    db_builder: Builder,
+    config: WatchConfig,
+    logger: logging.Logger,
+    stop: threading.Event,
+):
+    """
+    Builds the datasets of the configured incremental builder and updates
+    them on every change of their source files until `stop` is set.
+    """
+    sources = db_builder.get_dataset_sources()
+    # files that change during the first build are seen by the first poll
+    watcher = SourceWatcher(sources)
+    failed: dict[str, set[str]] = {}
+    try:
+        db_builder.build()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logger.error(
+            "the build failed, datasets are built again with the next "
+            "change of their files: %s",
+            e,
+        )
+        failed = {name: set() for name in sources}
+    logger.info("watching %d datasets for changes", len(sources))
+    pending: dict[str, set[str]] = {}
+    last_change_time = 0.0
+    while not stop.wait(
+        min(config.interval, config.debounce) if pending else config.interval
+    ):
+        changes = watcher.poll()
+        if changes:
+            last_change_time = time.monotonic()
+        for name, rel_paths in changes.items():
+            pending.setdefault(name, set()).update(rel_paths)
+            # failed files are applied again together with the fix
+            pending[name].update(failed.pop(name, set()))
+        if not pending or (
+            time.monotonic() - last_change_time < config.debounce
+        ):
+            continue
+        logger.info(
+            "%d source files changed",
+            sum(len(rel_paths) for rel_paths in pending.values()),
+        )
+        failed.update(apply_changes(db_builder, pending, logger))
+        pending = {}
@@ -0,0 +1,213 @@
+"""Tests for release artifacts"""
+
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+from dragon_compiler import artifact, builder
+
+
+class TestArtifact(unittest.TestCase):
+    """test packaging a release into a compressed artifact"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.temp_path = Path(self.temp_dir.name)
+        self.source_path = self.temp_path / "source"
+        self.release_path = self.temp_path / "release"
+        self.manifest = {
+            "database_info": {"name": "test", "version": "0.1.0"},
+            "datasets": [
+                {
+                    "name": "spells",
+                    "source": "spells",
+                    "columns": [{"name": "name", "type": "TEXT"}],
+                    "fts": {"columns": ["name"]},
+                },
+            ],
+        }
+        (self.source_path / "spells").mkdir(parents=True)
+        for idx in range(50):
+            path = self.source_path / "spells" / f"spell{idx:02d}.json"
+            with path.open("w", encoding="utf-8") as f:
+                json.dump({"name": f"Spell {idx}", "level": idx % 9}, f)
+        self.logger = logging.getLogger("test_artifact")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def release(self, **config_options) -> dict:
+        test_builder = builder.Builder(logger=self.logger)
+        test_builder.set_config(
+            builder.BuilderConfig(
+                self.source_path,
+                self.release_path,
+                None,
+                db_manifest=self.manifest,
+                **config_options,
+            )
+        )
+        test_builder.build()
+        test_builder.package_release(datetime.now(timezone.utc))
+        if config_options.get("atomic"):
+            test_builder.remove_stale_files()
+        with (self.release_path / "manifest.json").open(
+            "r", encoding="utf-8"
+        ) as f:
+            return json.load(f)
+
+    def get_page_size(self, db_path: Path) -> int:
+        con = sqlite3.connect(db_path)
+        try:
+            return con.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            con.close()
+
+    def test_gzip_artifact(self):
+        manifest = self.release(
+            artifact=artifact.ArtifactConfig(
+                artifact.Compression.GZIP, threads=2
+            )
+        )
+
+        info = manifest["artifact"]
+        artifact_path = self.release_path / "release.tar.gz"
+        self.assertEqual("release.tar.gz", info["file"])
+        self.assertEqual("gzip", info["compression"])
+        data = artifact_path.read_bytes()
+        self.assertEqual(len(data), info["size"])
+        self.assertEqual(hashlib.sha256(data).hexdigest(), info["sha256"])
+        archive = gzip.decompress(data)
+        self.assertEqual(len(archive), info["uncompressed_size"])
+        self.assertEqual(
+            hashlib.sha256(archive).hexdigest(), info["uncompressed_sha256"]
+        )
+        with tarfile.open(artifact_path, "r:gz") as tar:
+            self.assertListEqual(
+                ["spells.sqlite", "manifest.json"], tar.getnames()
+            )
+            for name, file_info in info["files"].items():
+                content = tar.extractfile(name).read()
+                self.assertEqual(file_info["size"], len(content))
+                self.assertEqual(
+                    file_info["sha256"], hashlib.sha256(content).hexdigest()
+                )
+                if name != "manifest.json":
+                    self.assertEqual(
+                        content, (self.release_path / name).read_bytes()
+                    )
+            archived_manifest = json.load(tar.extractfile("manifest.json"))
+        self.assertNotIn("artifact", archived_manifest)
+        self.assertEqual(
+            artifact.DEFAULT_PAGE_SIZE,
+            self.get_page_size(self.release_path / "spells.sqlite"),
+        )
+
+    def test_single_layout_artifact(self):
+        manifest = self.release(
+            layout=builder.ReleaseLayout.SINGLE,
+            artifact=artifact.ArtifactConfig(artifact.Compression.GZIP),
+        )
+
+        self.assertListEqual(
+            ["release.sqlite", "manifest.json"],
+            list(manifest["artifact"]["files"]),
+        )
+
+    def test_artifact_is_removed_without_compression(self):
+        self.release(
+            atomic=True,
+            artifact=artifact.ArtifactConfig(artifact.Compression.GZIP),
+        )
+        self.assertTrue((self.release_path / "release.tar.gz").exists())
+        manifest = self.release(atomic=True)
+
+        self.assertNotIn("artifact", manifest)
+        self.assertFalse((self.release_path / "release.tar.gz").exists())
+
+    @unittest.skipUnless(
+        artifact.is_compression_available(artifact.Compression.ZSTD),
+        "zstd requires python 3.14",
+    )
+    def test_zstd_artifact(self):
+        # pylint: disable-next=import-outside-toplevel
+        from compression import zstd
+
+        manifest = self.release(
+            artifact=artifact.ArtifactConfig(
+                artifact.Compression.ZSTD, threads=2
+            )
+        )
+
+        artifact_path = self.release_path / "release.tar.zst"
+        self.assertEqual("release.tar.zst", manifest["artifact"]["file"])
+        with zstd.ZstdFile(artifact_path) as f:
+            with tarfile.open(fileobj=f, mode="r|") as tar:
+                self.assertListEqual(
+                    ["spells.sqlite", "manifest.json"],
+                    [member.name for member in tar],
+                )
+
+    def test_parallel_gzip_writer(self):
+        data = os.urandom(10_000) + bytes(50_000) + os.urandom(5_000)
+        output = io.BytesIO()
+
+        with artifact.ParallelGzipWriter(
+            output, threads=3, block_size=4096
+        ) as writer:
+            for start in range(0, len(data), 1000):
+                writer.write(data[start : start + 1000])
+
+        self.assertEqual(data, gzip.decompress(output.getvalue()))
+
+    def test_optimize_database(self):
+        db_path = self.temp_path / "test.sqlite"
+        con = sqlite3.connect(db_path)
+        with con:
+            con.execute("CREATE TABLE test (value TEXT)")
+            con.executemany(
+                "INSERT INTO test VALUES (?)",
+                [("x" * 100,) for _ in range(1000)],
+            )
+            con.execute("DELETE FROM test WHERE rowid % 2 = 0")
+        con.close()
+        link_path = self.temp_path / "link.sqlite"
+        os.link(db_path, link_path)
+        link_content = link_path.read_bytes()
+
+        self.assertTrue(artifact.optimize_database(db_path, 16384))
+        self.assertFalse(artifact.optimize_database(db_path, 16384))
+
+        self.assertEqual(16384, self.get_page_size(db_path))
+        self.assertEqual(link_content, link_path.read_bytes())
+        con = sqlite3.connect(db_path)
+        try:
+            self.assertEqual(
+                500, con.execute("SELECT COUNT(*) FROM test").fetchone()[0]
+            )
+            self.assertEqual(
+                0, con.execute("PRAGMA freelist_count").fetchone()[0]
+            )
+        finally:
+            con.close()
+
+    def test_invalid_page_size(self):
+        for page_size in (1000, 256, 131072):
+            with self.assertRaises(ValueError):
+                artifact.ArtifactConfig(
+                    artifact.Compression.GZIP, page_size=page_size
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
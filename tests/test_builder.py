@@ -3,6 +3,7 @@
 import unittest
 from unittest.mock import patch, call, MagicMock, mock_open, ANY
 import json
+import sqlite3
 import tempfile
 from importlib.metadata import version
 from datetime import datetime, timezone
@@ -70,7 +71,7 @@ class TestSQLiteBuilderWithMockDB(unittest.TestCase):
             addtional_columns += ", "
         return call(
             f"CREATE TABLE {table_name} ("
-            + f"id INTEGER, {addtional_columns}rest TEXT)"
+            + f"id INTEGER PRIMARY KEY, {addtional_columns}rest TEXT)"
         )
 
     def get_db_manifest_for_DnDCombatTracker(
@@ -95,6 +96,85 @@ class TestSQLiteBuilderWithMockDB(unittest.TestCase):
             ],
         }
 
+    def get_spells_manifest(self, **dataset_options) -> dict:
+        """Returns a manifest with the spells folder as its only dataset"""
+        return {
+            "datasets": [
+                {
+                    "name": "spells",
+                    "source": "spells",
+                    "columns": [{"name": "name", "type": "TEXT"}],
+                    **dataset_options,
+                }
+            ]
+        }
+
+    def create_builder(
+        self, out_path: Path, db_manifest: dict | None = None, **config_options
+    ) -> builder.Builder:
+        """
+        Returns a builder of the datasets of the manifest, or of the spells
+        folder without a manifest
+        """
+        test_builder = builder.Builder(logger=self.fake_logger)
+        if db_manifest is None:
+            config = builder.BuilderConfig(
+                self.data_dir["spells"], out_path, "spells", **config_options
+            )
+        else:
+            config = builder.BuilderConfig(
+                self.db_dir,
+                out_path,
+                None,
+                db_manifest=db_manifest,
+                **config_options,
+            )
+        test_builder.set_config(config)
+        return test_builder
+
+    def build_spells(
+        self, db_manifest: dict | None = None, **config_options
+    ) -> Path:
+        """Builds the spells and returns their database file"""
+        out_path = self.db_dir / "build"
+        self.create_builder(out_path, db_manifest, **config_options).build()
+        return out_path / "spells.sqlite"
+
+    def release(
+        self,
+        name: str = "release",
+        db_manifest: dict | None = None,
+        **config_options,
+    ) -> Path:
+        """Builds and packages a release, by default of both datasets"""
+        out_path = self.db_dir / name
+        test_builder = self.create_builder(
+            out_path,
+            db_manifest or self.get_db_manifest_for_DnDCombatTracker(),
+            **config_options,
+        )
+        test_builder.build()
+        test_builder.package_release(datetime.now(timezone.utc))
+        return out_path
+
+    def load_manifest(self, out_path: Path) -> dict:
+        with (out_path / "manifest.json").open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_spell(self, file_name: str, name: str, **fields):
+        path = self.data_dir["spells"] / file_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump({"name": name, **fields}, f)
+
+    def read_rows(self, db_path: Path, columns: str = "id, name") -> list:
+        con = sqlite3.connect(db_path)
+        rows = con.execute(
+            f"SELECT {columns} FROM spells ORDER BY id"
+        ).fetchall()
+        con.close()
+        return rows
+
 
 class TestBuilderBuild(TestSQLiteBuilderWithMockDB):
     """test build functionality"""
@@ -120,14 +200,12 @@ class TestBuilderBuild(TestSQLiteBuilderWithMockDB):
 
         mock_out_path.mkdir.assert_called_once_with(parents=True, exist_ok=True)
         mock_connect.assert_called_once()
-        mock_cursor.execute.assert_has_calls(
-            [
-                self.get_table_creation_call("spells"),
-                call(
-                    "INSERT INTO spells VALUES(?, ?)",
-                    (0, json.dumps(self.data["spells"], ensure_ascii=False)),
-                ),
-            ]
+        mock_cursor.execute.assert_called_once_with(
+            *self.get_table_creation_call("spells").args
+        )
+        mock_cursor.executemany.assert_called_once_with(
+            "INSERT INTO spells VALUES(?, ?)",
+            ((0, json.dumps(self.data["spells"], ensure_ascii=False)),),
         )
 
         # Assert commit and close are called
@@ -155,14 +233,12 @@ class TestBuilderBuild(TestSQLiteBuilderWithMockDB):
 
         mock_out_path.mkdir.assert_called_once_with(parents=True, exist_ok=True)
         mock_connect.assert_called_once()
-        mock_cursor.execute.assert_has_calls(
-            [
-                self.get_table_creation_call("monsters"),
-                call(
-                    "INSERT INTO monsters VALUES(?, ?)",
-                    (0, json.dumps(self.data["monsters"], ensure_ascii=False)),
-                ),
-            ]
+        mock_cursor.execute.assert_called_once_with(
+            *self.get_table_creation_call("monsters").args
+        )
+        mock_cursor.executemany.assert_called_once_with(
+            "INSERT INTO monsters VALUES(?, ?)",
+            ((0, json.dumps(self.data["monsters"], ensure_ascii=False)),),
         )
 
         # Assert commit and close are called
@@ -199,27 +275,37 @@ class TestBuilderBuild(TestSQLiteBuilderWithMockDB):
         self.assertEqual(2, mock_connect.call_count)
 
         self.assertListEqual(
-            mock_cursor.execute.mock_calls,
+            mock_cursor.mock_calls,
             [
-                self.get_table_creation_call(
-                    "spells", "name TEXT, level INTEGER"
+                call.execute(
+                    *self.get_table_creation_call(
+                        "spells", "name TEXT, level INTEGER"
+                    ).args
                 ),
-                call(
+                call.executemany(
                     "INSERT INTO spells VALUES(?, ?, ?, ?)",
                     (
-                        0,
-                        "Magic Missile",
-                        1,
-                        json.dumps(self.data["spells"], ensure_ascii=False),
+                        (
+                            0,
+                            "Magic Missile",
+                            1,
+                            json.dumps(self.data["spells"], ensure_ascii=False),
+                        ),
                     ),
                 ),
-                self.get_table_creation_call("monsters", "name TEXT"),
-                call(
+                call.execute(
+                    *self.get_table_creation_call("monsters", "name TEXT").args
+                ),
+                call.executemany(
                     "INSERT INTO monsters VALUES(?, ?, ?)",
                     (
-                        0,
-                        "Owlbear",
-                        json.dumps(self.data["monsters"], ensure_ascii=False),
+                        (
+                            0,
+                            "Owlbear",
+                            json.dumps(
+                                self.data["monsters"], ensure_ascii=False
+                            ),
+                        ),
                     ),
                 ),
             ],
@@ -253,14 +339,18 @@ class TestBuilderRelease(TestSQLiteBuilderWithMockDB):
                         {"name": "name", "type": "TEXT"},
                         {"name": "level", "type": "INTEGER"},
                         {"name": "rest", "type": "TEXT"},
-                    ]
+                    ],
+                    "rest_format": "text",
+                    "key": ["name", "level", "rest"],
                 },
                 "monsters": {
                     "columns": [
                         {"name": "id", "type": "INTEGER"},
                         {"name": "name", "type": "TEXT"},
                         {"name": "rest", "type": "TEXT"},
-                    ]
+                    ],
+                    "rest_format": "text",
+                    "key": ["name", "rest"],
                 },
             },
             "build_time": build_time,
@@ -285,3 +375,952 @@ class TestBuilderRelease(TestSQLiteBuilderWithMockDB):
         self.assertDictEqual(act_manifest, exp_manifest)
 
         mock_dump.assert_called_once_with(exp_manifest, ANY, indent=2)
+
+
+class TestBuilderBulkInsert(TestSQLiteBuilderWithMockDB):
+    """test batched inserts against a real sqlite database"""
+
+    def add_spells(self, count: int):
+        for idx in range(count):
+            self.write_spell(f"spell_{idx}.json", f"spell {idx}")
+
+    def test_rows_are_split_into_batches(self):
+        self.add_spells(4)
+
+        db_path = self.build_spells(batch_size=2)
+
+        con = sqlite3.connect(db_path)
+        count = con.execute("SELECT COUNT(*) FROM spells").fetchone()[0]
+        ids = [r[0] for r in con.execute("SELECT id FROM spells ORDER BY id")]
+        con.close()
+        self.assertEqual(5, count)
+        self.assertListEqual([0, 1, 2, 3, 4], ids)
+
+    def test_build_pragmas_are_restored(self):
+        for profile in builder.PragmaProfile:
+            with self.subTest(profile=profile):
+                db_path = self.build_spells(pragma_profile=profile)
+
+                con = sqlite3.connect(db_path)
+                journal_mode = con.execute("PRAGMA journal_mode").fetchone()
+                con.close()
+                db_path.unlink()
+                self.assertEqual("delete", journal_mode[0])
+
+    def test_build_pragmas_are_applied_during_build(self):
+        mock_conn = MagicMock()
+        mock_conn.execute.return_value.fetchone.return_value = ("delete",)
+        test_builder = builder.Builder(logger=self.fake_logger)
+        test_builder.set_config(
+            builder.BuilderConfig(
+                self.data_dir["spells"],
+                MagicMock(),
+                "spells",
+                pragma_profile=builder.PragmaProfile.UNSAFE,
+            )
+        )
+
+        with patch(
+            "dragon_compiler.builder.sqlite3.connect", return_value=mock_conn
+        ):
+            test_builder.build()
+
+        executed = [c.args[0] for c in mock_conn.execute.call_args_list]
+        self.assertIn("PRAGMA journal_mode = OFF", executed)
+        self.assertIn("PRAGMA synchronous = OFF", executed)
+        self.assertIn("PRAGMA locking_mode = EXCLUSIVE", executed)
+        self.assertIn("BEGIN", executed)
+        self.assertEqual("PRAGMA journal_mode = delete", executed[-1])
+
+    def test_parallel_build_is_deterministic(self):
+        self.add_spells(150)
+
+        serial_db_path = self.build_spells()
+        serial_db = serial_db_path.read_bytes()
+        serial_db_path.unlink()
+        for jobs in (2, 3):
+            with self.subTest(jobs=jobs):
+                parallel_db_path = self.build_spells(jobs=jobs)
+                parallel_db = parallel_db_path.read_bytes()
+                parallel_db_path.unlink()
+                self.assertEqual(serial_db, parallel_db)
+
+
+class TestBuilderConcurrentRelease(TestSQLiteBuilderWithMockDB):
+    """test release of several datasets at once"""
+
+    def test_datasets_are_built_concurrently(self):
+        out_path = self.release(jobs=2)
+
+        manifest = self.load_manifest(out_path)
+        for name, exp_name in (
+            ("spells", "Magic Missile"),
+            ("monsters", "Owlbear"),
+        ):
+            with self.subTest(dataset=name):
+                con = sqlite3.connect(out_path / f"{name}.sqlite")
+                rows = con.execute(f"SELECT id, name FROM {name}").fetchall()
+                con.close()
+                self.assertListEqual([(0, exp_name)], rows)
+
+                build_info = manifest["datasets"][name]["build"]
+                self.assertEqual(1, build_info["rows"])
+                self.assertGreaterEqual(build_info["seconds"], 0)
+
+
+class TestBuilderConsolidatedRelease(TestSQLiteBuilderWithMockDB):
+    """test releases with all datasets in a single database"""
+
+    def test_datasets_are_tables_of_one_database(self):
+        for atomic in (False, True):
+            with self.subTest(atomic=atomic):
+                out_path = self.release(
+                    layout=builder.ReleaseLayout.SINGLE, atomic=atomic, jobs=2
+                )
+
+                self.assertListEqual(
+                    ["manifest.json", "release.sqlite"],
+                    sorted(p.name for p in out_path.iterdir()),
+                )
+                manifest = self.load_manifest(out_path)
+                con = sqlite3.connect(out_path / "release.sqlite")
+                rows = con.execute(
+                    "SELECT spells.name, monsters.name FROM spells "
+                    "JOIN monsters ON monsters.id = spells.id"
+                ).fetchall()
+                stored_manifest = con.execute(
+                    "SELECT value FROM dragon_metadata WHERE key = 'manifest'"
+                ).fetchone()[0]
+                con.close()
+                self.assertListEqual([("Magic Missile", "Owlbear")], rows)
+                self.assertEqual("release.sqlite", manifest["database_file"])
+                self.assertEqual(
+                    1, manifest["datasets"]["spells"]["build"]["rows"]
+                )
+                self.assertDictEqual(manifest, json.loads(stored_manifest))
+
+    def test_incremental_builds_are_not_supported(self):
+        with self.assertRaises(ValueError):
+            self.release(layout=builder.ReleaseLayout.SINGLE, incremental=True)
+
+
+class TestBuilderProfile(TestSQLiteBuilderWithMockDB):
+    """test the stage timings of a profiled build"""
+
+    def test_release_manifest_contains_profile(self):
+        manifest = self.load_manifest(self.release(profile=True))
+
+        build_info = manifest["datasets"]["spells"]["build"]
+        self.assertLessEqual(
+            {"discover", "read", "decode", "build_row", "insert", "commit"},
+            build_info["stages"].keys(),
+        )
+        self.assertEqual(1, build_info["counters"]["files"])
+        self.assertEqual(1, build_info["counters"]["rows"])
+        self.assertEqual(
+            self.json_path["spells"].stat().st_size,
+            build_info["counters"]["bytes_read"],
+        )
+        profile = manifest["build_profile"]
+        self.assertEqual(2, profile["counters"]["rows"])
+        self.assertEqual(2, profile["stages"]["insert"]["calls"])
+        self.assertIn("package", profile["stages"])
+
+    def test_parallel_build_measures_worker_results(self):
+        test_builder = self.create_builder(
+            self.db_dir / "build", jobs=2, profile=True
+        )
+
+        test_builder.build()
+
+        profiler = test_builder.get_profiler()
+        self.assertIn("parse_wait", profiler.stages)
+        self.assertNotIn("decode", profiler.stages)
+        self.assertEqual(1, profiler.counters["rows"])
+
+    def test_profile_is_disabled_by_default(self):
+        manifest = self.load_manifest(self.release())
+
+        self.assertNotIn("build_profile", manifest)
+        self.assertNotIn("stages", manifest["datasets"]["spells"]["build"])
+
+
+class TestBuilderIncremental(TestSQLiteBuilderWithMockDB):
+    """test incremental builds against a real sqlite database"""
+
+    def build_spells(
+        self, db_manifest: dict | None = None, **config_options
+    ) -> Path:
+        return super().build_spells(
+            db_manifest or self.get_spells_manifest(),
+            incremental=True,
+            **config_options,
+        )
+
+    def test_only_changed_files_are_applied(self):
+        self.write_spell("a.json", "Acid Splash")
+        self.write_spell("b.json", "Bless")
+        db_path = self.build_spells()
+        self.assertListEqual(
+            [(0, "Acid Splash"), (1, "Bless"), (2, "Magic Missile")],
+            self.read_rows(db_path),
+        )
+
+        self.write_spell("b.json", "Bane")
+        (self.data_dir["spells"] / "a.json").unlink()
+        self.write_spell("c.json", "Cure Wounds")
+        db_path = self.build_spells()
+
+        self.assertListEqual(
+            [(1, "Bane"), (2, "Magic Missile"), (3, "Cure Wounds")],
+            self.read_rows(db_path),
+        )
+
+    def test_unchanged_sources_keep_database(self):
+        db_path = self.build_spells()
+        mtime_ns = db_path.stat().st_mtime_ns
+
+        with patch("dragon_compiler.builder.RowReader.decode") as mock_read:
+            self.build_spells()
+
+        mock_read.assert_not_called()
+        self.assertListEqual([(0, "Magic Missile")], self.read_rows(db_path))
+        self.assertEqual(mtime_ns, db_path.stat().st_mtime_ns)
+
+    def test_column_config_change_rebuilds_dataset(self):
+        self.build_spells()
+        db_path = self.build_spells(
+            self.get_spells_manifest(
+                columns=[
+                    {"name": "name", "type": "TEXT"},
+                    {"name": "level", "type": "INT"},
+                ]
+            )
+        )
+
+        self.assertListEqual(
+            [(0, "Magic Missile", 1)],
+            self.read_rows(db_path, "id, name, level"),
+        )
+
+
+class TestBuilderReuse(TestSQLiteBuilderWithMockDB):
+    """test content hashes and releases that reuse unchanged databases"""
+
+    def release_manifest(self, name: str, **config_options) -> dict:
+        return self.load_manifest(self.release(name, **config_options))
+
+    def test_content_hash_does_not_depend_on_file_layout(self):
+        manifest = self.release_manifest("a")
+        other_manifest = self.release_manifest(
+            "b",
+            batch_size=1,
+            pragma_profile=builder.PragmaProfile.SAFE,
+            layout=builder.ReleaseLayout.SINGLE,
+        )
+
+        for name in ("spells", "monsters"):
+            with self.subTest(dataset=name):
+                self.assertEqual(
+                    manifest["datasets"][name]["content_sha256"],
+                    other_manifest["datasets"][name]["content_sha256"],
+                )
+        self.assertNotEqual(
+            manifest["datasets"]["spells"]["content_sha256"],
+            manifest["datasets"]["monsters"]["content_sha256"],
+        )
+
+    def test_unchanged_datasets_are_linked(self):
+        previous = self.release_manifest("previous")
+        with self.json_path["monsters"].open("w", encoding="utf-8") as f:
+            json.dump({"name": "Beholder"}, f)
+
+        manifest = self.release_manifest(
+            "current", reuse_from=self.db_dir / "previous"
+        )
+
+        spells = manifest["datasets"]["spells"]
+        monsters = manifest["datasets"]["monsters"]
+        self.assertTrue(spells["build"]["reused"])
+        self.assertNotIn("reused", monsters["build"])
+        self.assertEqual(
+            previous["datasets"]["spells"]["content_sha256"],
+            spells["content_sha256"],
+        )
+        self.assertNotEqual(
+            previous["datasets"]["monsters"]["content_sha256"],
+            monsters["content_sha256"],
+        )
+        self.assertTrue(
+            (self.db_dir / "current" / "spells.sqlite").samefile(
+                self.db_dir / "previous" / "spells.sqlite"
+            )
+        )
+        con = sqlite3.connect(self.db_dir / "current" / "monsters.sqlite")
+        rows = con.execute("SELECT name FROM monsters").fetchall()
+        con.close()
+        self.assertListEqual([("Beholder",)], rows)
+
+    def test_sources_are_only_hashed_for_releases(self):
+        full_manifest = self.release_manifest("full")
+
+        with patch.object(
+            builder, "hash_file", wraps=builder.hash_file
+        ) as hash_file:
+            self.build_spells(self.get_db_manifest_for_DnDCombatTracker())
+            self.assertEqual(0, hash_file.call_count)
+
+            # incremental releases take the hashes of their source index
+            self.release("incremental", incremental=True)
+            manifest = self.release_manifest("incremental", incremental=True)
+            self.assertEqual(0, hash_file.call_count)
+
+        for name in ("spells", "monsters"):
+            self.assertEqual(
+                full_manifest["datasets"][name]["build"]["source_sha256"],
+                manifest["datasets"][name]["build"]["source_sha256"],
+            )
+
+    def test_changed_options_are_not_reused(self):
+        self.release_manifest("previous")
+
+        manifest = self.release_manifest(
+            "current",
+            reuse_from=self.db_dir / "previous",
+            rest_format=builder.RestFormat.JSONB,
+        )
+
+        for name in ("spells", "monsters"):
+            self.assertNotIn("reused", manifest["datasets"][name]["build"])
+
+    def test_reuse_requires_full_per_dataset_builds(self):
+        for options in (
+            {"incremental": True},
+            {"layout": builder.ReleaseLayout.SINGLE},
+        ):
+            with self.subTest(**options):
+                test_builder = builder.Builder(logger=self.fake_logger)
+                with self.assertRaises(ValueError):
+                    test_builder.set_config(
+                        builder.BuilderConfig(
+                            self.db_dir,
+                            self.db_dir / "release",
+                            None,
+                            db_manifest=(
+                                self.get_db_manifest_for_DnDCombatTracker()
+                            ),
+                            reuse_from=self.db_dir / "previous",
+                            **options,
+                        )
+                    )
+
+
+class TestBuilderSourceDiscovery(TestSQLiteBuilderWithMockDB):
+    """test datasets with nested source folders"""
+
+    def build_nested_spells(self, **dataset_options) -> Path:
+        return self.build_spells(
+            self.get_spells_manifest(**dataset_options), incremental=True
+        )
+
+    def test_nested_source_files(self):
+        self.write_spell("b.json", "Bless")
+        self.write_spell("a/z.json", "Zone of Truth")
+        self.write_spell("a/drafts/w.json", "Wish")
+
+        db_path = self.build_nested_spells(
+            recursive=True, exclude=["**/drafts/**"]
+        )
+        self.assertListEqual(
+            [(0, "Zone of Truth"), (1, "Bless"), (2, "Magic Missile")],
+            self.read_rows(db_path),
+        )
+
+        self.write_spell("a/drafts/a.json", "Aid")
+        db_path = self.build_nested_spells(recursive=True)
+
+        self.assertListEqual(
+            [
+                (0, "Zone of Truth"),
+                (1, "Bless"),
+                (2, "Magic Missile"),
+                (3, "Aid"),
+                (4, "Wish"),
+            ],
+            self.read_rows(db_path),
+        )
+
+
+class TestBuilderAtomic(TestBuilderIncremental):
+    """test builds that replace the published database atomically"""
+
+    def build_spells(
+        self, db_manifest: dict | None = None, **config_options
+    ) -> Path:
+        return super().build_spells(db_manifest, atomic=True, **config_options)
+
+    def get_out_files(self) -> list[str]:
+        return sorted(p.name for p in (self.db_dir / "build").iterdir())
+
+    def test_failed_build_keeps_database(self):
+        self.write_spell("a.json", "Acid Splash")
+        db_path = self.build_spells()
+        inode = db_path.stat().st_ino
+
+        with (self.data_dir["spells"] / "broken.json").open("w") as f:
+            f.write('{"name": ')
+        with self.assertRaises(ValueError):
+            self.build_spells()
+
+        self.assertEqual(inode, db_path.stat().st_ino)
+        self.assertListEqual(
+            [(0, "Acid Splash"), (1, "Magic Missile")], self.read_rows(db_path)
+        )
+        self.assertListEqual(
+            ["spells.index.json", "spells.sqlite"], self.get_out_files()
+        )
+
+    def test_database_is_replaced(self):
+        self.write_spell("a.json", "Acid Splash")
+        db_path = self.build_spells()
+        inode = db_path.stat().st_ino
+
+        (self.data_dir["spells"] / "a.json").unlink()
+        db_path = self.build_spells()
+
+        self.assertNotEqual(inode, db_path.stat().st_ino)
+        self.assertListEqual([(1, "Magic Missile")], self.read_rows(db_path))
+        self.assertListEqual(
+            ["spells.index.json", "spells.sqlite"], self.get_out_files()
+        )
+        con = sqlite3.connect(db_path)
+        free_pages = con.execute("PRAGMA freelist_count").fetchone()[0]
+        con.close()
+        self.assertEqual(0, free_pages)
+
+
+class TestBuilderMemoryBudget(TestSQLiteBuilderWithMockDB):
+    """test memory-bounded builds"""
+
+    def build_rows(self, **config_options) -> list[tuple]:
+        out_path = self.db_dir / "build"
+        test_builder = self.create_builder(
+            out_path, profile=True, **config_options
+        )
+        test_builder.build()
+        rows = self.read_rows(
+            out_path / "spells.sqlite", "id, typeof(rest), rest"
+        )
+        (out_path / "spells.sqlite").unlink()
+        self.streamed_rows = test_builder.get_profiler().counters.get(
+            "streamed_rows", 0
+        )
+        return rows
+
+    def test_large_rows_are_streamed(self):
+        self.write_spell("lore.json", "Lore", text="Drachenß " * 5000)
+        exp_rows = self.build_rows()
+
+        for rest_format, exp_streamed_rows in (
+            (builder.RestFormat.TEXT, 2),
+            (builder.RestFormat.RAW, 2),
+            (builder.RestFormat.JSONB, 0),
+        ):
+            with self.subTest(rest_format=rest_format):
+                rows = self.build_rows(
+                    memory=builder.MemoryBudget(64, max_row_bytes=100),
+                    rest_format=rest_format,
+                )
+
+                self.assertEqual(exp_streamed_rows, self.streamed_rows)
+                if rest_format == builder.RestFormat.TEXT:
+                    self.assertListEqual(exp_rows, rows)
+                    self.assertEqual("text", rows[0][1])
+
+    def write_lore(self, unit: str):
+        self.write_spell(
+            "lore.json",
+            "Lore",
+            casting_time={"unit": unit},
+            text="Drachenß " * 5000,
+        )
+
+    def test_rows_are_not_streamed_if_sqlite_reads_rest(self):
+        stored_column = {
+            "name": "unit",
+            "type": "TEXT",
+            "path": "casting_time.unit",
+            "storage": "stored",
+        }
+        path_index = {"columns": [{"path": "casting_time.unit"}]}
+        for name, dataset in (
+            ("stored", {"columns": [stored_column]}),
+            ("index", {"columns": [], "indexes": [path_index]}),
+        ):
+            with self.subTest(dataset=name):
+                out_path = self.db_dir / name
+                test_builder = self.create_builder(
+                    out_path,
+                    self.get_spells_manifest(**dataset),
+                    profile=True,
+                    incremental=True,
+                    memory=builder.MemoryBudget(64, max_row_bytes=100),
+                )
+                self.write_lore("action")
+                test_builder.build()
+                # the index exists while the changed row is inserted
+                self.write_lore("minute")
+                test_builder.build()
+
+                counters = test_builder.get_profiler().counters
+                self.assertNotIn("streamed_rows", counters)
+                con = sqlite3.connect(out_path / "spells.sqlite")
+                units = con.execute(
+                    "SELECT json_extract(rest, '$.casting_time.unit') "
+                    "FROM spells WHERE json_extract(rest, '$.name') = 'Lore'"
+                ).fetchall()
+                con.close()
+                self.assertListEqual([("minute",)], units)
+
+
+class TestBuilderParseCache(TestSQLiteBuilderWithMockDB):
+    """test builds that share a parse cache"""
+
+    def build_rows(self, columns: list[dict], **config_options) -> list:
+        out_path = self.db_dir / "build"
+        test_builder = self.create_builder(
+            out_path,
+            self.get_spells_manifest(columns=columns),
+            profile=True,
+            cache_dir=self.db_dir / "cache",
+            **config_options,
+        )
+        test_builder.build()
+        rows = self.read_rows(out_path / "spells.sqlite", "*")
+        (out_path / "spells.sqlite").unlink()
+        counters = test_builder.get_profiler().counters
+        self.cache_counts = (
+            counters.get("cache_hits", 0),
+            counters.get("cache_misses", 0),
+        )
+        return rows
+
+    def write_spells(self, file_name: str, names: list[str]):
+        path = self.data_dir["spells"] / file_name
+        with path.open("w", encoding="utf-8") as f:
+            json.dump([{"name": name, "level": 0} for name in names], f)
+
+    def test_unchanged_files_are_not_parsed(self):
+        columns = [{"name": "name", "type": "TEXT"}]
+        self.write_spells("a.json", ["Acid Splash", "Aid"])
+        self.write_spells("b.json", ["Bane", "Bless"])
+        exp_rows = self.build_rows(columns)
+        self.assertTupleEqual((0, 3), self.cache_counts)
+
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                with patch(
+                    "dragon_compiler.builder.RowReader.decode"
+                ) as mock_decode:
+                    rows = self.build_rows(columns, jobs=jobs)
+
+                mock_decode.assert_not_called()
+                self.assertListEqual(exp_rows, rows)
+                self.assertTupleEqual((3, 0), self.cache_counts)
+
+    def test_changed_files_are_parsed(self):
+        columns = [{"name": "name", "type": "TEXT"}]
+        self.write_spells("a.json", ["Acid Splash"])
+        self.write_spells("b.json", ["Bane"])
+        self.build_rows(columns)
+
+        self.write_spells("a.json", ["Aid"])
+        for jobs in (2, 1):
+            with self.subTest(jobs=jobs):
+                rows = self.build_rows(columns, jobs=jobs)
+
+                self.assertListEqual(
+                    ["Aid", "Bane", "Magic Missile"],
+                    [row[1] for row in rows],
+                )
+        # the first build with the changed file added it to the cache
+        self.assertTupleEqual((3, 0), self.cache_counts)
+
+    def test_hits_and_misses_share_one_task_queue(self):
+        columns = [{"name": "name", "type": "TEXT"}]
+        for name in ("a", "b", "c", "d"):
+            self.write_spells(f"{name}.json", [f"{name} 1", f"{name} 2"])
+        self.build_rows(columns)
+        # every other file is a cache miss
+        self.write_spells("b.json", ["Bane"])
+        self.write_spells("d.json", ["Dancing Lights"])
+
+        with patch.object(
+            builder.OrderedTaskQueue,
+            "map",
+            autospec=True,
+            side_effect=builder.OrderedTaskQueue.map,
+        ) as task_queue_map:
+            rows = self.build_rows(columns, jobs=2)
+
+        task_queue_map.assert_called_once()
+        self.assertTupleEqual((3, 2), self.cache_counts)
+        self.assertListEqual(
+            ["a 1", "a 2", "Bane", "c 1", "c 2", "Dancing Lights"],
+            [row[1] for row in rows[:6]],
+        )
+
+    def test_column_config_is_part_of_the_key(self):
+        self.build_rows([{"name": "name", "type": "TEXT"}])
+
+        rows = self.build_rows([{"name": "level", "type": "INTEGER"}])
+
+        self.assertTupleEqual((0, 1), self.cache_counts)
+        self.assertEqual(1, rows[0][1])
+
+
+class TestBuilderTypeCheck(TestSQLiteBuilderWithMockDB):
+    """test type checks of the extracted column values"""
+
+    def write_spells(self):
+        for name, level in (("Aid", "2"), ("Bane", "one"), ("Bless", None)):
+            self.write_spell(f"{name}.json", name, level=level)
+
+    def test_lenient(self):
+        self.write_spells()
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                out_path = self.release(
+                    jobs=jobs,
+                    atomic=True,
+                    type_check=builder.TypeCheck.LENIENT,
+                )
+
+                con = sqlite3.connect(out_path / "spells.sqlite")
+                rows = con.execute(
+                    "SELECT name, level, typeof(level) FROM spells"
+                ).fetchall()
+                con.close()
+                build = self.load_manifest(out_path)["datasets"]["spells"][
+                    "build"
+                ]
+                self.assertListEqual(
+                    [
+                        ("Aid", 2, "integer"),
+                        ("Bane", None, "null"),
+                        ("Bless", None, "null"),
+                        ("Magic Missile", 1, "integer"),
+                    ],
+                    rows,
+                )
+                self.assertEqual(1, build["type_errors"]["count"])
+                self.assertEqual(
+                    "'one'", build["type_errors"]["examples"][0]["value"]
+                )
+
+    def test_strict(self):
+        self.write_spells()
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                with self.assertRaises(builder.ColumnTypeError) as context:
+                    self.release(
+                        jobs=jobs,
+                        atomic=True,
+                        type_check=builder.TypeCheck.STRICT,
+                    )
+
+                self.assertIn("2 values of wrong type", str(context.exception))
+                self.assertListEqual(
+                    [], list((self.db_dir / "release").glob("spells*"))
+                )
+
+    def test_off_by_default(self):
+        self.write_spells()
+
+        out_path = self.release()
+
+        con = sqlite3.connect(out_path / "spells.sqlite")
+        levels = con.execute("SELECT level FROM spells").fetchall()
+        con.close()
+        # the integer affinity of sqlite converts "2" as well
+        self.assertListEqual([(2,), ("one",), (None,), (1,)], levels)
+
+
+class TestRowReader(TestSQLiteBuilderWithMockDB):
+    """test conversion of json documents to rows"""
+
+    def test_rest_formats(self):
+        source = b'{\n  "name": "Magic Missile",\n  "level": 1\n}\n'
+        exp_rest = {
+            builder.RestFormat.TEXT: '{"name": "Magic Missile", "level": 1}',
+            builder.RestFormat.RAW: source.decode("utf-8").strip(),
+            builder.RestFormat.MINIFIED: '{"name":"Magic Missile","level":1}',
+        }
+        for rest_format, rest in exp_rest.items():
+            with self.subTest(rest_format=rest_format):
+                row_reader = builder.RowReader(
+                    ["level", "school_of_magic"], rest_format=rest_format
+                )
+
+                self.assertTupleEqual((1, None, rest), row_reader.read(source))
+
+    def test_rest_format_from_manifest(self):
+        db_manifest = self.get_db_manifest_for_DnDCombatTracker()
+        db_manifest["datasets"][1]["rest_format"] = "minified"
+        out_path = self.db_dir / "release"
+        self.create_builder(out_path, db_manifest).build()
+
+        con = sqlite3.connect(out_path / "monsters.sqlite")
+        rest = con.execute("SELECT rest FROM monsters").fetchone()[0]
+        con.close()
+        self.assertEqual('{"name":"Owlbear"}', rest)
+
+
+class TestBuilderBundles(TestSQLiteBuilderWithMockDB):
+    """test datasets that are stored in json lines and array files"""
+
+    def test_build_bundles(self):
+        with (self.data_dir["spells"] / "bundle.jsonl").open(
+            "w", encoding="utf-8"
+        ) as f:
+            for idx in range(100):
+                f.write(json.dumps({"name": f"line {idx}"}) + "\n")
+        with (self.data_dir["spells"] / "array.json").open(
+            "w", encoding="utf-8"
+        ) as f:
+            json.dump([{"name": f"element {idx}"} for idx in range(100)], f)
+        names = []
+        for jobs in (1, 3):
+            with self.subTest(jobs=jobs):
+                out_path = self.db_dir / f"build_{jobs}"
+
+                self.create_builder(out_path, jobs=jobs).build()
+
+                con = sqlite3.connect(out_path / "spells.sqlite")
+                names.append(
+                    con.execute(
+                        "SELECT json_extract(rest, '$.name') FROM spells "
+                        "ORDER BY id"
+                    ).fetchall()
+                )
+                con.close()
+                self.assertEqual(201, len(names[-1]))
+        self.assertListEqual(names[0], names[1])
+
+    def test_large_array_is_split_into_records(self):
+        array_path = self.data_dir["spells"] / "array.json"
+        with array_path.open("w", encoding="utf-8") as f:
+            json.dump([{"name": f"element {idx}"} for idx in range(100)], f)
+        test_builder = builder.Builder(logger=self.fake_logger)
+        test_builder.SPLIT_FILE_BYTES = array_path.stat().st_size
+
+        items = list(
+            test_builder._iter_source_items(  # pylint: disable=protected-access
+                [self.json_path["spells"], array_path]
+            )
+        )
+
+        self.assertEqual(101, len(items))
+        self.assertEqual(self.json_path["spells"], items[0])
+        self.assertTupleEqual((array_path, b'{"name": "element 0"}'), items[1])
+
+
+class TestBuilderIndexes(TestSQLiteBuilderWithMockDB):
+    """test index creation against a real sqlite database"""
+
+    def test_indexes_from_manifest(self):
+        db_manifest = self.get_db_manifest_for_DnDCombatTracker()
+        spells = db_manifest["datasets"][0]
+        spells["columns"][0]["index"] = "unique"
+        spells["indexes"] = [
+            {"columns": ["level", "name"]},
+            {
+                "name": "spells_by_unit",
+                "columns": [{"path": "casting_time.unit"}],
+                "where": "level > 0",
+            },
+        ]
+
+        db_path = self.build_spells(db_manifest)
+
+        con = sqlite3.connect(db_path)
+        indexes = con.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            "ORDER BY name"
+        ).fetchall()
+        has_stats = con.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()
+        con.close()
+        self.assertListEqual(
+            [
+                (
+                    "spells_by_unit",
+                    "CREATE INDEX spells_by_unit ON spells "
+                    "(json_extract(rest, '$.casting_time.unit')) "
+                    "WHERE level > 0",
+                ),
+                (
+                    "spells_idx0",
+                    "CREATE UNIQUE INDEX spells_idx0 ON spells (name)",
+                ),
+                (
+                    "spells_idx1",
+                    "CREATE INDEX spells_idx1 ON spells (level, name)",
+                ),
+            ],
+            indexes,
+        )
+        self.assertGreater(has_stats[0], 0)
+
+
+class TestBuilderFullTextSearch(TestSQLiteBuilderWithMockDB):
+    """test fts5 tables against a real sqlite database"""
+
+    def build_release(self, **config_options) -> Path:
+        db_manifest = self.get_db_manifest_for_DnDCombatTracker()
+        db_manifest["datasets"][0]["fts"] = {
+            "columns": ["name", "description.text"],
+            "tokenize": "unicode61 remove_diacritics 2",
+        }
+        return self.release(db_manifest=db_manifest, **config_options)
+
+    def search(self, out_path: Path, query: str) -> list[tuple]:
+        con = sqlite3.connect(out_path / "spells.sqlite")
+        rows = con.execute(
+            "SELECT rowid, name FROM spells_fts WHERE spells_fts MATCH ?",
+            (query,),
+        ).fetchall()
+        con.close()
+        return rows
+
+    def test_fts_table_is_built(self):
+        out_path = self.build_release()
+
+        self.assertListEqual(
+            [(0, "Magic Missile")], self.search(out_path, "glowing")
+        )
+        self.assertListEqual(
+            [(0, "Magic Missile")], self.search(out_path, "ah")
+        )
+        manifest = self.load_manifest(out_path)
+        self.assertDictEqual(
+            {
+                "table": "spells_fts",
+                "columns": [
+                    {"name": "name", "path": "$.name"},
+                    {"name": "description_text", "path": "$.description.text"},
+                ],
+            },
+            manifest["datasets"]["spells"]["fts"],
+        )
+
+    def test_fts_table_follows_incremental_builds(self):
+        self.build_release(incremental=True)
+        self.data["spells"]["description"]["text"] = "sparkling darts"
+        with self.json_path["spells"].open("w", encoding="utf-8") as f:
+            json.dump(self.data["spells"], f)
+
+        out_path = self.build_release(incremental=True)
+
+        self.assertListEqual([], self.search(out_path, "glowing"))
+        self.assertListEqual(
+            [(0, "Magic Missile")], self.search(out_path, "sparkling")
+        )
+
+
+class TestBuilderPathColumns(TestSQLiteBuilderWithMockDB):
+    """test columns that are read from nested json paths"""
+
+    def test_split_json_path(self):
+        self.assertListEqual(
+            ["effects", "damage", "type"],
+            builder.split_json_path("effects.damage.type"),
+        )
+        self.assertListEqual(
+            ["casting_classes", 0, "name"],
+            builder.split_json_path("$.casting_classes[0].name"),
+        )
+
+    def test_table_strings_with_generated_columns(self):
+        db_build_config = builder.DatabaseBuildConfig(
+            "spells",
+            [
+                {"name": "name", "type": "TEXT"},
+                {"name": "unit", "type": "TEXT", "path": "casting_time.unit"},
+                {
+                    "name": "distance",
+                    "type": "INTEGER",
+                    "path": "range.distance",
+                    "storage": "stored",
+                },
+            ],
+        )
+
+        self.assertEqual(
+            "spells (id INTEGER PRIMARY KEY, name TEXT, unit TEXT, "
+            "distance INTEGER GENERATED ALWAYS AS "
+            "(json_extract(rest, '$.range.distance')) STORED, rest TEXT)",
+            db_build_config.get_table_creation_str(),
+        )
+        self.assertEqual(
+            "spells(id, name, unit, rest) VALUES(?, ?, ?, ?)",
+            db_build_config.get_table_insert_str(),
+        )
+        self.assertListEqual(
+            ["name", "casting_time.unit"],
+            db_build_config.get_extracted_paths(),
+        )
+
+    def test_build_with_path_columns(self):
+        db_manifest = self.get_db_manifest_for_DnDCombatTracker()
+        db_manifest["datasets"][0]["columns"] += [
+            {"name": "unit", "type": "TEXT", "path": "casting_time.unit"},
+            {
+                "name": "distance",
+                "type": "INTEGER",
+                "path": "$.range.distance",
+                "storage": "virtual",
+                "index": True,
+            },
+            {"name": "missing", "type": "TEXT", "path": "range.x.y"},
+        ]
+
+        db_path = self.build_spells(db_manifest)
+
+        con = sqlite3.connect(db_path)
+        row = con.execute(
+            "SELECT name, unit, distance, missing FROM spells"
+        ).fetchone()
+        con.close()
+        self.assertTupleEqual(("Magic Missile", "action", 120, None), row)
+
+
+@unittest.skipIf(
+    sqlite3.sqlite_version_info < (3, 45, 0), "jsonb requires sqlite 3.45"
+)
+class TestBuilderJsonb(TestSQLiteBuilderWithMockDB):
+    """test the jsonb rest format against a real sqlite database"""
+
+    def test_build_with_jsonb(self):
+        db_manifest = self.get_db_manifest_for_DnDCombatTracker()
+        db_manifest["datasets"][0]["rest_format"] = "jsonb"
+        db_manifest["datasets"][0]["columns"].append(
+            {"name": "unit", "type": "TEXT", "path": "casting_time.unit"}
+        )
+
+        out_path = self.release(db_manifest=db_manifest)
+
+        con = sqlite3.connect(out_path / "spells.sqlite")
+        rest, rest_type, text, level = con.execute(
+            "SELECT json(rest), typeof(rest), "
+            "rest ->> '$.description.text', level FROM spells"
+        ).fetchone()
+        con.close()
+        self.assertDictEqual(self.data["spells"], json.loads(rest))
+        self.assertEqual("blob", rest_type)
+        self.assertEqual(self.data["spells"]["description"]["text"], text)
+        self.assertEqual(1, level)
+        spells = self.load_manifest(out_path)["datasets"]["spells"]
+        self.assertEqual("jsonb", spells["rest_format"])
+        self.assertDictEqual(
+            {"name": "rest", "type": "BLOB"}, spells["columns"][-1]
+        )
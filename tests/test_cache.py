@@ -0,0 +1,77 @@
+"""Tests for the parse cache"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from dragon_compiler import cache
+
+
+class TestParseCache(unittest.TestCase):
+    """test storing, reading and evicting parsed rows"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.folder = Path(self.temp_dir.name)
+        self.parse_cache = cache.ParseCache(self.folder / "cache", 10_000)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_entry(self, key: str, rows: list[tuple]):
+        writer = self.parse_cache.create_writer(key)
+        for row in rows:
+            writer.write(row)
+        writer.commit()
+
+    def test_get_key(self):
+        source = self.folder / "spell.json"
+        source.write_text('{"name": "Aid"}', encoding="utf-8")
+
+        key = self.parse_cache.get_key(source, "columns")
+
+        self.assertEqual(key, self.parse_cache.get_key(source, "columns"))
+        self.assertNotEqual(key, self.parse_cache.get_key(source, "other"))
+        source.write_text('{"name": "Bane"}', encoding="utf-8")
+        self.assertNotEqual(key, self.parse_cache.get_key(source, "columns"))
+
+    def test_rows_are_stored(self):
+        rows = [(f"Spell {idx}", idx, None, "{}") for idx in range(1000)]
+        self.write_entry("ab12", rows)
+
+        entry = self.parse_cache.open_entry("ab12")
+
+        self.assertListEqual(rows, list(self.parse_cache.iter_rows(entry)))
+        self.assertIsNone(self.parse_cache.open_entry("cd34"))
+
+    def test_discarded_writer_leaves_no_entry(self):
+        writer = self.parse_cache.create_writer("ab12")
+        writer.write(("Aid", "{}"))
+
+        writer.discard()
+
+        self.assertIsNone(self.parse_cache.open_entry("ab12"))
+        self.assertListEqual(
+            [],
+            [p for p in (self.folder / "cache").rglob("*") if p.is_file()],
+        )
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for idx, key in enumerate(("aa", "bb", "cc")):
+            self.write_entry(key, [("x" * 4000,)])
+            os.utime(self.parse_cache.get_path(key), ns=(idx, idx))
+        # reading an entry marks it as recently used
+        self.parse_cache.open_entry("aa").close()
+
+        removed = self.parse_cache.evict()
+
+        self.assertEqual(1, removed)
+        self.assertIsNone(self.parse_cache.open_entry("bb"))
+        self.assertTrue(self.parse_cache.get_path("aa").exists())
+        self.assertTrue(self.parse_cache.get_path("cc").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
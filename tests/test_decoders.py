@@ -0,0 +1,69 @@
+"""Tests for the json decoding backends"""
+
+import json
+import unittest
+import unittest.mock
+from dragon_compiler import decoders
+
+DOCUMENT = b"""{
+    "name": "Abrakad\xc3\xa4bra",
+    "level": 0,
+    "description": {"text": "a \\"quoted\\" text,  with  spaces"},
+    "tags": [ "a", "b" ]
+}
+"""
+
+
+class TestJsonDecoders(unittest.TestCase):
+    """test all installed json backends"""
+
+    def get_available_decoders(self) -> list[decoders.JsonDecoder]:
+        return [
+            decoders.get_decoder(backend)
+            for backend in decoders.JsonBackend
+            if decoders.is_backend_available(backend)
+        ]
+
+    def test_loads(self):
+        for decoder in self.get_available_decoders():
+            with self.subTest(backend=decoder.backend):
+                self.assertEqual(json.loads(DOCUMENT), decoder.loads(DOCUMENT))
+
+    def test_columns_loader(self):
+        for decoder in self.get_available_decoders():
+            with self.subTest(backend=decoder.backend):
+                load_columns = decoder.get_columns_loader(["name", "missing"])
+
+                columns = load_columns(DOCUMENT)
+
+                self.assertEqual("Abrakadäbra", columns.get("name"))
+                self.assertIsNone(columns.get("missing"))
+
+    def test_row_loaders(self):
+        document = json.loads(DOCUMENT)
+        exp_rest = {
+            decoders.RestFormat.TEXT: json.dumps(document, ensure_ascii=False),
+            decoders.RestFormat.RAW: DOCUMENT.decode("utf-8").strip(),
+            decoders.RestFormat.MINIFIED: json.dumps(
+                document, ensure_ascii=False, separators=(",", ":")
+            ),
+        }
+        for decoder in self.get_available_decoders():
+            for rest_format, rest in exp_rest.items():
+                with self.subTest(
+                    backend=decoder.backend, rest_format=rest_format
+                ):
+                    load_row = decoder.get_row_loader(["name"], rest_format)
+
+                    columns, act_rest = load_row(DOCUMENT)
+
+                    self.assertEqual("Abrakadäbra", columns.get("name"))
+                    self.assertEqual(rest, act_rest)
+
+    def test_unavailable_backend(self):
+        with unittest.mock.patch(
+            "dragon_compiler.decoders.importlib.util.find_spec",
+            return_value=None,
+        ):
+            with self.assertRaises(ValueError):
+                decoders.get_decoder(decoders.JsonBackend.ORJSON)
@@ -0,0 +1,376 @@
+"""Tests for delta releases"""
+
+from datetime import datetime, timezone
+import json
+import logging
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from dragon_compiler import builder, delta
+
+
+class TestDelta(unittest.TestCase):
+    """test creating a delta between two releases and applying it"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.temp_path = Path(self.temp_dir.name)
+        self.source_path = self.temp_path / "source"
+        self.manifest = {
+            "database_info": {"name": "test", "version": "0.1.0"},
+            "datasets": [
+                {
+                    "name": "spells",
+                    "source": "spells",
+                    "columns": [
+                        {"name": "name", "type": "TEXT", "index": "unique"},
+                        {"name": "level", "type": "INTEGER"},
+                    ],
+                    "fts": {"columns": ["name"]},
+                },
+                {
+                    "name": "monsters",
+                    "source": "monsters",
+                    "columns": [{"name": "name", "type": "TEXT"}],
+                },
+            ],
+        }
+        (self.source_path / "spells").mkdir(parents=True)
+        (self.source_path / "monsters").mkdir()
+        for idx in range(10):
+            self.write_source(
+                "spells", f"spell{idx}", {"name": f"Spell {idx}", "level": idx}
+            )
+        self.write_source("monsters", "owlbear", {"name": "Owlbear"})
+        self.logger = logging.getLogger("test_delta")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_source(self, dataset: str, name: str, document: dict):
+        path = self.source_path / dataset / f"{name}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(document, f)
+
+    def release(self, name: str, version: str, **config_options) -> Path:
+        self.manifest["database_info"]["version"] = version
+        release_path = self.temp_path / name
+        test_builder = builder.Builder(logger=self.logger)
+        test_builder.set_config(
+            builder.BuilderConfig(
+                self.source_path,
+                release_path,
+                None,
+                db_manifest=self.manifest,
+                **config_options,
+            )
+        )
+        test_builder.build()
+        test_builder.package_release(datetime.now(timezone.utc))
+        return release_path
+
+    def change_sources(self):
+        # the new first spell shifts the ids of all other spells
+        self.write_source("spells", "aaa", {"name": "Aid", "level": 2})
+        self.write_source("spells", "spell3", {"name": "Spell 3", "level": 9})
+        (self.source_path / "spells" / "spell5.json").unlink()
+
+    def read_rows(self, release_path: Path, table: str) -> list[tuple]:
+        con = sqlite3.connect(release_path / f"{table}.sqlite")
+        try:
+            return con.execute(
+                f"SELECT name, rest FROM {table} ORDER BY name"
+            ).fetchall()
+        finally:
+            con.close()
+
+    def search(self, release_path: Path, text: str) -> list[str]:
+        con = sqlite3.connect(release_path / "spells.sqlite")
+        try:
+            return [
+                row[0]
+                for row in con.execute(
+                    "SELECT name FROM spells WHERE id IN (SELECT rowid FROM "
+                    "spells_fts WHERE spells_fts MATCH ?) ORDER BY name",
+                    (text,),
+                )
+            ]
+        finally:
+            con.close()
+
+    def load_manifest(self, release_path: Path) -> dict:
+        with (release_path / "manifest.json").open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_delta_summary(self):
+        old_path = self.release("old", "0.1.0")
+        self.change_sources()
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+
+        summary = self.load_manifest(new_path)["delta"]
+        self.assertEqual(summary["file"], delta.DELTA_FILE_NAME)
+        self.assertEqual(summary["from"]["version"], "0.1.0")
+        self.assertEqual(summary["to"]["version"], "0.2.0")
+        self.assertEqual(
+            {
+                count: summary["datasets"]["spells"][count]
+                for count in ("inserted", "updated", "deleted")
+            },
+            {"inserted": 1, "updated": 1, "deleted": 1},
+        )
+        self.assertEqual(summary["datasets"]["monsters"]["updated"], 0)
+        self.assertTrue((new_path / delta.DELTA_FILE_NAME).is_file())
+        self.assertEqual(
+            self.load_manifest(new_path)["datasets"]["spells"]["key"], ["name"]
+        )
+
+    def test_apply_delta(self):
+        old_path = self.release("old", "0.1.0")
+        self.change_sources()
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+
+        summary = delta.apply_delta(
+            old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+
+        self.assertEqual(summary["to"]["version"], "0.2.0")
+        for table in ("spells", "monsters"):
+            self.assertEqual(
+                self.read_rows(old_path, table),
+                self.read_rows(new_path, table),
+            )
+        self.assertEqual(self.search(old_path, "Aid"), ["Aid"])
+        self.assertEqual(self.search(old_path, "5"), [])
+        self.assertEqual(
+            self.load_manifest(old_path)["database_info"]["version"], "0.2.0"
+        )
+
+    def test_content_key_delta_is_minimal(self):
+        for idx in range(5):
+            self.write_source("monsters", f"goblin{idx}", {"hp": idx})
+        old_path = self.release("old", "0.1.0")
+        # the new first monster shifts the ids of all other monsters
+        self.write_source("monsters", "aboleth", {"name": "Aboleth"})
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+
+        summary = self.load_manifest(new_path)["delta"]["datasets"]
+        self.assertEqual(
+            {
+                count: summary["monsters"][count]
+                for count in ("inserted", "updated", "deleted")
+            },
+            {"inserted": 1, "updated": 0, "deleted": 0},
+        )
+        self.assertEqual(
+            self.load_manifest(new_path)["datasets"]["monsters"]["key"],
+            ["name", "rest"],
+        )
+        delta.apply_delta(
+            old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+        self.assertEqual(
+            self.read_rows(old_path, "monsters"),
+            self.read_rows(new_path, "monsters"),
+        )
+
+    def test_unique_path_index_is_not_the_key(self):
+        self.manifest["datasets"][1]["indexes"] = [
+            {"columns": [{"path": "size"}], "unique": True}
+        ]
+        old_path = self.release("old", "0.1.0")
+        self.write_source("monsters", "aboleth", {"name": "Aboleth"})
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+
+        self.assertEqual(
+            self.load_manifest(new_path)["delta"]["datasets"]["monsters"][
+                "inserted"
+            ],
+            1,
+        )
+
+    def test_apply_delta_twice(self):
+        old_path = self.release("old", "0.1.0")
+        self.change_sources()
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+        delta.apply_delta(
+            old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+
+        with self.assertRaises(delta.DeltaError):
+            delta.apply_delta(
+                old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+            )
+
+    def test_apply_delta_rolls_back_on_mismatch(self):
+        old_path = self.release("old", "0.1.0")
+        self.change_sources()
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+        con = sqlite3.connect(old_path / "spells.sqlite")
+        with con:
+            con.execute("UPDATE spells SET level = 7 WHERE name = 'Spell 1'")
+        con.close()
+        expected_rows = self.read_rows(old_path, "spells")
+
+        with self.assertRaises(delta.DeltaError):
+            delta.apply_delta(
+                old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+            )
+
+        self.assertEqual(self.read_rows(old_path, "spells"), expected_rows)
+        self.assertEqual(
+            self.load_manifest(old_path)["database_info"]["version"], "0.1.0"
+        )
+
+    def test_failed_database_leaves_release_unchanged(self):
+        old_path = self.release("old", "0.1.0")
+        self.change_sources()
+        self.write_source("monsters", "kobold", {"name": "Kobold"})
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+        expected_rows = self.read_rows(old_path, "spells")
+        patch_dataset = delta._patch_dataset  # pylint: disable=protected-access
+
+        def fail_monsters(con, name, *args):
+            if name == "monsters":
+                raise sqlite3.OperationalError("disk full")
+            patch_dataset(con, name, *args)
+
+        with patch.object(delta, "_patch_dataset", side_effect=fail_monsters):
+            with self.assertRaises(sqlite3.OperationalError):
+                delta.apply_delta(
+                    old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+                )
+
+        self.assertEqual(self.read_rows(old_path, "spells"), expected_rows)
+        self.assertEqual(list(old_path.glob(".*")), [])
+        delta.apply_delta(
+            old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+        self.assertEqual(
+            self.read_rows(old_path, "monsters"),
+            self.read_rows(new_path, "monsters"),
+        )
+
+    def test_mismatch_is_found_before_patching(self):
+        old_path = self.release("old", "0.1.0")
+        self.change_sources()
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+        con = sqlite3.connect(old_path / "monsters.sqlite")
+        with con:
+            con.execute("UPDATE monsters SET name = 'Owl'")
+        con.close()
+        expected_rows = self.read_rows(old_path, "spells")
+
+        with patch.object(delta, "_patch_database") as patch_database:
+            with self.assertRaises(delta.DeltaError):
+                delta.apply_delta(
+                    old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+                )
+
+        patch_database.assert_not_called()
+        self.assertEqual(self.read_rows(old_path, "spells"), expected_rows)
+
+    def test_interrupted_publish_is_completed(self):
+        old_path = self.release("old", "0.1.0")
+        self.change_sources()
+        self.write_source("monsters", "kobold", {"name": "Kobold"})
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+        backup_path = self.temp_path / "backup"
+        shutil.copytree(old_path, backup_path)
+        delta.apply_delta(
+            old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+        # only the spells were published before the interruption
+        for file_name in ("manifest.json", "monsters.sqlite"):
+            shutil.copy2(backup_path / file_name, old_path / file_name)
+
+        delta.apply_delta(
+            old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+
+        for table in ("spells", "monsters"):
+            self.assertEqual(
+                self.read_rows(old_path, table),
+                self.read_rows(new_path, table),
+            )
+        self.assertEqual(
+            self.load_manifest(old_path)["database_info"]["version"], "0.2.0"
+        )
+
+    def test_apply_delta_single_layout(self):
+        layout = builder.ReleaseLayout.SINGLE
+        old_path = self.release("old", "0.1.0", layout=layout)
+        self.change_sources()
+        new_path = self.release(
+            "new", "0.2.0", layout=layout, delta_from=old_path
+        )
+
+        delta.apply_delta(
+            old_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+
+        con = sqlite3.connect(old_path / "release.sqlite")
+        try:
+            names = [
+                row[0]
+                for row in con.execute("SELECT name FROM spells ORDER BY name")
+            ]
+            stored_manifest = json.loads(
+                con.execute(
+                    "SELECT value FROM dragon_metadata WHERE key = 'manifest'"
+                ).fetchone()[0]
+            )
+        finally:
+            con.close()
+        self.assertIn("Aid", names)
+        self.assertNotIn("Spell 5", names)
+        self.assertEqual(stored_manifest["database_info"]["version"], "0.2.0")
+
+    def test_release_without_delta_on_schema_change(self):
+        old_path = self.release("old", "0.1.0")
+        self.manifest["datasets"][1]["columns"].append(
+            {"name": "size", "type": "TEXT"}
+        )
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+
+        self.assertNotIn("delta", self.load_manifest(new_path))
+        self.assertFalse((new_path / delta.DELTA_FILE_NAME).exists())
+
+    def test_delta_from_output_path(self):
+        release_path = self.release("old", "0.1.0")
+        test_builder = builder.Builder(logger=self.logger)
+
+        with self.assertRaises(ValueError):
+            test_builder.set_config(
+                builder.BuilderConfig(
+                    self.source_path,
+                    release_path,
+                    None,
+                    db_manifest=self.manifest,
+                    delta_from=release_path,
+                )
+            )
+
+    def test_copied_release_is_patched(self):
+        old_path = self.release("old", "0.1.0")
+        copy_path = self.temp_path / "copy"
+        shutil.copytree(old_path, copy_path)
+        self.change_sources()
+        new_path = self.release("new", "0.2.0", delta_from=old_path)
+
+        delta.apply_delta(
+            copy_path, new_path / delta.DELTA_FILE_NAME, self.logger
+        )
+
+        self.assertEqual(
+            self.read_rows(copy_path, "spells"),
+            self.read_rows(new_path, "spells"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
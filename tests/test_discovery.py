@@ -0,0 +1,113 @@
+"""Tests for the discovery of source files"""
+
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from dragon_compiler import discovery
+
+
+class TestSourceDiscovery(unittest.TestCase):
+    """test scanning source folders"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.source_folder = Path(self.temp_dir.name)
+        for name in (
+            "b.jsonl",
+            "a.json",
+            "c.ndjson.gz",
+            "d.txt",
+            "e.gz",
+            "drafts/x.json",
+            "sub/z.json",
+            "sub/deeper/y.json",
+            "sub/notes.bak.json",
+        ):
+            path = self.source_folder / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"{}")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def find(self, source_discovery: discovery.SourceDiscovery) -> list[str]:
+        return [
+            p.relative_to(self.source_folder).as_posix()
+            for p in source_discovery.iter_files(self.source_folder)
+        ]
+
+    def test_source_files_are_sorted(self):
+        self.assertListEqual(
+            ["a.json", "b.jsonl", "c.ndjson.gz"],
+            self.find(discovery.SourceDiscovery()),
+        )
+
+    def test_recursive(self):
+        self.assertListEqual(
+            [
+                "a.json",
+                "b.jsonl",
+                "c.ndjson.gz",
+                "drafts/x.json",
+                "sub/deeper/y.json",
+                "sub/notes.bak.json",
+                "sub/z.json",
+            ],
+            self.find(discovery.SourceDiscovery(recursive=True)),
+        )
+
+    def test_patterns_from_manifest(self):
+        source_discovery = discovery.SourceDiscovery.from_manifest(
+            {
+                "recursive": True,
+                "include": ["**/*.json"],
+                "exclude": ["drafts/**", "**/*.bak.json"],
+            }
+        )
+
+        with patch.object(
+            source_discovery,
+            "_scan",
+            wraps=source_discovery._scan,  # pylint: disable=protected-access
+        ) as mock_scan:
+            files = self.find(source_discovery)
+
+        self.assertListEqual(
+            ["a.json", "sub/deeper/y.json", "sub/z.json"], files
+        )
+        scanned = [call.args[1].as_posix() for call in mock_scan.call_args_list]
+        self.assertNotIn("drafts", scanned)
+
+    def test_entries_have_relative_paths(self):
+        source_discovery = discovery.SourceDiscovery(
+            recursive=True, exclude=["drafts/**"]
+        )
+
+        entries = list(source_discovery.iter_entries(self.source_folder))
+
+        self.assertListEqual(
+            self.find(source_discovery), [rel_path for rel_path, _ in entries]
+        )
+        for rel_path, entry in entries:
+            self.assertEqual(
+                (self.source_folder / rel_path).as_posix(),
+                Path(entry.path).as_posix(),
+            )
+
+    def test_stat_result_is_kept(self):
+        files = list(discovery.SourceDiscovery().iter_files(self.source_folder))
+
+        with patch("os.stat") as mock_stat:
+            sizes = [file.stat().st_size for file in files]
+
+        mock_stat.assert_not_called()
+        self.assertListEqual([2, 2, 2], sizes)
+        self.assertEqual(files[0], pickle.loads(pickle.dumps(files[0])))
+
+
+if __name__ == "__main__":
+    unittest.main()
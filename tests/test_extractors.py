@@ -0,0 +1,132 @@
+"""Tests for the compiled column extractors"""
+
+import unittest
+from dragon_compiler import extractors
+from dragon_compiler.builder import split_json_path
+
+
+class TestExtractors(unittest.TestCase):
+    """test extracting and type checking column values"""
+
+    def compile(self, paths: list[str], types: list[str], type_check):
+        issues = []
+        extract = extractors.compile_extractor(
+            [split_json_path(path) for path in paths],
+            types,
+            type_check,
+            issues,
+            paths,
+        )
+        return extract, issues
+
+    def test_get_affinity(self):
+        for declared_type, affinity in (
+            ("INTEGER", extractors.Affinity.INTEGER),
+            ("bigint", extractors.Affinity.INTEGER),
+            ("VARCHAR(20)", extractors.Affinity.TEXT),
+            ("", extractors.Affinity.BLOB),
+            ("DOUBLE", extractors.Affinity.REAL),
+            ("DECIMAL(10,5)", extractors.Affinity.NUMERIC),
+        ):
+            with self.subTest(declared_type=declared_type):
+                self.assertEqual(
+                    affinity, extractors.get_affinity(declared_type)
+                )
+
+    def test_paths(self):
+        extract, _ = self.compile(
+            ["name", "range.distance", "classes[0]", "classes[-1]", "a.b"],
+            [],
+            extractors.TypeCheck.OFF,
+        )
+        document = {
+            "name": "Fireball",
+            "range": {"distance": "150"},
+            "classes": ["Sorcerer", "Wizard"],
+            "a": [1],
+        }
+
+        self.assertTupleEqual(
+            ("Fireball", "150", "Sorcerer", "Wizard", None, "{}"),
+            extract(document, "{}"),
+        )
+        self.assertTupleEqual(
+            (None, None, None, None, None, "{}"), extract([], "{}")
+        )
+
+    def test_lenient(self):
+        extract, issues = self.compile(
+            ["a", "b", "c", "d", "e"],
+            ["INTEGER", "REAL", "TEXT", "NUMERIC", "BLOB"],
+            extractors.TypeCheck.LENIENT,
+        )
+
+        self.assertTupleEqual(
+            (5, 1.0, "3", 2.5, 1, ""),
+            extract({"a": " 5", "b": 1, "c": 3, "d": "2.5", "e": True}, ""),
+        )
+        self.assertTupleEqual(
+            (3, 2.0, '["x"]', 7, '{"x":1}', ""),
+            extract(
+                {"a": 3.0, "b": "2", "c": ["x"], "d": "7", "e": {"x": 1}}, ""
+            ),
+        )
+        self.assertListEqual([], issues)
+        self.assertTupleEqual(
+            (None, None, "true", None, None, ""),
+            extract({"a": "five", "b": {}, "c": True, "d": "x"}, ""),
+        )
+        self.assertListEqual(
+            [
+                extractors.TypeIssue("a", "INTEGER", "'five'"),
+                extractors.TypeIssue("b", "REAL", "{}"),
+                extractors.TypeIssue("d", "NUMERIC", "'x'"),
+            ],
+            issues,
+        )
+
+    def test_strict(self):
+        extract, issues = self.compile(
+            ["a", "b", "c"],
+            ["INTEGER", "REAL", "TEXT"],
+            extractors.TypeCheck.STRICT,
+        )
+
+        self.assertTupleEqual(
+            (1, 2.0, "x", ""), extract({"a": 1, "b": 2, "c": "x"}, "")
+        )
+        self.assertListEqual([], issues)
+        self.assertTupleEqual(
+            (None, None, None, ""),
+            extract({"a": "1", "b": True, "c": 1}, ""),
+        )
+        self.assertListEqual(["a", "b", "c"], [i.column for i in issues])
+
+    def test_report(self):
+        report = extractors.TypeReport(
+            extractors.TypeCheck.LENIENT, max_examples=1
+        )
+        issue = extractors.TypeIssue("level", "INTEGER", "'one'")
+
+        report.add("a.json", [issue, issue])
+
+        self.assertDictEqual(
+            {
+                "mode": "lenient",
+                "count": 2,
+                "columns": {"level": 2},
+                "examples": [
+                    {
+                        "file": "a.json",
+                        "column": "level",
+                        "type": "INTEGER",
+                        "value": "'one'",
+                    }
+                ],
+            },
+            report.to_manifest(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
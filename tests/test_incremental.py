@@ -0,0 +1,123 @@
+"""Tests for the source index of incremental builds"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from dragon_compiler import incremental
+
+
+class TestSourceIndex(unittest.TestCase):
+    """test source index"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.source_folder = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name: str, content: str) -> Path:
+        path = self.source_folder / name
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def files(self) -> list[Path]:
+        return sorted(self.source_folder.glob("*.json"))
+
+    def test_new_files_are_added_in_path_order(self):
+        index = incremental.SourceIndex("hash")
+        b = self.write("b.json", "{}")
+        a = self.write("a.json", "{}")
+
+        changes = index.update(self.source_folder, reversed(self.files()))
+        row_ids = [index.new_row_id(f.name) for f in changes.added]
+
+        self.assertListEqual([a, b], changes.added)
+        self.assertListEqual([0, 1], row_ids)
+        self.assertEqual(2, index.next_id)
+
+    def test_touched_file_with_same_content_is_unchanged(self):
+        index = incremental.SourceIndex("hash")
+        a = self.write("a.json", "{}")
+        index.update(self.source_folder, self.files())
+        index.new_row_id("a.json")
+        os.utime(a, ns=(0, 0))
+
+        changes = index.update(self.source_folder, self.files())
+
+        self.assertFalse(changes.has_changes())
+        self.assertEqual(1, changes.unchanged)
+        self.assertEqual(0, index.entries["a.json"].mtime_ns)
+        self.assertListEqual([[0, 1]], index.entries["a.json"].row_ranges)
+
+    def test_changed_and_removed_files(self):
+        index = incremental.SourceIndex("hash")
+        a = self.write("a.json", "{}")
+        b = self.write("b.json", "{}")
+        index.update(self.source_folder, self.files())
+        for row_id in range(3):
+            index.new_row_id("a.json" if row_id != 1 else "b.json")
+        self.write("a.json", '{"name": "changed"}')
+        b.unlink()
+
+        changes = index.update(self.source_folder, self.files())
+
+        self.assertListEqual([a], changes.changed)
+        self.assertListEqual([0, 2, 1], changes.obsolete_ids)
+        self.assertListEqual(["a.json"], list(index.entries))
+
+    def test_changed_file_reuses_row_ids(self):
+        index = incremental.SourceIndex("hash")
+        self.write("a.json", "{}")
+        index.update(self.source_folder, self.files())
+        index.new_row_id("a.json")
+        index.new_row_id("a.json")
+        self.write("a.json", "[{}, {}, {}]")
+
+        index.update(self.source_folder, self.files())
+        row_ids = [index.new_row_id("a.json") for _ in range(3)]
+
+        self.assertListEqual([0, 1, 2], row_ids)
+        self.assertListEqual([[0, 3]], index.entries["a.json"].row_ranges)
+        self.assertEqual(3, index.get_row_count())
+
+    def test_update_given_files(self):
+        index = incremental.SourceIndex("hash")
+        a = self.write("a.json", "{}")
+        b = self.write("b.json", "{}")
+        index.update(self.source_folder, self.files())
+        index.new_row_id("a.json")
+        index.new_row_id("b.json")
+        self.write("a.json", '{"name": "changed"}')
+        b.unlink()
+        c = self.write("c.json", "{}")
+        self.write("d.json", '{"name": "not given"}')
+
+        changes = index.update_files(
+            self.source_folder, ["c.json", "b.json", "a.json", "x.json"]
+        )
+
+        self.assertListEqual([a], changes.changed)
+        self.assertListEqual([c], changes.added)
+        self.assertListEqual([0, 1], changes.obsolete_ids)
+        self.assertListEqual(["a.json", "c.json"], sorted(index.entries))
+        self.assertEqual(0, index.new_row_id("a.json"))
+        self.assertEqual(2, index.new_row_id("c.json"))
+
+    def test_save_and_load(self):
+        index = incremental.SourceIndex("hash")
+        self.write("a.json", "{}")
+        index.update(self.source_folder, self.files())
+        index_path = self.source_folder / "spells.index.json"
+
+        index.save(index_path)
+
+        self.assertEqual(index, incremental.SourceIndex.load(index_path))
+
+    def test_load_invalid_index(self):
+        index_path = self.write("spells.index.json", "{}")
+
+        self.assertIsNone(incremental.SourceIndex.load(index_path))
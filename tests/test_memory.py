@@ -0,0 +1,70 @@
+"""Tests for the memory budget of a build"""
+
+import unittest
+from unittest.mock import patch
+from dragon_compiler import memory
+
+
+class TestRowBatcher(unittest.TestCase):
+    """test grouping of rows into insert batches"""
+
+    def get_batches(self, batcher: memory.RowBatcher, rows: list[tuple]):
+        return [
+            ([row[0] for row in batch], is_oversized)
+            for batch, is_oversized in batcher.iter_batches(rows)
+        ]
+
+    def test_batches_by_count(self):
+        batcher = memory.RowBatcher(batch_size=2)
+        rows = [(idx, "x") for idx in range(5)]
+
+        self.assertListEqual(
+            [([0, 1], False), ([2, 3], False), ([4], False)],
+            self.get_batches(batcher, rows),
+        )
+
+    def test_batches_by_size(self):
+        batcher = memory.RowBatcher(
+            batch_size=100, max_batch_bytes=10, max_row_bytes=8
+        )
+        rows = [(0, "x" * 4), (1, "x" * 4), (2, "x" * 9), (3, "x" * 4)]
+        rows += [(4, "x" * 4), (5, "x" * 4)]
+
+        self.assertListEqual(
+            [([2], True), ([0, 1], False), ([3, 4], False), ([5], False)],
+            self.get_batches(batcher, rows),
+        )
+
+    def test_batches_shrink_above_the_limit(self):
+        batcher = memory.RowBatcher(
+            batch_size=100, max_batch_bytes=2**22, limit_mib=100
+        )
+        rows = [(idx, "x" * 2**20) for idx in range(12)]
+
+        with (
+            patch(
+                "dragon_compiler.memory.get_current_rss_mib", return_value=200
+            ),
+            self.assertLogs("dragon_compiler.memory", "WARNING") as logs,
+        ):
+            batches = self.get_batches(batcher, rows)
+
+        self.assertListEqual(
+            [4, 2, 1, 1, 1, 1, 1, 1], [len(ids) for ids, _ in batches]
+        )
+        self.assertEqual(3, len(logs.output))
+        self.assertIn("can not be kept", logs.output[-1])
+
+
+class TestUtf8Chunks(unittest.TestCase):
+    """test chunked encoding of large texts"""
+
+    def test_chunks(self):
+        text = "Drache ß " * 1000
+        with patch("dragon_compiler.memory.STREAM_CHUNK_CHARS", 7):
+            chunks = list(memory.iter_utf8_chunks(text))
+
+        self.assertEqual(text.encode("utf-8"), b"".join(chunks))
+        self.assertEqual(
+            len(text.encode("utf-8")), memory.get_utf8_length(text)
+        )
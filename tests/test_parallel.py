@@ -0,0 +1,61 @@
+"""Tests for the ordered parallel processing"""
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import time
+from dragon_compiler import parallel
+
+
+def slow_square(values: list[int]) -> list[int]:
+    # later chunks finish first to make sure the order is restored
+    time.sleep(0.01 * (10 - values[0] % 10))
+    return [v * v for v in values]
+
+
+def fail_on_three(values: list[int]) -> list[int]:
+    if 3 in values:
+        raise ValueError("three")
+    return values
+
+
+class TestOrderedTaskQueue(unittest.TestCase):
+    """test ordered task queue"""
+
+    def test_results_keep_submission_order(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            task_queue = parallel.OrderedTaskQueue(
+                executor, slow_square, chunk_size=1, max_pending=4
+            )
+            result = list(task_queue.map(range(20)))
+
+        self.assertListEqual([v * v for v in range(20)], result)
+
+    def test_resolved_items_keep_their_position(self):
+        items = [1, 2, parallel.Resolved(["a", "b"]), 3, parallel.Resolved([])]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            task_queue = parallel.OrderedTaskQueue(
+                executor, slow_square, chunk_size=2, max_pending=2
+            )
+            result = list(task_queue.map(items + [4]))
+
+        self.assertListEqual([1, 4, "a", "b", 9, 16], result)
+
+    def test_worker_errors_are_raised(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            task_queue = parallel.OrderedTaskQueue(
+                executor, fail_on_three, chunk_size=2, max_pending=2
+            )
+            with self.assertRaises(ValueError):
+                list(task_queue.map(range(10)))
+
+    def test_source_errors_are_raised(self):
+        def broken_source():
+            yield 1
+            raise OSError("directory vanished")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            task_queue = parallel.OrderedTaskQueue(
+                executor, fail_on_three, chunk_size=1, max_pending=2
+            )
+            with self.assertRaises(OSError):
+                list(task_queue.map(broken_source()))
@@ -0,0 +1,61 @@
+"""Tests for the build profiling"""
+
+import unittest
+from dragon_compiler import profiling
+
+
+class TestBuildProfiler(unittest.TestCase):
+    """test stage timings and counters"""
+
+    def test_stages_and_counters_are_accumulated(self):
+        profiler = profiling.BuildProfiler()
+        for _ in range(3):
+            with profiler.stage("insert"):
+                pass
+        profiler.add("rows", 2)
+        profiler.add("rows", 3)
+
+        self.assertEqual(3, profiler.stages["insert"].calls)
+        self.assertGreaterEqual(profiler.stages["insert"].seconds, 0)
+        self.assertEqual(5, profiler.counters["rows"])
+
+    def test_wrap_and_iter_keep_results(self):
+        profiler = profiling.BuildProfiler()
+        double = profiler.wrap("double", lambda value: 2 * value)
+
+        result = [double(v) for v in profiler.iter("read", range(4))]
+
+        self.assertListEqual([0, 2, 4, 6], result)
+        self.assertEqual(4, profiler.stages["double"].calls)
+        self.assertEqual(4, profiler.stages["read"].calls)
+
+    def test_merge(self):
+        profiler = profiling.BuildProfiler()
+        other = profiling.BuildProfiler()
+        profiler.add_time("insert", 1.0)
+        other.add_time("insert", 2.0, calls=2)
+        other.add("rows", 7)
+
+        profiler.merge(other)
+
+        self.assertEqual(3.0, profiler.stages["insert"].seconds)
+        self.assertEqual(3, profiler.stages["insert"].calls)
+        self.assertDictEqual({"rows": 7}, profiler.to_dict()["counters"])
+
+    def test_null_profiler_records_nothing(self):
+        profiler = profiling.NullProfiler()
+        items = [1, 2]
+        func = len
+
+        with profiler.stage("insert"):
+            profiler.add("rows")
+
+        self.assertIs(items, profiler.iter("read", items))
+        self.assertIs(func, profiler.wrap("decode", func))
+        self.assertDictEqual({}, profiler.stages)
+        self.assertDictEqual({}, profiler.counters)
+
+    def test_peak_rss(self):
+        peak_rss_mib = profiling.get_peak_rss_mib()
+        if peak_rss_mib is not None:
+            self.assertGreater(peak_rss_mib, 1)
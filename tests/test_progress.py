@@ -0,0 +1,72 @@
+"""Tests for the progress reports of a dataset build"""
+
+import logging
+import unittest
+from unittest.mock import MagicMock
+from pathlib import Path
+from dragon_compiler import progress
+
+
+class TestProgressReporter(unittest.TestCase):
+    """test progress reports"""
+
+    def setUp(self):
+        self.logger = MagicMock()
+        self.logger.isEnabledFor.return_value = True
+
+    def test_report_every_n_rows(self):
+        reporter = progress.ProgressReporter(
+            self.logger, "spells", interval_seconds=0, interval_rows=10
+        )
+        reporter.total_files = 4
+        files = list(reporter.track_files(Path(f"{i}.json") for i in range(2)))
+
+        for _ in range(4):
+            reporter.update(5)
+
+        self.assertEqual(2, len(files))
+        self.assertEqual(20, reporter.rows)
+        self.assertEqual(2, self.logger.info.call_count)
+        args = self.logger.info.call_args.args
+        self.assertEqual(("spells", 20, 2, 4, 50.0), args[1:6])
+
+    def test_report_without_total_files(self):
+        reporter = progress.ProgressReporter(
+            self.logger, "spells", interval_seconds=0, interval_rows=1
+        )
+
+        reporter.update(3)
+
+        self.assertEqual(
+            "%s: %d rows, %d files, %.0f rows/s",
+            self.logger.info.call_args.args[0],
+        )
+
+    def test_total_files_known_after_discovery(self):
+        reporter = progress.ProgressReporter(
+            self.logger, "spells", interval_seconds=0, interval_rows=1
+        )
+        files = reporter.track_files(Path(f"{i}.json") for i in range(3))
+
+        next(files)
+        self.assertIsNone(reporter.total_files)
+        list(files)
+        reporter.update(3)
+
+        self.assertEqual(3, reporter.total_files)
+        args = self.logger.info.call_args.args
+        self.assertEqual(("spells", 3, 3, 3, 100.0), args[1:6])
+
+    def test_reports_are_disabled(self):
+        self.logger.isEnabledFor.return_value = False
+        reporter = progress.ProgressReporter(
+            self.logger, "spells", interval_seconds=0, interval_rows=1
+        )
+        files = [Path("a.json")]
+
+        self.assertIs(files, reporter.track_files(files))
+        reporter.update(10)
+
+        self.assertEqual(10, reporter.rows)
+        self.logger.isEnabledFor.assert_called_once_with(logging.INFO)
+        self.logger.info.assert_not_called()
@@ -0,0 +1,92 @@
+"""Tests for the atomic publishing of build results"""
+
+import json
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from dragon_compiler import publish
+
+
+class TestPublish(unittest.TestCase):
+    """test publishing of databases and json files"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.folder = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_database(self, path: Path, deleted_rows: int):
+        con = sqlite3.connect(path)
+        con.execute("CREATE TABLE spells (id INTEGER PRIMARY KEY, rest TEXT)")
+        con.executemany(
+            "INSERT INTO spells VALUES(?, ?)",
+            [(idx, "x" * 1000) for idx in range(100)],
+        )
+        con.execute("DELETE FROM spells WHERE id < ?", (deleted_rows,))
+        con.commit()
+        con.close()
+
+    def test_publish_database(self):
+        for deleted_rows, exp_compacted in ((0, False), (50, True)):
+            with self.subTest(deleted_rows=deleted_rows):
+                db_path = self.folder / "spells.sqlite"
+                build_path = publish.get_build_path(db_path)
+                self.create_database(build_path, deleted_rows)
+
+                compacted = publish.publish_database(build_path, db_path)
+
+                con = sqlite3.connect(db_path)
+                count = con.execute("SELECT COUNT(*) FROM spells").fetchone()
+                free_pages = con.execute("PRAGMA freelist_count").fetchone()
+                con.close()
+                self.assertEqual(exp_compacted, compacted)
+                self.assertEqual(100 - deleted_rows, count[0])
+                self.assertEqual(0, free_pages[0])
+                self.assertListEqual(
+                    [], list(publish.iter_temp_files(self.folder))
+                )
+                self.assertListEqual(
+                    ["spells.sqlite"], [p.name for p in self.folder.iterdir()]
+                )
+
+    def test_write_json(self):
+        path = self.folder / "manifest.json"
+
+        publish.write_json(path, {"name": "spells"})
+
+        with path.open("r", encoding="utf-8") as f:
+            self.assertDictEqual({"name": "spells"}, json.load(f))
+        self.assertListEqual(
+            ["manifest.json"], [p.name for p in self.folder.iterdir()]
+        )
+
+    def test_link_and_unshare_file(self):
+        src = self.folder / "previous.sqlite"
+        dst = self.folder / "spells.sqlite"
+        src.write_bytes(b"previous")
+        dst.write_bytes(b"old")
+
+        self.assertTrue(publish.link_file(src, dst))
+        self.assertTrue(dst.samefile(src))
+
+        self.assertTrue(publish.unshare_file(dst))
+        self.assertFalse(dst.samefile(src))
+        self.assertEqual(b"previous", dst.read_bytes())
+        self.assertFalse(publish.unshare_file(dst))
+
+    def test_link_file_copies_without_hardlinks(self):
+        src = self.folder / "previous.sqlite"
+        dst = self.folder / "spells.sqlite"
+        src.write_bytes(b"previous")
+
+        with patch("os.link", side_effect=OSError("not supported")):
+            self.assertFalse(publish.link_file(src, dst))
+
+        self.assertFalse(dst.samefile(src))
+        self.assertEqual(b"previous", dst.read_bytes())
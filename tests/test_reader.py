@@ -0,0 +1,246 @@
+"""Tests for reading releases"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import json
+import logging
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from dragon_compiler import builder, reader
+
+
+class TestReader(unittest.TestCase):
+    """test lookups in a release through its manifest"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.source_path = Path(self.temp_dir.name) / "source"
+        self.release_path = Path(self.temp_dir.name) / "release"
+        self.manifest = {
+            "database_info": {"name": "test", "version": "0.1.0"},
+            "datasets": [
+                {
+                    "name": "spells",
+                    "source": "spells",
+                    "columns": [
+                        {"name": "name", "type": "TEXT", "index": "unique"},
+                        {"name": "level", "type": "INTEGER", "index": True},
+                    ],
+                    "indexes": [{"columns": [{"path": "casting_time.unit"}]}],
+                    "fts": {"columns": ["name"]},
+                },
+                {
+                    "name": "monsters",
+                    "source": "monsters",
+                    "columns": [{"name": "name", "type": "TEXT"}],
+                    "rest_format": "jsonb",
+                },
+            ],
+        }
+        (self.source_path / "spells").mkdir(parents=True)
+        (self.source_path / "monsters").mkdir()
+        for idx in range(20):
+            self.write_source(
+                "spells",
+                f"spell{idx:02d}",
+                {
+                    "name": f"Spell {idx}",
+                    "level": idx % 3,
+                    "casting_time": {"unit": "minute" if idx else "action"},
+                },
+            )
+        self.write_source(
+            "monsters",
+            "owlbear",
+            {"name": "Owlbear", "lore": {"cr": 3}, "attacks": ["beak", "claw"]},
+        )
+        self.logger = logging.getLogger("test_reader")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_source(self, dataset: str, name: str, document: dict):
+        path = self.source_path / dataset / f"{name}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(document, f)
+
+    def release(self, **config_options):
+        test_builder = builder.Builder(logger=self.logger)
+        test_builder.set_config(
+            builder.BuilderConfig(
+                self.source_path,
+                self.release_path,
+                None,
+                db_manifest=self.manifest,
+                **config_options,
+            )
+        )
+        test_builder.build()
+        test_builder.package_release(datetime.now(timezone.utc))
+
+    def test_default_limit(self):
+        for idx in range(20, 25):
+            self.write_source(
+                "spells",
+                f"spell{idx:02d}",
+                {"name": f"Spell {idx}", "casting_time": {"unit": "minute"}},
+            )
+        self.release()
+
+        with reader.ReleaseReader(self.release_path) as release:
+            spells = release["spells"]
+            self.assertEqual(
+                reader.DEFAULT_LIMIT,
+                len(spells.find_path("casting_time.unit", "minute")),
+            )
+            self.assertEqual(
+                24,
+                len(spells.find_path("casting_time.unit", "minute", limit=-1)),
+            )
+
+    def test_lookups(self):
+        self.release()
+
+        with reader.ReleaseReader(self.release_path) as release:
+            spells = release["spells"]
+            row = spells.get(3)
+            self.assertEqual("Spell 3", row["name"])
+            self.assertEqual(3, row.id)
+            self.assertEqual("minute", row.get_path("casting_time.unit"))
+            self.assertListEqual(
+                ["id", "name", "level", "rest"], list(row.keys())
+            )
+            self.assertIsNone(spells.get(100))
+            self.assertListEqual(
+                [0, 3, 6],
+                [r.id for r in spells.find("level", 0, limit=3)],
+            )
+            self.assertListEqual(
+                ["Spell 0"],
+                [
+                    r["name"]
+                    for r in spells.find_path("casting_time.unit", "action")
+                ],
+            )
+            self.assertListEqual(
+                ["Spell 7"], [r["name"] for r in spells.search("7")]
+            )
+            self.assertEqual(20, spells.count())
+            self.assertListEqual(
+                ["spells", "monsters"], release.get_dataset_names()
+            )
+
+    def test_document_is_decoded_lazily(self):
+        self.release()
+
+        with reader.ReleaseReader(self.release_path) as release:
+            row = release["spells"].find("name", "Spell 1")[0]
+            decoder = row._decoder  # pylint: disable=protected-access
+            with patch.object(decoder, "loads", wraps=decoder.loads) as loads:
+                self.assertEqual(1, row["level"])
+                loads.assert_not_called()
+                self.assertEqual("Spell 1", row.document["name"])
+                self.assertEqual("Spell 1", row.document["name"])
+                loads.assert_called_once()
+
+    def test_jsonb_rest(self):
+        self.release()
+
+        with reader.ReleaseReader(self.release_path) as release:
+            (row,) = release["monsters"].find_path("lore.cr", 3)
+            self.assertDictEqual(
+                {
+                    "name": "Owlbear",
+                    "lore": {"cr": 3},
+                    "attacks": ["beak", "claw"],
+                },
+                row.document,
+            )
+
+    def test_array_paths(self):
+        self.release()
+
+        with reader.ReleaseReader(self.release_path) as release:
+            for path in ("attacks[1]", "$.attacks[1]"):
+                with self.subTest(path=path):
+                    (row,) = release["monsters"].find_path(path, "claw")
+                    self.assertEqual("claw", row.get_path(path))
+            self.assertIsNone(row.get_path("attacks[2]"))
+            self.assertIsNone(row.get_path("lore[0]"))
+            self.assertEqual(3, row.get_path("$.lore.cr"))
+
+    def test_single_layout(self):
+        self.release(layout=builder.ReleaseLayout.SINGLE)
+
+        with reader.ReleaseReader(self.release_path) as release:
+            pools = release._pools  # pylint: disable=protected-access
+            self.assertEqual(1, len(pools))
+            self.assertEqual("Owlbear", release["monsters"].get(0)["name"])
+            self.assertEqual("Spell 0", release["spells"].get(0)["name"])
+
+    def test_concurrent_lookups(self):
+        self.release()
+
+        with reader.ReleaseReader(self.release_path, pool_size=2) as release:
+            spells = release["spells"]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                names = list(
+                    executor.map(
+                        lambda idx: spells.get(idx % 20)["name"], range(400)
+                    )
+                )
+            self.assertListEqual(
+                [f"Spell {idx % 20}" for idx in range(400)], names
+            )
+            pool = release._pools[  # pylint: disable=protected-access
+                self.release_path / "spells.sqlite"
+            ]
+            connections = pool._connections  # pylint: disable=protected-access
+            self.assertLessEqual(len(connections), 2)
+
+    def test_invalid_lookups(self):
+        self.release()
+
+        with reader.ReleaseReader(self.release_path) as release:
+            with self.assertRaises(KeyError):
+                release["dragons"]  # pylint: disable=pointless-statement
+            with self.assertRaises(ValueError):
+                release["spells"].find("name; DROP TABLE spells", 1)
+            with self.assertRaises(ValueError):
+                release["monsters"].search("Owlbear")
+
+    def test_connections_are_read_only(self):
+        self.release()
+        pool = reader.ConnectionPool(self.release_path / "spells.sqlite")
+        try:
+            with pool.connection() as con:
+                with self.assertRaises(sqlite3.OperationalError):
+                    con.execute("DELETE FROM spells")
+        finally:
+            pool.close()
+
+    def test_pool_timeout(self):
+        self.release()
+        pool = reader.ConnectionPool(
+            self.release_path / "spells.sqlite", size=1, timeout=0.01
+        )
+        try:
+            with pool.connection():
+                with self.assertRaises(TimeoutError):
+                    with pool.connection():
+                        pass
+            with pool.connection() as con:
+                self.assertEqual(
+                    20, con.execute("SELECT COUNT(*) FROM spells").fetchone()[0]
+                )
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Tests for reading source files"""
+
+import gzip
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from dragon_compiler import sources
+
+
+class TestIterRecords(unittest.TestCase):
+    """test iter records"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.source_folder = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name: str, content: bytes) -> Path:
+        path = self.source_folder / name
+        path.write_bytes(content)
+        return path
+
+    def test_single_document(self):
+        path = self.write("spell.json", b'{"name": "[tricky, {name}"}')
+
+        self.assertListEqual(
+            [b'{"name": "[tricky, {name}"}'], list(sources.iter_records(path))
+        )
+
+    def test_json_lines(self):
+        path = self.write("spells.jsonl", b'{"a": 1}\n\n  {"a": 2}\r\n')
+
+        self.assertListEqual(
+            [b'{"a": 1}', b'{"a": 2}'], list(sources.iter_records(path))
+        )
+
+    def test_gzip_compressed_json_lines(self):
+        path = self.write(
+            "spells.ndjson.gz", gzip.compress(b'{"a": 1}\n{"a": 2}\n')
+        )
+
+        self.assertListEqual(
+            [b'{"a": 1}', b'{"a": 2}'], list(sources.iter_records(path))
+        )
+
+    def test_array_of_objects(self):
+        documents = [
+            {"name": 'quote " and ] bracket', "list": [1, [2, {"x": "}"}]]},
+            {"name": "back\\slash\\", "empty": {}},
+            {},
+        ]
+        path = self.write("spells.json", json.dumps(documents).encode())
+
+        records = list(sources.iter_records(path))
+
+        self.assertListEqual(documents, [json.loads(r) for r in records])
+
+    def test_array_is_read_in_chunks(self):
+        documents = [
+            {"name": f"spell {idx}", "text": "x" * idx} for idx in range(50)
+        ]
+        path = self.write(
+            "spells.json", json.dumps(documents, indent=2).encode()
+        )
+
+        with patch("dragon_compiler.sources.READ_CHUNK_SIZE", 7):
+            records = list(sources.iter_records(path))
+
+        self.assertListEqual(documents, [json.loads(r) for r in records])
+
+    def test_unclosed_array(self):
+        path = self.write("spells.json", b'[{"a": 1}, {"a": 2}')
+
+        with self.assertRaises(sources.SourceFormatError):
+            list(sources.iter_records(path))
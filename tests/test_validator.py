@@ -0,0 +1,210 @@
+"""Tests for the validation of releases"""
+
+from datetime import datetime, timezone
+import json
+import logging
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from dragon_compiler import builder, validator
+
+
+class TestValidator(unittest.TestCase):
+    """test validating a release against its manifest"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.source_path = Path(self.temp_dir.name) / "source"
+        self.release_path = Path(self.temp_dir.name) / "release"
+        self.manifest = {
+            "database_info": {"name": "test", "version": "0.1.0"},
+            "datasets": [
+                {
+                    "name": "spells",
+                    "source": "spells",
+                    "columns": [
+                        {"name": "name", "type": "TEXT", "index": "unique"},
+                        {"name": "level", "type": "INTEGER"},
+                    ],
+                    "fts": {"columns": ["name"]},
+                },
+                {
+                    "name": "monsters",
+                    "source": "monsters",
+                    "columns": [{"name": "name", "type": "TEXT"}],
+                },
+            ],
+        }
+        (self.source_path / "spells").mkdir(parents=True)
+        (self.source_path / "monsters").mkdir()
+        with (self.source_path / "manifest.json").open(
+            "w", encoding="utf-8"
+        ) as f:
+            json.dump(self.manifest, f)
+        for idx in range(20):
+            self.write_source(
+                "spells", f"spell{idx}", {"name": f"Spell {idx}", "level": idx}
+            )
+        self.write_source("monsters", "owlbear", {"name": "Owlbear"})
+        self.logger = logging.getLogger("test_validator")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_source(self, dataset: str, name: str, document: dict):
+        path = self.source_path / dataset / f"{name}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(document, f)
+
+    def release(self, **config_options):
+        test_builder = builder.Builder(logger=self.logger)
+        test_builder.set_config(
+            builder.BuilderConfig(
+                self.source_path,
+                self.release_path,
+                None,
+                db_manifest=self.manifest,
+                **config_options,
+            )
+        )
+        test_builder.build()
+        test_builder.package_release(datetime.now(timezone.utc))
+
+    def validate(self, **config_options) -> validator.ValidationReport:
+        return validator.Validator(self.logger).validate(
+            validator.ValidatorConfig(
+                self.release_path, self.source_path, **config_options
+            )
+        )
+
+    def get_failed_checks(self, report: validator.ValidationReport):
+        return [
+            (result.dataset, result.check) for result in report.get_failures()
+        ]
+
+    def test_valid_release(self):
+        for layout in builder.ReleaseLayout:
+            shutil.rmtree(self.release_path, ignore_errors=True)
+            self.release(layout=layout)
+            for options in (
+                {"jobs": 2},
+                {"sample_size": 5},
+                {"integrity_check": validator.IntegrityCheck.FULL},
+                {"integrity_check": validator.IntegrityCheck.OFF},
+            ):
+                with self.subTest(layout=layout, **options):
+                    report = self.validate(**options)
+
+                    self.assertTrue(report.is_valid(), report.get_failures())
+                    self.assertTrue(report.to_dict()["valid"])
+                    self.assertSetEqual(
+                        {"release", "spells", "monsters"},
+                        {result.dataset for result in report.results},
+                    )
+
+    def test_missing_manifest(self):
+        report = self.validate()
+
+        self.assertFalse(report.is_valid())
+        self.assertListEqual(
+            [("release", "manifest")], self.get_failed_checks(report)
+        )
+
+    def test_invalid_source_manifest(self):
+        self.release()
+        for content in ("{", '{"datasets": [{"name": "spells"}]}'):
+            with self.subTest(content=content):
+                (self.source_path / "manifest.json").write_text(
+                    content, encoding="utf-8"
+                )
+
+                report = self.validate()
+
+                self.assertListEqual(
+                    [("source", "manifest")], self.get_failed_checks(report)
+                )
+
+        (self.source_path / "manifest.json").unlink()
+        self.assertListEqual(
+            [("source", "manifest")], self.get_failed_checks(self.validate())
+        )
+
+    def test_missing_database(self):
+        self.release()
+        (self.release_path / "monsters.sqlite").unlink()
+
+        report = self.validate()
+
+        self.assertListEqual(
+            [("monsters", "database")], self.get_failed_checks(report)
+        )
+
+    def test_row_count_differs_from_sources(self):
+        self.release()
+        self.write_source("monsters", "dragon", {"name": "Dragon"})
+
+        report = self.validate()
+
+        self.assertListEqual(
+            [("monsters", "row count")], self.get_failed_checks(report)
+        )
+
+    def test_broken_release(self):
+        self.release()
+        con = sqlite3.connect(self.release_path / "spells.sqlite")
+        con.execute("UPDATE spells SET rest = '{' WHERE id = 3")
+        con.execute("DROP INDEX spells_idx0")
+        con.execute("ALTER TABLE spells ADD COLUMN school TEXT")
+        con.commit()
+        con.close()
+
+        report = self.validate()
+
+        self.assertListEqual(
+            [("spells", "schema")], self.get_failed_checks(report)
+        )
+
+        with (self.release_path / "manifest.json").open(
+            "r", encoding="utf-8"
+        ) as f:
+            manifest = json.load(f)
+        manifest["datasets"]["spells"]["columns"].append(
+            {"name": "school", "type": "TEXT"}
+        )
+        with (self.release_path / "manifest.json").open(
+            "w", encoding="utf-8"
+        ) as f:
+            json.dump(manifest, f)
+
+        report = self.validate()
+
+        self.assertListEqual(
+            [("spells", "indexes"), ("spells", "json")],
+            self.get_failed_checks(report),
+        )
+        self.assertIn("[3]", report.get_failures()[1].message)
+
+    def test_sampled_json_check(self):
+        self.release()
+        con = sqlite3.connect(self.release_path / "spells.sqlite")
+        con.execute("UPDATE spells SET rest = '{'")
+        con.commit()
+        con.close()
+
+        report = self.validate(sample_size=3)
+
+        failures = report.get_failures()
+        self.assertListEqual(
+            [("spells", "json")], self.get_failed_checks(report)
+        )
+        self.assertLessEqual(
+            len(json.loads(failures[0].message.split("with id ")[1])), 3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,277 @@
+"""Tests for watch mode"""
+
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from dragon_compiler import builder, discovery, watch
+
+
+class TestSourceWatcher(unittest.TestCase):
+    """test polling source folders for changes"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.source_folder = Path(self.temp_dir.name) / "spells"
+        self.monsters_folder = Path(self.temp_dir.name) / "monsters"
+        (self.source_folder / "drafts").mkdir(parents=True)
+        for name in ("a.json", "b.json", "drafts/c.json"):
+            (self.source_folder / name).write_text("{}", encoding="utf-8")
+        self.watcher = watch.SourceWatcher(
+            {
+                "spells": (
+                    self.source_folder,
+                    discovery.SourceDiscovery(
+                        recursive=True, exclude=["drafts/**"]
+                    ),
+                ),
+                "monsters": (
+                    self.monsters_folder,
+                    discovery.SourceDiscovery(),
+                ),
+            }
+        )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_poll(self):
+        self.assertDictEqual({}, self.watcher.poll())
+        (self.source_folder / "a.json").write_text(
+            '{"name": "A"}', encoding="utf-8"
+        )
+        (self.source_folder / "b.json").unlink()
+        (self.source_folder / "d.json").write_text("{}", encoding="utf-8")
+        (self.source_folder / "drafts" / "c.json").write_text(
+            '{"name": "C"}', encoding="utf-8"
+        )
+        (self.source_folder / "notes.txt").write_text("", encoding="utf-8")
+
+        self.assertDictEqual(
+            {"spells": {"a.json", "b.json", "d.json"}}, self.watcher.poll()
+        )
+        self.assertDictEqual({}, self.watcher.poll())
+
+    def test_created_source_folder(self):
+        self.monsters_folder.mkdir()
+        (self.monsters_folder / "owlbear.json").write_text(
+            "{}", encoding="utf-8"
+        )
+
+        self.assertDictEqual(
+            {"monsters": {"owlbear.json"}}, self.watcher.poll()
+        )
+
+
+class TestWatch(unittest.TestCase):
+    """test applying changed source files to the databases"""
+
+    def setUp(self):
+        self.temp_dir = (
+            tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        )
+        self.source_path = Path(self.temp_dir.name) / "source"
+        self.out_path = Path(self.temp_dir.name) / "build"
+        self.manifest = {
+            "database_info": {"name": "test", "version": "0.1.0"},
+            "datasets": [
+                {
+                    "name": "spells",
+                    "source": "spells",
+                    "columns": [
+                        {"name": "name", "type": "TEXT", "index": "unique"},
+                        {"name": "level", "type": "INTEGER"},
+                    ],
+                    "fts": {"columns": ["name", "description"]},
+                },
+                {
+                    "name": "monsters",
+                    "source": "monsters",
+                    "columns": [{"name": "name", "type": "TEXT"}],
+                },
+            ],
+        }
+        (self.source_path / "spells").mkdir(parents=True)
+        (self.source_path / "monsters").mkdir()
+        for idx in range(10):
+            self.write_spell(idx, f"Spell {idx}", f"text {idx}")
+        self.logger = logging.getLogger("test_watch")
+        self.builder = self.create_builder()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_builder(self, **config_options) -> builder.Builder:
+        test_builder = builder.Builder(logger=self.logger)
+        test_builder.set_config(
+            builder.BuilderConfig(
+                self.source_path,
+                self.out_path,
+                None,
+                db_manifest=self.manifest,
+                **({"incremental": True} | config_options),
+            )
+        )
+        return test_builder
+
+    def write_spell(self, idx: int, name: str, description: str):
+        path = self.source_path / "spells" / f"spell{idx}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(
+                {"name": name, "level": idx, "description": description}, f
+            )
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        con = sqlite3.connect(self.out_path / "spells.sqlite")
+        try:
+            return con.execute(sql, params).fetchall()
+        finally:
+            con.close()
+
+    def search(self, text: str) -> list[str]:
+        return [
+            row[0]
+            for row in self.query(
+                "SELECT name FROM spells WHERE id IN (SELECT rowid FROM "
+                "spells_fts WHERE spells_fts MATCH ?) ORDER BY name",
+                (text,),
+            )
+        ]
+
+    def test_update_dataset(self):
+        self.builder.build()
+        self.write_spell(3, "Spell 3", "changed")
+        self.write_spell(10, "Spell 10", "added")
+        (self.source_path / "spells" / "spell5.json").unlink()
+
+        stats = self.builder.update_dataset(
+            "spells", {"spell3.json", "spell10.json", "spell5.json"}
+        )
+
+        self.assertEqual(10, stats.rows)
+        self.assertEqual(["Spell 3"], self.search("changed"))
+        self.assertEqual(["Spell 10"], self.search("added"))
+        self.assertEqual([], self.search("5"))
+        self.assertEqual([], self.search('"text 3"'))
+        self.query(
+            "INSERT INTO spells_fts(spells_fts, rank) "
+            "VALUES('integrity-check', 1)"
+        )
+        updated_rows = self.query(
+            "SELECT name, level, rest FROM spells ORDER BY name"
+        )
+        # a full build of the changed sources has the same rows, the ids
+        # of an incremental build are kept instead of reassigned
+        full_builder = self.create_builder(incremental=False)
+        full_builder.clean_up_out_folder()
+        full_builder.build()
+        self.assertListEqual(
+            updated_rows,
+            self.query("SELECT name, level, rest FROM spells ORDER BY name"),
+        )
+
+    def test_failed_update_is_rolled_back(self):
+        self.builder.build()
+        self.write_spell(3, "Spell 3", "changed")
+        (self.source_path / "spells" / "spell4.json").write_text(
+            "{broken", encoding="utf-8"
+        )
+        rows = self.query("SELECT * FROM spells ORDER BY id")
+
+        with self.assertRaises(ValueError):
+            self.builder.update_dataset(
+                "spells", {"spell3.json", "spell4.json"}
+            )
+
+        self.assertListEqual(
+            rows, self.query("SELECT * FROM spells ORDER BY id")
+        )
+        self.write_spell(4, "Spell 4", "fixed")
+        with patch.object(
+            self.builder,
+            "_build_dataset",
+            wraps=self.builder._build_dataset,  # pylint: disable=protected-access
+        ) as build_dataset:
+            self.builder.update_dataset(
+                "spells", {"spell3.json", "spell4.json"}
+            )
+        build_dataset.assert_not_called()
+        self.assertEqual(["Spell 3"], self.search("changed"))
+        self.assertEqual(["Spell 4"], self.search("fixed"))
+
+    def test_update_without_previous_build(self):
+        self.builder.update_dataset("spells", {"spell3.json"})
+
+        self.assertEqual(10, len(self.query("SELECT id FROM spells")))
+
+    def test_update_requires_incremental_build(self):
+        test_builder = self.create_builder(incremental=False)
+        test_builder.build()
+
+        with self.assertRaises(ValueError):
+            test_builder.update_dataset("spells", {"spell3.json"})
+
+    def test_apply_changes_returns_failed_datasets(self):
+        self.builder.build()
+        (self.source_path / "monsters" / "owlbear.json").write_text(
+            "{broken", encoding="utf-8"
+        )
+        self.write_spell(3, "Spell 3", "changed")
+
+        with self.assertLogs(self.logger, logging.ERROR):
+            failed = watch.apply_changes(
+                self.builder,
+                {"spells": {"spell3.json"}, "monsters": {"owlbear.json"}},
+                self.logger,
+            )
+
+        self.assertDictEqual({"monsters": {"owlbear.json"}}, failed)
+        self.assertEqual(["Spell 3"], self.search("changed"))
+
+    def test_burst_of_edits_is_one_update(self):
+        stop = threading.Event()
+        config = watch.WatchConfig(interval=0.01, debounce=0.3)
+        with patch.object(
+            self.builder, "update_dataset", wraps=self.builder.update_dataset
+        ) as update_dataset:
+            thread = threading.Thread(
+                target=watch.watch,
+                args=(self.builder, config, self.logger, stop),
+            )
+            thread.start()
+            try:
+                deadline = time.monotonic() + 10
+                while not (self.out_path / "spells.index.json").exists():
+                    self.assertLess(time.monotonic(), deadline)
+                    time.sleep(0.01)
+                for idx in range(3):
+                    self.write_spell(idx, f"Spell {idx}", "edited")
+                    time.sleep(0.02)
+                while not update_dataset.called:
+                    self.assertLess(time.monotonic(), deadline)
+                    time.sleep(0.01)
+            finally:
+                stop.set()
+                thread.join()
+
+        update_dataset.assert_called_once_with(
+            "spells", {"spell0.json", "spell1.json", "spell2.json"}
+        )
+        self.assertEqual(
+            ["Spell 0", "Spell 1", "Spell 2"], self.search("edited")
+        )
+
+    def test_invalid_config(self):
+        with self.assertRaises(ValueError):
+            watch.WatchConfig(interval=0)
+
+
+if __name__ == "__main__":
+    unittest.main()